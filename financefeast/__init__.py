@@ -1,5 +1,7 @@
 from financefeast.rest import Rest
 from financefeast.stream import Stream
+from financefeast.async_rest import AsyncRest
+from financefeast.async_stream import AsyncStream
 from financefeast.common import Environments, EnvironmentsStream
 import financefeast.exceptions
 
@@ -0,0 +1,358 @@
+import asyncio
+import functools
+import logging
+import time
+from financefeast.common import Environments
+from financefeast.chunking import merge_responses, record_key
+from financefeast.codec import JSONCodec
+from financefeast.entity import BulkResult
+from financefeast.jsonstream import JSONArrayParser, RecordBatcher
+from financefeast.metrics import RestMetrics
+from financefeast.ratelimit import RateLimiter
+from financefeast.rest import Rest
+from financefeast.retry import RetryPolicy
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+"""
+Financefeast asyncio client API library
+https://financefeast.io
+"""
+
+
+class AsyncRest(Rest):
+    """
+    Asyncio version of the Rest client. Every endpoint method of Rest is available as a coroutine, and iter_eod,
+    iter_intraday, many, eod_many and intraday_many return async generators, eg
+
+        async with AsyncRest(token="SOME TOKEN") as client:
+            response = await client.eod('air.nz', date_from='2020-11-01', date_to='2020-11-29')
+
+    Requires the optional aiohttp dependency, `pip install financefeast[async]`
+    """
+    DEFAULT_LIMIT_PER_HOST = 10
+
+    def __init__(self, client_id:str = None, client_secret:str = None, token:str = None, logger:logging.Logger = None, environment:Environments=Environments.prod,
+                 session=None, limit_per_host:int = DEFAULT_LIMIT_PER_HOST, rate_limiter:RateLimiter = None,
+                 retry:RetryPolicy = None, codec:JSONCodec = None, **kwargs):
+        """
+        :param session: supply your own aiohttp.ClientSession, otherwise one is created on first request
+        :param limit_per_host: maximum number of pooled keep-alive connections per host
+        on_request and on_response hooks are called from the event loop and must not block
+        See Rest for the remaining parameters, transport is not used as requests are sent through the aiohttp session
+        """
+        if aiohttp is None:
+            raise ImportError("AsyncRest requires aiohttp. Install it with `pip install financefeast[async]`")
+
+        self._session = session
+        self._limit_per_host = limit_per_host
+        self._login_lock = None
+
+        super().__init__(client_id=client_id, client_secret=client_secret, token=token, logger=logger, environment=environment,
+                         rate_limiter=rate_limiter, retry=retry, codec=codec, **kwargs)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    async def close(self):
+        """
+        Close the underlying aiohttp session
+        :return:
+        """
+        await self._requests.close()
+
+    def _create_requests(self, transport = None, **kwargs):
+        return self.AsyncRequestRateLimited(self._logger, session=self._session, limit_per_host=self._limit_per_host, **kwargs)
+
+    async def authorize(self):
+        """
+        Log in with the client credentials if there is no token yet. Endpoint methods call this before each request,
+        concurrent callers share a single login request.
+        :return: access token
+        """
+        if self._token:
+            return self._token
+
+        if self._login_lock is None:
+            self._login_lock = asyncio.Lock()
+
+        async with self._login_lock:
+            if not self._token:
+                url, headers = self._login_request()
+                self._login_token(await self._requests.get(url=url, headers=headers))
+
+        return self._token
+
+    async def _cached_get(self, endpoint:str, url:str, headers:dict = None, query:dict = None):
+        if self._response_cache is None:
+            return await self._requests.get(url=url, headers=headers, params=query)
+
+        key = (endpoint, url, tuple(sorted((k, str(v)) for k, v in (query or {}).items())))
+        response = self._response_cache.get(key)
+        if response is not None:
+            return response
+
+        response = await self._requests.get(url=url, headers=headers, params=query)
+        if response is not None:
+            self._response_cache.set(key, response, ttl=self._response_cache.ttl_for(endpoint))
+        return response
+
+    async def _get_cached(self, key:str, url:str, headers:dict, query:dict, from_name:str, to_name:str, interval:str, date_only:bool = False):
+        plan = self._bar_cache.plan(key, query.get(from_name), query.get(to_name), interval, date_only=date_only)
+        if plan is None:
+            return await self._get_range(url, headers, query, from_name, to_name, interval, date_only=date_only)
+
+        self._logger.debug(f"Bar cache {key} fetching {len(plan.gaps)} gaps")
+
+        ranges = list(plan.gaps) + ([plan.open_range] if plan.open_range else [])
+        responses = await asyncio.gather(*[self._get_range(url, headers, dict(query, **{from_name: start, to_name: end}), from_name, to_name, interval, date_only=date_only)
+                                           for start, end in ranges])
+
+        for (start, end), response in zip(plan.gaps, responses):
+            if not self._bar_cache.storable(response):
+                self._logger.warning(f"Bar cache {key} fetch of {start} to {end} returned no data, not caching it")
+                return response
+            if not self._bar_cache.store(plan, response, start, end):
+                self._logger.warning(f"Bar cache {key} can not read the record timestamps, fetching without the cache")
+                return await self._get_range(url, headers, query, from_name, to_name, interval, date_only=date_only)
+
+        if plan.open_range and not self._bar_cache.storable(responses[-1]):
+            return responses[-1]
+
+        return self._bar_cache.result(plan, responses[-1] if plan.open_range else None)
+
+    async def _iter_range(self, url:str, headers:dict, query:dict, from_name:str, to_name:str, chunks:list, batch_size:int = None):
+        batcher = RecordBatcher(batch_size)
+        last_key = None
+
+        for start, end in chunks:
+            chunk_query = dict(query, **{from_name: start, to_name: end})
+            chunk_query = {k: v for k, v in chunk_query.items() if v}
+
+            async for batch in self._requests.iter_data(url, headers=headers, params=chunk_query, batch_size=self.DEFAULT_STREAM_BATCH):
+                if last_key is not None and batch and record_key(batch[0]) == last_key:
+                    batch = batch[1:]
+                if not batch:
+                    continue
+                last_key = record_key(batch[-1])
+
+                for item in batcher.add(batch):
+                    yield item
+
+        for item in batcher.flush():
+            yield item
+
+    async def _get_chunked(self, url:str, headers:dict, query:dict, from_name:str, to_name:str, chunks:list):
+        self._logger.debug(f"Splitting request to {url} into {len(chunks)} chunks")
+
+        queries = [dict(query, **{from_name: start, to_name: end}) for start, end in chunks]
+        responses = await asyncio.gather(*[self._requests.get(url=url, headers=headers, params=q) for q in queries])
+
+        return merge_responses(responses)
+
+    async def many(self, tickers:list, endpoints:list = ('eod',), max_workers:int = Rest.DEFAULT_MAX_WORKERS, **kwargs):
+        """
+        Async version of Rest.many, at most max_workers requests are in flight at once
+        :return: async generator of BulkResult
+        """
+        calls = self._bulk_calls(tickers, endpoints, kwargs)
+        semaphore = asyncio.Semaphore(max_workers)
+
+        async def call(ticker, endpoint, method, endpoint_kwargs):
+            async with semaphore:
+                try:
+                    return BulkResult(ticker, endpoint, await method(ticker, **endpoint_kwargs), None)
+                except Exception as e:
+                    self._logger.warning(f"Bulk request {endpoint} for {ticker} failed: {e!r}")
+                    return BulkResult(ticker, endpoint, None, e)
+
+        tasks = [asyncio.ensure_future(call(*c)) for c in calls]
+        try:
+            for task in asyncio.as_completed(tasks):
+                yield await task
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    class AsyncRequestRateLimited(Rest.RequestRateLimited):
+
+        def __init__(self, logger:logging.Logger = None, session=None, limit_per_host:int = 10, rate_limiter:RateLimiter = None,
+                     retry:RetryPolicy = None, codec:JSONCodec = None, metrics:RestMetrics = None, on_request = None,
+                     on_response = None):
+            super().__init__(logger, rate_limiter=rate_limiter, retry=retry, codec=codec, metrics=metrics,
+                             on_request=on_request, on_response=on_response)
+            self.client_session = session
+            self.limit_per_host = limit_per_host
+
+        @staticmethod
+        def _default_transport():
+            # requests are sent through the aiohttp session
+            return None
+
+        def _session(self):
+            """
+            Returns the aiohttp session, creating it on first use. This must be called from within the running event loop.
+            :return: aiohttp.ClientSession
+            """
+            if self.client_session is None or self.client_session.closed:
+                connector = aiohttp.TCPConnector(limit_per_host=self.limit_per_host)
+                timeout = aiohttp.ClientTimeout(sock_connect=self.TIMEOUT_CONN, sock_read=self.TIMEOUT_RESP)
+                self.client_session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+
+            return self.client_session
+
+        @staticmethod
+        def _encode_params(params:dict):
+            """
+            aiohttp only accepts str, int and float query values. Encode the same way requests does, with lists
+            expanded to repeated keys.
+            :param params: query parameters
+            :return: list of (key, value) tuples
+            """
+            if not params:
+                return None
+
+            encoded = []
+            for key, value in params.items():
+                values = value if isinstance(value, (list, tuple)) else [value]
+                for v in values:
+                    if v is not None:
+                        encoded.append((key, str(v)))
+
+            return encoded
+
+        async def get(self, url:str, params:dict = None, **kwargs):
+
+            self.logger.debug(f'Calling url {url}')
+
+            started = time.perf_counter()
+            r = await self._send(url, params=params, **kwargs)
+            try:
+                body = await r.read()
+            finally:
+                r.release()
+
+            if self.metrics is not None:
+                self.metrics.completed(self._endpoint(url), time.perf_counter() - started, len(body))
+
+            return self._build_response(r.status, body, lambda: self.codec.loads(body))
+
+        async def iter_data(self, url:str, headers:dict = None, params:dict = None, batch_size:int = None, key:str = 'data'):
+            """
+            Async version of RequestRateLimited.iter_data
+            :return: async generator of records, or of lists of records
+            """
+            self.logger.debug(f'Streaming url {url}')
+
+            started = time.perf_counter()
+            r = await self._send(url, headers=headers, params=params)
+            size = 0
+            try:
+                if r.status >= 400:
+                    body = await r.read()
+                    self._build_response(r.status, body, lambda: self.codec.loads(body))
+                    r.raise_for_status()
+
+                parser = JSONArrayParser(key=key)
+                batcher = RecordBatcher(batch_size)
+
+                async for chunk in r.content.iter_chunked(self.STREAM_CHUNK_SIZE):
+                    size += len(chunk)
+                    for item in batcher.add(parser.feed(chunk)):
+                        yield item
+
+                for item in batcher.add(parser.close()) + batcher.flush():
+                    yield item
+            finally:
+                r.release()
+                if self.metrics is not None:
+                    self.metrics.completed(self._endpoint(url), time.perf_counter() - started, size)
+
+        async def _send(self, url:str, params:dict = None, **kwargs):
+            """
+            Send a GET request, retrying as set by the retry policy. The caller must release the response.
+            :return: aiohttp.ClientResponse
+            """
+            started = self.retry.start()
+            attempt = 0
+
+            while True:
+                if not await self.limiter.acquire_async(timeout=self.retry.remaining(started)):
+                    raise self._deadline_exceeded(url)
+                info = self._attempt_started(url, params, attempt)
+
+                try:
+                    r = await self._session().get(url, params=self._encode_params(params), **kwargs)
+                except (asyncio.TimeoutError, aiohttp.ClientConnectionError) as e:
+                    self._attempt_finished(info, error=e)
+                    # timeout or connection reset
+                    delay = self.retry.delay(attempt, started)
+                    if delay is None:
+                        raise
+                    self.logger.warning(f'Retrying url {url} in {delay:.2f}s after error: {e!r}')
+                    await asyncio.sleep(delay)
+                    attempt += 1
+                    continue
+
+                self._parse_request_rate_limit_headers(r)
+                self._attempt_finished(info, r, r.status)
+
+                if self.retry.is_retryable(r.status):
+                    delay = self._retry_delay(r.status, attempt, started)
+                    if delay is not None:
+                        self.logger.warning(f'Retrying url {url} in {delay:.2f}s after status {r.status}')
+                        r.release()
+                        await asyncio.sleep(delay)
+                        attempt += 1
+                        continue
+
+                return r
+
+        async def close(self):
+            if self.client_session is not None and not self.client_session.closed:
+                await self.client_session.close()
+
+
+def _async_endpoint(method, authorize:bool):
+    """
+    Wrap a Rest endpoint method, which returns an awaitable from the async requester, as a coroutine
+    :param method: Rest endpoint method
+    :param authorize: log in first if the endpoint needs a token
+    """
+    @functools.wraps(method)
+    async def endpoint(self, *args, **kwargs):
+        if authorize:
+            await self.authorize()
+        return await method(self, *args, **kwargs)
+
+    return endpoint
+
+
+def _async_iter_endpoint(method):
+    """
+    Wrap a Rest iter_ method, which returns an async generator from AsyncRest._iter_range, logging in first
+    :param method: Rest iter_ method
+    """
+    @functools.wraps(method)
+    async def endpoint(self, *args, **kwargs):
+        await self.authorize()
+        async for item in method(self, *args, **kwargs):
+            yield item
+
+    return endpoint
+
+
+for _name in ('alive', 'tickers', 'tickers_search', 'exchange', 'exchange_status'):
+    setattr(AsyncRest, _name, _async_endpoint(getattr(Rest, _name), authorize=False))
+
+for _name in ('validate', 'usage', 'social_sentiment', 'cpi', 'announcement') + Rest.BULK_ENDPOINTS:
+    setattr(AsyncRest, _name, _async_endpoint(getattr(Rest, _name), authorize=True))
+
+for _name in ('iter_eod', 'iter_intraday'):
+    setattr(AsyncRest, _name, _async_iter_endpoint(getattr(Rest, _name)))
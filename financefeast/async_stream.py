@@ -0,0 +1,377 @@
+import asyncio
+import inspect
+import logging
+import time
+from collections import deque
+from datetime import timezone, tzinfo
+from financefeast.common import EnvironmentsStream
+from financefeast.async_rest import AsyncRest
+from financefeast.chunking import DATETIME_FORMAT
+from financefeast.codec import JSONCodec
+from financefeast.metrics import StreamMetrics
+from financefeast.recorder import Recorder
+from financefeast.retry import ReconnectPolicy
+from financefeast.stream import Stream
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+"""
+Financefeast asyncio Stream client
+https://financefeast.io
+"""
+
+
+class AsyncStream(Stream):
+    """
+    Asyncio version of the Stream client, running on aiohttp websockets inside the caller's event loop. Received
+    messages are available as an async iterator, and on_data and attached handlers may be coroutine functions, eg
+
+        async with AsyncStream(token="SOME TOKEN") as stream:
+            async for data in stream:
+                print(data)
+
+    Like Stream it authenticates when the socket opens and reconnects after a dropped connection until closed.
+    Requires the optional aiohttp dependency, `pip install financefeast[async]`
+    """
+    PING_INTERVAL = 10
+    DEFAULT_MAX_QUEUE = 10000
+
+    def __init__(self, token:str, on_data=None, logger:logging.Logger = None, environment:EnvironmentsStream=EnvironmentsStream.prod,
+                 codec:JSONCodec = None, raw:bool = False, session=None, max_queue:int = DEFAULT_MAX_QUEUE,
+                 reconnect:ReconnectPolicy = None, backfill = None, backfill_interval:str = '1m', backfill_exchange:str = 'nzx',
+                 recorder:Recorder = None, metrics:StreamMetrics = None, max_held:int = Stream.DEFAULT_MAX_HELD,
+                 backfill_timeout:float = Stream.DEFAULT_BACKFILL_TIMEOUT, backfill_timezone:tzinfo = timezone.utc):
+        """
+        :param session: supply your own aiohttp.ClientSession, otherwise one is created on connect
+        :param max_queue: maximum number of messages waiting to be read by the async iterator. When it is full reading
+        from the socket pauses until the consumer catches up
+        :param backfill: optional AsyncRest or Rest client used to backfill after a reconnect, see Stream
+        :param max_held: maximum number of live messages held during backfill, when it is reached reading from the
+        socket pauses until the backfill finishes or backfill_timeout passes
+        See Stream for the remaining parameters
+        """
+        if aiohttp is None:
+            raise ImportError("AsyncStream requires aiohttp. Install it with `pip install financefeast[async]`")
+
+        super().__init__(token, on_data=on_data, logger=logger, environment=environment, codec=codec, raw=raw,
+                         reconnect=reconnect, backfill=backfill, backfill_interval=backfill_interval, backfill_exchange=backfill_exchange,
+                         recorder=recorder, metrics=metrics, max_held=max_held, backfill_timeout=backfill_timeout,
+                         backfill_timezone=backfill_timezone)
+
+        self._session = session
+        self._own_session = session is None
+        self._max_queue = max_queue
+        self._queue = None
+        self._task = None
+        self._closed = False
+        self._hold_released = asyncio.Event()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    def __aiter__(self):
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self._max_queue)
+        self.start()
+        return self
+
+    async def __anext__(self):
+        data = await self._queue.get()
+        if data is _CLOSED:
+            raise StopAsyncIteration
+        return data
+
+    def start(self) -> asyncio.Task:
+        """
+        Run connect() as a task in the running event loop, if it is not already running
+        :return: asyncio.Task
+        """
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self.connect())
+        return self._task
+
+    async def connect(self):
+        """
+        Connect and read messages until close() is called, reconnecting after a dropped connection
+        :return:
+        """
+        self._closed = False
+        attempt = 0
+        while not self._closed:
+            self._opened_at = None
+            try:
+                await self._create_connection()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._logger.exception("Websocket connection Error  : {0}".format(e))
+
+            if self._closed:
+                break
+            attempt = self._next_attempt(attempt)
+            delay = self._reconnect.delay(attempt - 1)
+            self._logger.info(f"Reconnecting websocket after {delay:.1f} sec")
+            await asyncio.sleep(delay)
+
+    async def send(self, message:dict):
+        """
+        Sends a message to the stream server
+        :param message:
+        :return:
+        """
+        await self._send(message)
+
+    async def subscribe(self, tickers:list):
+        """
+        Subscribe to tickers, see Stream.subscribe
+        :param tickers: ticker or list of tickers
+        :return: list of tickers that were not already subscribed
+        """
+        added = self._add_subscriptions(tickers)
+        if self._connected:
+            for frame in self._subscription_frames('subscribe', added):
+                await self._send(frame)
+        return added
+
+    async def unsubscribe(self, tickers:list):
+        """
+        Unsubscribe from tickers, see Stream.unsubscribe
+        :param tickers: ticker or list of tickers
+        :return: list of tickers that were subscribed
+        """
+        removed = self._remove_subscriptions(tickers)
+        if self._connected:
+            for frame in self._subscription_frames('unsubscribe', removed):
+                await self._send(frame)
+        return removed
+
+    async def close(self):
+        """
+        Close the connection, stop reconnecting and end any async iteration
+        :return:
+        """
+        self._closed = True
+
+        if self._websocket is not None and not self._websocket.closed:
+            await self._websocket.close()
+
+        if self._task is not None and not self._task.done() and self._task is not asyncio.current_task():
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+
+        if self._own_session and self._session is not None:
+            await self._session.close()
+            self._session = None
+
+        if self._queue is not None:
+            try:
+                self._queue.put_nowait(_CLOSED)
+            except asyncio.QueueFull:
+                self._queue.get_nowait()
+                self._queue.put_nowait(_CLOSED)
+
+    async def _create_connection(self):
+        """
+        Open one websocket connection and read from it until it closes
+        :return:
+        """
+        if self._session is None:
+            self._session = aiohttp.ClientSession()
+
+        async with self._session.ws_connect(self._environment.value, heartbeat=self.PING_INTERVAL,
+                                            headers=self.DEFAULT_SOCKET_HEADER) as websocket:
+            self._websocket = websocket
+            try:
+                await self._on_open(websocket)
+
+                async for message in websocket:
+                    if message.type in (aiohttp.WSMsgType.TEXT, aiohttp.WSMsgType.BINARY):
+                        await self._on_message(websocket, message.data)
+                    elif message.type == aiohttp.WSMsgType.ERROR:
+                        self._on_error(websocket, websocket.exception())
+                        break
+            finally:
+                self._on_close(websocket, websocket.close_code, None)
+                self._websocket = None
+
+    async def _on_open(self, websocket):
+        """
+        Handle socket open
+        Send authentication
+        :return:
+        """
+        self._logger.info(f"Attempting to authorise to the Stream server")
+        await self._send(self._authentication())
+        self._connected = True
+
+        for frame in self._subscription_frames('subscribe', self.subscriptions):
+            await self._send(frame)
+
+        for on_reconnect in self._opened():
+            await self._callback(on_reconnect)
+
+        window = self._start_backfill()
+        if window:
+            asyncio.ensure_future(self._run_backfill(*window))
+
+    async def _fetch_backfill(self, tickers:list, since, until) -> dict:
+        """
+        Fetch backfill data with an AsyncRest client, or a Rest client on a worker thread
+        :return: dict of ticker to list of backfill messages
+        """
+        if not isinstance(self._backfill, AsyncRest):
+            return await asyncio.get_event_loop().run_in_executor(None, super()._fetch_backfill, tickers, since, until)
+
+        results = {}
+        async for result in self._backfill.many(tickers, ['intraday'], datetime_from=since.strftime(DATETIME_FORMAT),
+                                                datetime_to=until.strftime(DATETIME_FORMAT),
+                                                exchange=self._backfill_exchange, interval=self._backfill_interval):
+            if result.ok:
+                results[result.ticker] = self._backfill_messages(result.ticker, result.response, since, self._backfill_timezone)
+
+        for ticker in tickers:
+            if not results.get(ticker):
+                try:
+                    response = await self._backfill.last(ticker, exchange=self._backfill_exchange)
+                    results[ticker] = self._backfill_messages(ticker, response, since, self._backfill_timezone)
+                except Exception as e:
+                    self._logger.warning(f"Backfill of {ticker} failed: {e!r}")
+
+        return results
+
+    async def _run_backfill(self, tickers:list, since, until, generation:int):
+        """
+        Deliver backfilled data then the live messages held meanwhile
+        :return:
+        """
+        self._logger.info(f"Backfilling {len(tickers)} tickers from {since:%Y-%m-%d %H:%M:%S}")
+        try:
+            results = await self._fetch_backfill(tickers, since, until)
+            if self._claim_delivery(generation):
+                for ticker in tickers:
+                    for message in results.get(ticker, []):
+                        await self._deliver(self._backfill_data(message))
+        except Exception as e:
+            self._logger.error(f"Backfill failed: {e!r}")
+        finally:
+            await self._release_held(generation)
+
+    async def _release_held(self, generation:int):
+        """
+        Deliver the live messages received during backfill, then deliver live messages directly again
+        :return:
+        """
+        if not self._backfilling or generation != self._backfill_generation:
+            return
+
+        self._hold_deadline = None
+        while self._held:
+            held, self._held = self._held, deque()
+            self._hold_released.set()
+            for data in held:
+                await self._deliver(data)
+        self._end_hold()
+        self._hold_released.set()
+
+    async def _on_message(self, websocket, message):
+        """
+        Record a received message, then hold or deliver it
+        :return:
+        """
+        if self._recorder is not None:
+            self._recorder.write(message)
+
+        await self._receive(message)
+
+    async def _receive(self, message):
+        """
+        Decode a received or replayed message and hold or deliver it
+        :return:
+        """
+        self._last_received = time.time()
+        if self._metrics is None:
+            data = self._decode(message)
+        else:
+            started = time.perf_counter()
+            data = self._decode(message)
+            self._metrics.received(message, data, time.perf_counter() - started, self._last_received)
+
+        if self._backfilling:
+            deliver = self._hold(data)
+            while deliver is None:
+                self._hold_released.clear()
+                try:
+                    await asyncio.wait_for(self._hold_released.wait(), self._hold_remaining())
+                except asyncio.TimeoutError:
+                    pass
+                deliver = self._hold(data)
+            for data in deliver:
+                await self._deliver(data)
+            return
+
+        await self._deliver(data)
+
+    async def _deliver(self, data):
+        """
+        Pass a decoded message to on_data, attached handlers and the async iterator
+        :return:
+        """
+        started = time.perf_counter()
+        if self._on_data or self._queue is None:
+            await self._callback(self._on_data, data)
+
+        if self._handlers:
+            handler_data = self._handler_data(data)
+            for handler in list(self._handlers):
+                await self._callback(handler, handler_data)
+
+        if self._metrics is not None:
+            self._metrics.dispatched(time.perf_counter() - started)
+
+        if self._queue is not None:
+            await self._queue.put(data)
+
+    async def _callback(self, callback, *args):
+        """
+        Call a callback, awaiting the result if it is a coroutine. See Stream._callback
+        :return:
+        """
+        if callback:
+            try:
+                result = callback(self, *args)
+                if inspect.isawaitable(result):
+                    await result
+
+            except Exception as e:
+                self._logger.error("error from callback {}: {}".format(callback, e))
+        else:
+            self._logger.info(f"{args}")
+
+    async def _send(self, data):
+        """
+        Send data to the websocket
+        :param data:
+        :return:
+        """
+        data = self._codec.dumps(data)
+        if self._websocket is not None and not self._websocket.closed:
+            await self._websocket.send_str(data)
+
+    async def _ping(self):
+        """
+        Manual websocket ping. Heartbeat pings are enabled so this should not be needed.
+        :return:
+        """
+        return await self._send({'type': 'ping'})
+
+
+_CLOSED = object()
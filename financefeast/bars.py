@@ -0,0 +1,246 @@
+import logging
+import threading
+import time
+from collections import namedtuple
+from financefeast.chunking import parse_interval
+from financefeast.message import MessageFields, DEFAULT_FIELDS
+
+"""
+Real-time OHLCV bars built from Stream price updates.
+
+A BarAggregator is attached to a Stream and keeps one open bar per ticker and interval. Bars are aligned to the epoch,
+so a 5m bar starts on a multiple of five minutes UTC. Closed bars are passed to a callback and / or put on a queue.
+Only open bars are held, so memory is bounded by the number of tickers times the number of intervals.
+
+Event time mode uses the exchange timestamp of each message. A bar closes once any message shows the time has moved
+past its end, plus an optional allowed lateness. Wall clock mode uses the time each message is received and a timer
+thread closes bars when their interval ends, even if no more messages arrive.
+"""
+
+Bar = namedtuple('Bar', ['ticker', 'interval', 'start', 'end', 'open', 'high', 'low', 'close', 'volume', 'count'])
+
+EVENT_TIME = 'event'
+WALL_CLOCK = 'wall'
+
+
+class _OpenBar(object):
+    __slots__ = ('start', 'end', 'open', 'high', 'low', 'close', 'volume', 'count')
+
+    def __init__(self, start:float, end:float, price:float, volume:float):
+        self.start = start
+        self.end = end
+        self.open = self.high = self.low = self.close = price
+        self.volume = volume
+        self.count = 1
+
+    def add(self, price:float, volume:float):
+        if price > self.high:
+            self.high = price
+        elif price < self.low:
+            self.low = price
+        self.close = price
+        self.volume += volume
+        self.count += 1
+
+
+class BarAggregator(object):
+    """
+    Aggregates streamed prices into OHLCV bars per ticker. Attach it to a Stream with Stream.attach().
+    """
+
+    def __init__(self, interval = '1m', mode:str = EVENT_TIME, on_bar=None, queue=None, tickers:list = None,
+                 allowed_lateness:float = 0, fields:MessageFields = None, logger:logging.Logger = None, clock=time.time):
+        """
+        :param interval: bar interval, eg 1s, 1m, 5m, 1h, or a list of intervals
+        :param mode: EVENT_TIME to use message timestamps, WALL_CLOCK to use the time messages are received
+        :param on_bar: optional callback called with each closed Bar
+        :param queue: optional queue.Queue closed bars are put on, without blocking. Bars are counted in `dropped` if it is full
+        :param tickers: only aggregate these tickers, default is every ticker seen
+        :param allowed_lateness: event time mode, seconds to keep a bar open after its end for late messages
+        :param fields: MessageFields used to read ticker, price, volume and timestamp from messages
+        :param logger: supply your own logger or use the default
+        :param clock: function returning the current epoch time in seconds
+        """
+        intervals = interval if isinstance(interval, (list, tuple)) else [interval]
+        self._intervals = []
+        for name in intervals:
+            period = parse_interval(name)
+            if not period:
+                raise ValueError(f"Unrecognised bar interval {name!r}")
+            self._intervals.append((name, period.total_seconds()))
+
+        if mode not in (EVENT_TIME, WALL_CLOCK):
+            raise ValueError(f"mode must be {EVENT_TIME!r} or {WALL_CLOCK!r}")
+
+        self.mode = mode
+        self.allowed_lateness = allowed_lateness
+        self.dropped = 0
+        self.late = 0
+        self._on_bar = on_bar
+        self._queue = queue
+        self._tickers = {ticker.lower() for ticker in tickers} if tickers else None
+        self._fields = fields or DEFAULT_FIELDS
+        self._logger = logger or logging.getLogger('ff_bars')
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._bars = {}
+        self._watermark = None
+        self._next_end = None
+        self._timer = None
+        self._stop = threading.Event()
+
+    def __call__(self, stream, data):
+        for tick in self._fields.ticks(data):
+            self.add(tick.ticker, tick.price, tick.volume, tick.timestamp)
+
+    @property
+    def open_bars(self) -> list:
+        """
+        Snapshot of the bars still open
+        :return: list of Bar
+        """
+        with self._lock:
+            return [self._bar(key, bar) for key, bar in self._bars.items()]
+
+    def add(self, ticker:str, price:float, volume:float = 0.0, timestamp:float = None):
+        """
+        Add a price update
+        :param ticker: ticker symbol
+        :param price: trade price
+        :param volume: traded volume
+        :param timestamp: exchange time in epoch seconds, used in event time mode. The receive time is used if None
+        :return:
+        """
+        if ticker is None:
+            return
+        ticker = ticker.lower() if isinstance(ticker, str) else ticker
+        if self._tickers is not None and ticker not in self._tickers:
+            return
+
+        closed = []
+        with self._lock:
+            if self.mode == WALL_CLOCK:
+                self._start_timer()
+                timestamp = self._clock()
+            elif timestamp is None:
+                timestamp = self._clock()
+
+            for name, seconds in self._intervals:
+                start = timestamp - timestamp % seconds
+                key = (ticker, name)
+                bar = self._bars.get(key)
+
+                if bar is not None and start >= bar.end:
+                    closed.append(self._bar(key, bar))
+                    bar = None
+                elif (bar is not None and timestamp < bar.start) or (bar is None and self._is_closed(start + seconds)):
+                    # the bar this message belongs to has already been emitted
+                    self.late += 1
+                    continue
+
+                if bar is None:
+                    self._bars[key] = bar = _OpenBar(start, start + seconds, price, volume)
+                    if self._next_end is None or bar.end < self._next_end:
+                        self._next_end = bar.end
+                else:
+                    bar.add(price, volume)
+
+            if self.mode == EVENT_TIME and (self._watermark is None or timestamp > self._watermark):
+                self._watermark = timestamp
+                closed.extend(self._close_until(timestamp - self.allowed_lateness))
+
+        self._emit(closed)
+
+    def flush(self, until:float = None) -> list:
+        """
+        Close bars that end at or before a time, or all open bars
+        :param until: epoch seconds, default closes every open bar
+        :return: list of the closed Bars
+        """
+        with self._lock:
+            if until is None:
+                closed = [self._bar(key, bar) for key, bar in self._bars.items()]
+                self._bars.clear()
+                self._next_end = None
+            else:
+                closed = self._close_until(until)
+
+        self._emit(closed)
+        return closed
+
+    def start(self):
+        """
+        Start the wall clock timer thread. Called automatically on the first price in wall clock mode.
+        :return:
+        """
+        with self._lock:
+            self._start_timer()
+
+    def stop(self):
+        """
+        Stop the timer thread
+        :return:
+        """
+        self._stop.set()
+        with self._lock:
+            timer, self._timer = self._timer, None
+        if timer is not None:
+            timer.join()
+
+    def _start_timer(self):
+        """
+        Start the timer thread if it is not running. Requires the lock.
+        """
+        if self._timer is not None:
+            return
+        self._stop.clear()
+        self._timer = threading.Thread(target=self._run_timer, name='ff_bar_timer', daemon=True)
+        self._timer.start()
+
+    def _run_timer(self):
+        shortest = min(seconds for _, seconds in self._intervals)
+        while not self._stop.is_set():
+            now = self._clock()
+            self._stop.wait(shortest - now % shortest)
+            self.flush(self._clock())
+
+    def _is_closed(self, end:float) -> bool:
+        return self.mode == EVENT_TIME and self._watermark is not None and end <= self._watermark - self.allowed_lateness
+
+    def _close_until(self, until:float) -> list:
+        """
+        Remove and return bars ending at or before until. Requires the lock.
+        """
+        if self._next_end is None or until < self._next_end:
+            return []
+
+        closed = []
+        next_end = None
+        for key in list(self._bars):
+            bar = self._bars[key]
+            if bar.end <= until:
+                closed.append(self._bar(key, bar))
+                del self._bars[key]
+            elif next_end is None or bar.end < next_end:
+                next_end = bar.end
+
+        self._next_end = next_end
+        return closed
+
+    @staticmethod
+    def _bar(key:tuple, bar:_OpenBar) -> Bar:
+        return Bar(key[0], key[1], bar.start, bar.end, bar.open, bar.high, bar.low, bar.close, bar.volume, bar.count)
+
+    def _emit(self, bars:list):
+        for bar in bars:
+            if self._on_bar:
+                try:
+                    self._on_bar(bar)
+                except Exception as e:
+                    self._logger.error(f"error from on_bar callback {self._on_bar}: {e}")
+
+            if self._queue is not None:
+                try:
+                    self._queue.put_nowait(bar)
+                except Exception:
+                    self.dropped += 1
@@ -0,0 +1,323 @@
+import json
+import sqlite3
+import threading
+import time
+from collections import namedtuple, OrderedDict
+from datetime import datetime, timedelta
+from financefeast.chunking import DATE_FORMAT, DATETIME_FORMAT, parse_datetime, parse_interval, parse_timestamp, record_key
+from financefeast.entity import Response
+
+"""
+Client side caches for Rest responses
+"""
+
+CachePlan = namedtuple('CachePlan', ['key', 'start', 'closed_end', 'step', 'date_only', 'gaps', 'open_range'])
+CacheStats = namedtuple('CacheStats', ['hits', 'misses', 'evictions', 'size', 'maxsize'])
+
+
+class BarCache(object):
+    """
+    Persistent on-disk cache of historical eod and intraday bars, stored in a sqlite database.
+
+    The cache remembers which time ranges it holds for each ticker, exchange and interval. When a request overlaps
+    cached data only the missing gaps are fetched from the API. Only closed periods, before the start of the current
+    day, are cached. Anything after that is always fetched and never stored.
+
+    Records are keyed by their timestamp field (see chunking.TIMESTAMP_FIELDS), in the local time written in them so
+    they compare with the query dates. If a fetched record has no timestamp that can be parsed nothing is stored for
+    it, and the key is not cached again by this BarCache. Responses without a data list, eg errors, are never stored.
+    """
+
+    def __init__(self, path:str):
+        """
+        :param path: path of the sqlite database file, created if it does not exist
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._uncacheable = set()
+
+        with self._lock, self._conn:
+            self._conn.execute("CREATE TABLE IF NOT EXISTS ranges (key TEXT NOT NULL, start TEXT NOT NULL, end TEXT NOT NULL)")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS bars (key TEXT NOT NULL, ts TEXT NOT NULL, record TEXT NOT NULL, PRIMARY KEY (key, ts))")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, payload TEXT NOT NULL)")
+
+    @staticmethod
+    def key(endpoint:str, ticker:str, exchange:str, interval:str) -> str:
+        return f"{endpoint}|{ticker}|{exchange}|{interval}".lower()
+
+    def closed_before(self) -> datetime:
+        """
+        Data before this time is considered final and is cached. Defaults to the start of the current day.
+        :return: datetime
+        """
+        return datetime.combine(datetime.now().date(), datetime.min.time())
+
+    def plan(self, key:str, start:str, end:str, interval:str, date_only:bool = False):
+        """
+        Work out which parts of a request must be fetched from the API
+        :param key: cache key from BarCache.key()
+        :param start: range start query value
+        :param end: range end query value
+        :param interval: bar interval, eg 1m
+        :param date_only: range values are dates, as used by the eod endpoint
+        :return: CachePlan, or None if the request can not be served from the cache
+        """
+        if key in self._uncacheable:
+            return None
+
+        start_dt = parse_datetime(start)
+        end_dt = parse_datetime(end)
+        if start_dt is None or end_dt is None or end_dt < start_dt or not parse_interval(interval):
+            return None
+
+        # date ranges include both end days, datetime ranges share their boundary instant
+        step = timedelta(days=1) if date_only else timedelta(0)
+        closed_end = min(end_dt, self.closed_before() - step)
+        if closed_end < start_dt:
+            return None
+
+        gaps = [(self._format(s, date_only), self._format(e, date_only))
+                for s, e in self._missing(self.coverage(key), start_dt, closed_end, step)]
+
+        open_range = None
+        if end_dt > closed_end:
+            open_range = (self._format(closed_end + step, date_only), end)
+
+        return CachePlan(key, start_dt, closed_end, step, date_only, gaps, open_range)
+
+    def coverage(self, key:str) -> list:
+        """
+        Returns the ranges held for a key
+        :param key: cache key
+        :return: sorted list of (start, end) datetime tuples
+        """
+        with self._lock:
+            rows = self._conn.execute("SELECT start, end FROM ranges WHERE key = ? ORDER BY start", (key,)).fetchall()
+        return [(parse_datetime(s), parse_datetime(e)) for s, e in rows]
+
+    @staticmethod
+    def storable(response:Response) -> bool:
+        """
+        :return: True if a fetched response holds a data list, error responses do not and must not be cached
+        """
+        payload = getattr(response, '_payload', None)
+        return isinstance(payload, dict) and isinstance(payload.get('data'), list)
+
+    def store(self, plan:CachePlan, response:Response, start:str, end:str):
+        """
+        Store the records of a fetched gap and mark the gap as held. If any record has no timestamp that can be parsed
+        nothing is stored and the key is no longer cached, the caller must then fetch without the cache.
+        :param plan: the CachePlan the gap came from
+        :param response: Response fetched for the gap
+        :param start: gap start
+        :param end: gap end
+        :return: True if the gap was stored
+        """
+        if not self.storable(response):
+            return False
+
+        rows = []
+        payload = {k: v for k, v in response._payload.items() if k != 'data'}
+        for record in response.data:
+            ts = parse_timestamp(record_key(record), tz=None)
+            if ts is None:
+                self._uncacheable.add(plan.key)
+                return False
+            rows.append((plan.key, self._timestamp(ts), json.dumps(record)))
+
+        ranges = self.coverage(plan.key) + [(parse_datetime(start), parse_datetime(end))]
+
+        with self._lock, self._conn:
+            self._conn.executemany("INSERT OR REPLACE INTO bars (key, ts, record) VALUES (?, ?, ?)", rows)
+            self._conn.execute("DELETE FROM ranges WHERE key = ?", (plan.key,))
+            self._conn.executemany("INSERT INTO ranges (key, start, end) VALUES (?, ?, ?)",
+                                   [(plan.key, s.strftime(DATETIME_FORMAT), e.strftime(DATETIME_FORMAT))
+                                    for s, e in self._merge(ranges, plan.step)])
+            if payload:
+                self._conn.execute("INSERT OR REPLACE INTO meta (key, payload) VALUES (?, ?)", (plan.key, json.dumps(payload)))
+
+        return True
+
+    def result(self, plan:CachePlan, open_response:Response = None) -> Response:
+        """
+        Build the Response for a planned request from the cache and the uncached open part
+        :param plan: CachePlan
+        :param open_response: Response fetched for plan.open_range, if any
+        :return: Response
+        """
+        # a date range includes every record of its last day
+        end = plan.closed_end + plan.step - timedelta(seconds=1) if plan.date_only else plan.closed_end
+        with self._lock:
+            rows = self._conn.execute("SELECT record FROM bars WHERE key = ? AND ts >= ? AND ts <= ? ORDER BY ts",
+                                      (plan.key, plan.start.strftime(DATETIME_FORMAT), end.strftime(DATETIME_FORMAT) + '.999999')).fetchall()
+            meta = self._conn.execute("SELECT payload FROM meta WHERE key = ?", (plan.key,)).fetchone()
+
+        payload = json.loads(meta[0]) if meta else {}
+        data = [json.loads(row[0]) for row in rows]
+
+        if open_response is not None:
+            seen = {record_key(record) for record in data[-1:]}
+            data.extend(record for record in open_response.data if record_key(record) is None or record_key(record) not in seen)
+
+        payload['data'] = data
+        return Response(payload)
+
+    def invalidate(self, key:str = None):
+        """
+        Drop cached data for a key, or everything if no key is given
+        :param key: cache key from BarCache.key()
+        :return:
+        """
+        with self._lock, self._conn:
+            if key is None:
+                self._uncacheable.clear()
+            else:
+                self._uncacheable.discard(key)
+            for table in ('ranges', 'bars', 'meta'):
+                if key is None:
+                    self._conn.execute(f"DELETE FROM {table}")
+                else:
+                    self._conn.execute(f"DELETE FROM {table} WHERE key = ?", (key,))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    @staticmethod
+    def _timestamp(value:datetime) -> str:
+        """
+        Stored record timestamp, with microseconds only when there are any so whole second timestamps compare as before
+        """
+        return value.strftime(DATETIME_FORMAT + '.%f' if value.microsecond else DATETIME_FORMAT)
+
+    @staticmethod
+    def _format(value:datetime, date_only:bool) -> str:
+        return value.strftime(DATE_FORMAT if date_only else DATETIME_FORMAT)
+
+    @staticmethod
+    def _missing(coverage:list, start:datetime, end:datetime, step:timedelta) -> list:
+        """
+        Returns the parts of start to end that are not covered
+        """
+        gaps = []
+        cursor = start
+
+        for cov_start, cov_end in coverage:
+            if cov_end < cursor:
+                continue
+            if cov_start > end:
+                break
+            if cov_start > cursor:
+                gaps.append((cursor, cov_start - step))
+            cursor = max(cursor, cov_end + step)
+
+        if cursor < end or (step and cursor == end):
+            gaps.append((cursor, end))
+
+        return [(s, e) for s, e in gaps if e > s or (step and e == s)]
+
+    @staticmethod
+    def _merge(ranges:list, step:timedelta) -> list:
+        """
+        Merge overlapping or adjacent ranges
+        """
+        merged = []
+        for start, end in sorted(ranges):
+            if merged and start <= merged[-1][1] + step:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+            else:
+                merged.append((start, end))
+        return merged
+
+
+class TTLCache(object):
+    """
+    Thread safe in-memory cache with a per entry time to live and least recently used eviction once maxsize entries
+    are held. Used by Rest to cache reference data responses, each endpoint can have its own TTL in ttl_policy.
+    """
+    DEFAULT_MAXSIZE = 1024
+    DEFAULT_TTL = 300
+    DEFAULT_TTL_POLICY = {
+        'tickers': 3600,
+        'tickers_search': 3600,
+        'exchange': 86400,
+        'exchange_status': 60,
+        'financial': 86400,
+    }
+
+    def __init__(self, maxsize:int = DEFAULT_MAXSIZE, ttl:float = DEFAULT_TTL, ttl_policy:dict = None, clock=time.monotonic):
+        """
+        :param maxsize: maximum number of entries held
+        :param ttl: default time to live in seconds
+        :param ttl_policy: dict of endpoint name to time to live in seconds, merged over DEFAULT_TTL_POLICY
+        :param clock: monotonic clock function, returns seconds
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.ttl_policy = dict(self.DEFAULT_TTL_POLICY, **(ttl_policy or {}))
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def stats(self) -> CacheStats:
+        with self._lock:
+            return CacheStats(self._hits, self._misses, self._evictions, len(self._entries), self.maxsize)
+
+    def ttl_for(self, endpoint:str) -> float:
+        return self.ttl_policy.get(endpoint, self.ttl)
+
+    def get(self, key, default=None):
+        """
+        Returns the cached value, or default if the key is missing or expired
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= self._clock():
+                if entry is not None:
+                    del self._entries[key]
+                self._misses += 1
+                return default
+
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return entry[1]
+
+    def set(self, key, value, ttl:float = None):
+        """
+        Cache a value
+        :param key: hashable key
+        :param value: value to cache
+        :param ttl: time to live in seconds, defaults to the cache ttl
+        :return:
+        """
+        expires = self._clock() + (self.ttl if ttl is None else ttl)
+
+        with self._lock:
+            self._entries[key] = (expires, value)
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+
+    def invalidate(self, endpoint:str = None):
+        """
+        Drop cached entries for an endpoint, or everything if no endpoint is given
+        :param endpoint: endpoint name, eg tickers
+        :return:
+        """
+        with self._lock:
+            if endpoint is None:
+                self._entries.clear()
+                return
+
+            for key in [k for k in self._entries if k[0] == endpoint]:
+                del self._entries[key]
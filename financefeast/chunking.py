@@ -0,0 +1,176 @@
+import re
+from datetime import datetime, timedelta, timezone
+from financefeast.entity import Response
+
+"""
+Split large date ranges into interval aware chunks and merge the chunked responses back together
+"""
+
+DATE_FORMAT = '%Y-%m-%d'
+DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+TIMESTAMP_FIELDS = ('datetime', 'date', 'timestamp', 'time')
+
+_INTERVAL_RE = re.compile(r'^\s*(\d+)\s*(s|m|min|h|d|w)\s*$', re.IGNORECASE)
+_INTERVAL_UNITS = {
+    's': timedelta(seconds=1),
+    'm': timedelta(minutes=1),
+    'min': timedelta(minutes=1),
+    'h': timedelta(hours=1),
+    'd': timedelta(days=1),
+    'w': timedelta(weeks=1),
+}
+_DATETIME_FORMATS = (DATETIME_FORMAT, '%Y-%m-%dT%H:%M:%S', '%Y-%m-%d %H:%M', DATE_FORMAT)
+
+
+def parse_interval(interval:str):
+    """
+    Parse an API interval string, eg 1m, 5m, 1h, 1d
+    :param interval: interval string
+    :return: timedelta, or None if the interval is not recognised
+    """
+    if not interval:
+        return None
+
+    match = _INTERVAL_RE.match(interval)
+    if not match:
+        return None
+
+    return int(match.group(1)) * _INTERVAL_UNITS[match.group(2).lower()]
+
+
+def parse_datetime(value:str):
+    """
+    Parse a date or datetime query parameter
+    :param value: in format YYYY-MM-DD or YYYY-MM-DD 00:00:00
+    :return: datetime, or None if the value can not be parsed
+    """
+    if isinstance(value, datetime):
+        return value
+
+    for fmt in _DATETIME_FORMATS:
+        try:
+            return datetime.strptime(value, fmt)
+        except (TypeError, ValueError):
+            continue
+
+    return None
+
+
+def parse_timestamp(value, tz = timezone.utc):
+    """
+    Parse the timestamp of a data record, in any of the parse_datetime formats, ISO 8601 with fractions of a second and
+    a Z or offset, or epoch seconds or milliseconds
+    :param value: timestamp value
+    :param tz: time zone that values with an offset and epoch values are converted to. None keeps the local time written
+    in values with an offset, the same clock as the query dates, and converts epoch values to UTC
+    :return: naive datetime, or None if the value can not be parsed
+    """
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        seconds = value / 1000.0 if value > 1e11 else value
+        try:
+            return datetime.fromtimestamp(seconds, tz or timezone.utc).replace(tzinfo=None)
+        except (OverflowError, OSError, ValueError):
+            return None
+
+    parsed = parse_datetime(value)
+    if parsed is None and isinstance(value, str):
+        try:
+            parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        except ValueError:
+            return None
+
+    if parsed is not None and parsed.tzinfo is not None:
+        parsed = (parsed.astimezone(tz) if tz is not None else parsed).replace(tzinfo=None)
+    return parsed
+
+
+def split_range(start:str, end:str, interval:str, max_bars:int, date_only:bool = False) -> list:
+    """
+    Split a date range into chunks of at most max_bars bars of the interval.
+    Datetime chunks share their boundary, date chunks do not overlap.
+    :param start: range start, date or datetime string
+    :param end: range end, date or datetime string
+    :param interval: bar interval, eg 1m
+    :param max_bars: maximum number of bars per chunk
+    :param date_only: format chunk boundaries as dates instead of datetimes
+    :return: list of (start, end) string tuples, a single chunk of the original values if the range can not be split
+    """
+    step = parse_interval(interval)
+    start_dt = parse_datetime(start)
+    end_dt = parse_datetime(end)
+
+    if not step or not max_bars or start_dt is None or end_dt is None or end_dt <= start_dt:
+        return [(start, end)]
+
+    if date_only:
+        step = max(step, timedelta(days=1))
+        span = timedelta(days=max((step * max_bars).days, 1))
+        if end_dt - start_dt < span:
+            return [(start, end)]
+
+        chunks = []
+        chunk_start = start_dt
+        while chunk_start <= end_dt:
+            chunk_end = min(chunk_start + span - timedelta(days=1), end_dt)
+            chunks.append((chunk_start.strftime(DATE_FORMAT), chunk_end.strftime(DATE_FORMAT)))
+            chunk_start = chunk_end + timedelta(days=1)
+        return chunks
+
+    span = step * max_bars
+    if end_dt - start_dt <= span:
+        return [(start, end)]
+
+    chunks = []
+    chunk_start = start_dt
+    while chunk_start < end_dt:
+        chunk_end = min(chunk_start + span, end_dt)
+        chunks.append([chunk_start.strftime(DATETIME_FORMAT), chunk_end.strftime(DATETIME_FORMAT)])
+        chunk_start = chunk_end
+
+    # keep the caller's own range ends so the server interprets them the same way as an unchunked request
+    chunks[0][0] = start
+    chunks[-1][1] = end
+    return [tuple(chunk) for chunk in chunks]
+
+
+def record_key(record):
+    """
+    Returns the timestamp of a data record, used to drop records repeated at chunk boundaries
+    :param record: a record from a response data list
+    :return: timestamp value or None
+    """
+    if isinstance(record, dict):
+        for field in TIMESTAMP_FIELDS:
+            if field in record:
+                return record[field]
+    return None
+
+
+def merge_responses(responses:list):
+    """
+    Merge chunk responses, in chunk order, into one Response with duplicate boundary records removed.
+    Everything except `data` is taken from the first response.
+    :param responses: list of Response objects in time order
+    :return: Response or None if every chunk was empty
+    """
+    responses = [r for r in responses if r is not None]
+    if not responses:
+        return None
+
+    payload = dict(responses[0]._payload)
+    seen = set()
+    data = []
+
+    for response in responses:
+        for record in response.data:
+            key = record_key(record)
+            if key is not None:
+                if key in seen:
+                    continue
+                seen.add(key)
+            data.append(record)
+
+    payload['data'] = data
+    return Response(payload)
@@ -0,0 +1,81 @@
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+"""
+JSON codecs used by Rest and Stream.
+
+default_codec() picks the fastest installed library, orjson then ujson, and falls back to the standard library json module.
+"""
+
+
+class JSONCodec(object):
+    """
+    Standard library json codec. Subclass this to plug in another JSON library.
+    """
+    name = 'json'
+
+    def loads(self, data):
+        """
+        Decode a JSON document
+        :param data: bytes or str
+        :return: decoded object
+        """
+        return json.loads(data)
+
+    def dumps(self, obj) -> str:
+        """
+        Encode an object as a JSON string
+        :param obj: object to encode
+        :return: str
+        """
+        return json.dumps(obj)
+
+
+class OrjsonCodec(JSONCodec):
+    name = 'orjson'
+
+    def loads(self, data):
+        return orjson.loads(data)
+
+    def dumps(self, obj) -> str:
+        return orjson.dumps(obj).decode('utf-8')
+
+
+class UjsonCodec(JSONCodec):
+    name = 'ujson'
+
+    def loads(self, data):
+        return ujson.loads(data)
+
+    def dumps(self, obj) -> str:
+        return ujson.dumps(obj)
+
+
+_default_codec = None
+
+
+def default_codec() -> JSONCodec:
+    """
+    Returns the fastest available codec
+    :return: JSONCodec
+    """
+    global _default_codec
+
+    if _default_codec is None:
+        if orjson is not None:
+            _default_codec = OrjsonCodec()
+        elif ujson is not None:
+            _default_codec = UjsonCodec()
+        else:
+            _default_codec = JSONCodec()
+
+    return _default_codec
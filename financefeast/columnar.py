@@ -0,0 +1,125 @@
+import math
+from array import array
+from datetime import datetime, timezone
+from financefeast.chunking import TIMESTAMP_FIELDS, parse_timestamp
+
+"""
+Columnar representation of bar and indicator responses.
+
+Columns are held in contiguous typed `array.array` buffers, int64 epoch seconds for timestamps and float64 for every
+numeric field, so they can be viewed from NumPy without copying. Missing timestamps are stored as MISSING_TIMESTAMP, the
+int64 minimum, which NumPy datetime64 and pandas read as NaT.
+"""
+
+TIMESTAMP = 'timestamp'
+MISSING_TIMESTAMP = -2 ** 63
+
+
+class Columns(object):
+    """
+    Contiguous typed columns built from a response data list. Index by column name to get an `array.array`.
+    """
+
+    def __init__(self, columns:dict):
+        """
+        :param columns: dict of column name to array.array, all the same length
+        """
+        self._columns = columns
+
+    def __repr__(self):
+        return "{}(rows={}, columns={!r})".format(self.__class__.__name__, len(self), self.names)
+
+    def __len__(self):
+        for column in self._columns.values():
+            return len(column)
+        return 0
+
+    def __getitem__(self, name:str) -> array:
+        return self._columns[name]
+
+    def __contains__(self, name:str):
+        return name in self._columns
+
+    def __iter__(self):
+        return iter(self._columns.items())
+
+    @property
+    def names(self) -> list:
+        return list(self._columns)
+
+    def to_numpy(self) -> dict:
+        """
+        Zero copy NumPy views of the columns. Requires numpy.
+        :return: dict of column name to numpy.ndarray
+        """
+        import numpy as np
+
+        return {name: np.frombuffer(column, dtype=np.int64 if column.typecode == 'q' else np.float64)
+                for name, column in self._columns.items()}
+
+    def to_pandas(self):
+        """
+        pandas DataFrame of the columns indexed by timestamp, if there is one, with NaT for missing timestamps. Requires
+        pandas. With pandas 2 and newer the frame shares the column buffers. Older versions, which only hold nanosecond
+        timestamps and consolidate columns into one block, copy them.
+        :return: pandas.DataFrame
+        """
+        import pandas as pd
+
+        arrays = self.to_numpy()
+        timestamp = arrays.pop(TIMESTAMP, None)
+        index = pd.DatetimeIndex(timestamp.view('datetime64[s]'), copy=False) if timestamp is not None else None
+        return pd.DataFrame(arrays, index=index, copy=False)
+
+
+def to_epoch(value):
+    """
+    Convert a timestamp value to epoch seconds. Naive datetimes are treated as UTC.
+    :param value: epoch seconds or milliseconds, datetime, or date / datetime string, see chunking.parse_timestamp
+    :return: int, or None if the value can not be parsed
+    """
+    if not isinstance(value, datetime):
+        value = parse_timestamp(value)
+        if value is None:
+            return None
+
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return math.floor(value.timestamp())
+
+
+def _is_number(value) -> bool:
+    return value is None or (isinstance(value, (int, float)) and not isinstance(value, bool))
+
+
+def to_columns(records:list) -> Columns:
+    """
+    Build Columns from a list of record dicts. The first timestamp field found becomes the int64 `timestamp` column,
+    every field holding numbers becomes a float64 column and other fields are skipped. Missing values are NaN, and
+    missing or unreadable timestamps MISSING_TIMESTAMP.
+    :param records: response data list
+    :return: Columns
+    """
+    columns = {}
+    if not records or not isinstance(records[0], dict):
+        return Columns(columns)
+
+    first = records[0]
+    timestamp_field = next((field for field in TIMESTAMP_FIELDS if field in first), None)
+
+    if timestamp_field is not None:
+        epochs = [to_epoch(record.get(timestamp_field)) for record in records]
+        columns[TIMESTAMP] = array('q', [MISSING_TIMESTAMP if epoch is None else epoch for epoch in epochs])
+
+    nan = math.nan
+    for field in first:
+        if field == timestamp_field or not _is_number(first[field]):
+            continue
+
+        values = [record.get(field) for record in records]
+        if not all(_is_number(value) for value in values):
+            continue
+
+        columns[field] = array('d', [nan if value is None else value for value in values])
+
+    return Columns(columns)
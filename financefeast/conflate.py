@@ -0,0 +1,174 @@
+import logging
+import threading
+import time
+from collections import deque, namedtuple, OrderedDict
+from financefeast.message import message_ticker
+
+"""
+Conflation of Stream messages to the latest message per ticker.
+
+A new message for a ticker replaces any message for the same ticker that has not been delivered yet, so a slow
+consumer always sees the newest state and the number of pending messages is bounded by the number of tickers, not by
+the message rate. Tickers are delivered in the order they first became pending.
+
+Pass a Conflator to Stream as the dispatcher, or Stream(conflate=True), to have on_data and the attached handlers
+called from a worker thread at their own pace. Or attach one to a Stream and pull the latest messages with drain().
+"""
+
+ConflateStats = namedtuple('ConflateStats', ['received', 'delivered', 'conflated', 'dropped', 'queue_depth'])
+
+
+class Conflator(object):
+    """
+    Keeps the newest undelivered message per key, by default the ticker. Messages without a key are not conflated and
+    are delivered in order, up to max_unkeyed of them are held.
+    """
+    DEFAULT_MAX_UNKEYED = 1000
+
+    def __init__(self, key=None, min_interval:float = 0, max_unkeyed:int = DEFAULT_MAX_UNKEYED, logger:logging.Logger = None,
+                 decode=None):
+        """
+        :param key: function returning the conflation key of a decoded message, defaults to the ticker
+        :param min_interval: minimum seconds between deliveries by the worker thread, to pace the consumer
+        :param max_unkeyed: maximum number of held messages without a key, the oldest are dropped beyond this
+        :param logger: supply your own logger or use the default
+        :param decode: function applied to a message before key, Stream(raw=True) sets it to decode raw messages
+        """
+        self.min_interval = min_interval
+        self._key = key or message_ticker
+        self.decode = decode
+        self._logger = logger or logging.getLogger('ff_conflate')
+        self._pending = OrderedDict()
+        self._unkeyed = deque(maxlen=max_unkeyed)
+        self._lock = threading.Lock()
+        self._ready = threading.Condition(self._lock)
+        self._thread = None
+        self._target = None
+        self._running = False
+        self._received = 0
+        self._delivered = 0
+        self._conflated = 0
+        self._dropped = 0
+
+    def __call__(self, stream, data):
+        self.submit(data)
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._pending) + len(self._unkeyed)
+
+    @property
+    def dropped(self) -> int:
+        return self._dropped
+
+    @property
+    def stats(self) -> ConflateStats:
+        with self._lock:
+            return ConflateStats(self._received, self._delivered, self._conflated, self._dropped, self.queue_depth)
+
+    @property
+    def running(self) -> bool:
+        return self._running
+
+    def submit(self, data):
+        """
+        Add a decoded message, replacing any undelivered message with the same key
+        :param data: decoded message
+        :return: True
+        """
+        key = self._key(self.decode(data) if self.decode else data)
+
+        with self._lock:
+            self._received += 1
+            if key is None:
+                if len(self._unkeyed) == self._unkeyed.maxlen:
+                    self._dropped += 1
+                self._unkeyed.append(data)
+            elif key in self._pending:
+                self._pending[key] = data
+                self._conflated += 1
+            else:
+                self._pending[key] = data
+            self._ready.notify()
+
+        return True
+
+    def latest(self, key):
+        """
+        The undelivered message for a key, without removing it
+        :param key: ticker
+        :return: decoded message, or None
+        """
+        with self._lock:
+            return self._pending.get(key.lower() if isinstance(key, str) else key)
+
+    def drain(self) -> list:
+        """
+        Remove and return every undelivered message, unkeyed messages first, then one per key
+        :return: list of decoded messages
+        """
+        with self._lock:
+            messages = list(self._unkeyed) + list(self._pending.values())
+            self._unkeyed.clear()
+            self._pending.clear()
+            self._delivered += len(messages)
+        return messages
+
+    def start(self, target):
+        """
+        Start the worker thread that delivers messages
+        :param target: function called with each message
+        :return:
+        """
+        self._target = target
+        if self._running:
+            return
+
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name='ff_conflate', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout:float = None):
+        """
+        Stop the worker thread after the pending messages have been delivered
+        :param timeout: seconds to wait for the worker
+        :return:
+        """
+        with self._lock:
+            self._running = False
+            self._ready.notify()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _next(self):
+        """
+        Wait for and remove the next message
+        :return: (message, True), or (None, False) once stopped and empty
+        """
+        with self._lock:
+            while not self._unkeyed and not self._pending:
+                if not self._running:
+                    return None, False
+                self._ready.wait(0.5)
+
+            if self._unkeyed:
+                data = self._unkeyed.popleft()
+            else:
+                data = self._pending.popitem(last=False)[1]
+            self._delivered += 1
+            return data, True
+
+    def _run(self):
+        while True:
+            data, ok = self._next()
+            if not ok:
+                return
+
+            try:
+                self._target(data)
+            except Exception as e:
+                self._logger.error(f"error delivering conflated message: {e}")
+
+            if self.min_interval:
+                time.sleep(self.min_interval)
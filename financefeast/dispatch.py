@@ -0,0 +1,200 @@
+import logging
+import threading
+import zlib
+from collections import deque, namedtuple
+from financefeast.message import message_ticker
+
+"""
+Dispatch of Stream messages off the websocket thread.
+
+The websocket thread only reads and decodes messages and puts them on bounded queues. A pool of worker threads calls
+on_data and the attached handlers. Messages with the same key, by default the ticker, always go to the same worker so
+they are handled in the order they were received. Messages without a key all go to the first worker. Undecoded
+messages from Stream(raw=True) are decoded with `decode` to find their key, and the workers still receive them raw.
+
+When a worker queue is full the overflow policy decides what happens:
+    BLOCK        the websocket thread waits for space, which pushes back on the server
+    DROP_OLDEST  the oldest queued message is discarded to make room
+    DROP_NEWEST  the new message is discarded
+"""
+
+BLOCK = 'block'
+DROP_OLDEST = 'drop_oldest'
+DROP_NEWEST = 'drop_newest'
+
+DispatchStats = namedtuple('DispatchStats', ['received', 'processed', 'dropped_oldest', 'dropped_newest', 'queue_depth', 'max_queue'])
+
+
+class _WorkerQueue(object):
+    """
+    Bounded FIFO with a selectable overflow policy
+    """
+
+    def __init__(self, maxsize:int):
+        self.maxsize = maxsize
+        self._items = deque()
+        self._lock = threading.Lock()
+        self._not_empty = threading.Condition(self._lock)
+        self._not_full = threading.Condition(self._lock)
+
+    def __len__(self):
+        return len(self._items)
+
+    def put(self, item, policy:str) -> int:
+        """
+        :return: 0 if nothing was dropped, 1 if the oldest item was dropped, -1 if item was dropped
+        """
+        with self._lock:
+            dropped = 0
+            if len(self._items) >= self.maxsize:
+                if policy == DROP_NEWEST:
+                    return -1
+                if policy == DROP_OLDEST:
+                    self._items.popleft()
+                    dropped = 1
+                else:
+                    while len(self._items) >= self.maxsize:
+                        self._not_full.wait()
+
+            self._items.append(item)
+            self._not_empty.notify()
+            return dropped
+
+    def get(self, timeout:float = None):
+        with self._lock:
+            if not self._items:
+                self._not_empty.wait(timeout)
+                if not self._items:
+                    return _EMPTY
+            item = self._items.popleft()
+            self._not_full.notify()
+            return item
+
+
+class Dispatcher(object):
+    """
+    Bounded queue and worker pool between the websocket thread and the Stream callbacks. Pass one to Stream.
+    """
+    DEFAULT_MAX_QUEUE = 10000
+
+    def __init__(self, workers:int = 1, max_queue:int = DEFAULT_MAX_QUEUE, overflow:str = BLOCK, key=None,
+                 logger:logging.Logger = None, decode=None):
+        """
+        :param workers: number of dispatch threads
+        :param max_queue: maximum number of queued messages, shared evenly between the workers
+        :param overflow: BLOCK, DROP_OLDEST or DROP_NEWEST
+        :param key: function returning the ordering key of a decoded message, defaults to the ticker
+        :param logger: supply your own logger or use the default
+        :param decode: function applied to a message before key, Stream(raw=True) sets it to decode raw messages. Only
+        used with more than one worker
+        """
+        if overflow not in (BLOCK, DROP_OLDEST, DROP_NEWEST):
+            raise ValueError(f"overflow must be one of {BLOCK!r}, {DROP_OLDEST!r} or {DROP_NEWEST!r}")
+        if workers < 1:
+            raise ValueError("workers must be at least 1")
+
+        self.workers = workers
+        self.max_queue = max_queue
+        self.overflow = overflow
+        self._key = key or message_ticker
+        self.decode = decode
+        self._logger = logger or logging.getLogger('ff_dispatch')
+        self._queues = [_WorkerQueue(max(max_queue // workers, 1)) for _ in range(workers)]
+        self._threads = []
+        self._target = None
+        self._running = False
+        self._lock = threading.Lock()
+        self._received = 0
+        self._processed = 0
+        self._dropped_oldest = 0
+        self._dropped_newest = 0
+
+    @property
+    def dropped(self) -> int:
+        return self._dropped_oldest + self._dropped_newest
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(len(queue) for queue in self._queues)
+
+    @property
+    def stats(self) -> DispatchStats:
+        with self._lock:
+            return DispatchStats(self._received, self._processed, self._dropped_oldest, self._dropped_newest,
+                                 self.queue_depth, self.max_queue)
+
+    @property
+    def running(self) -> bool:
+        return self._running
+
+    def start(self, target):
+        """
+        Start the worker threads
+        :param target: function called by the workers with each message
+        :return:
+        """
+        self._target = target
+        if self._running:
+            return
+
+        self._running = True
+        self._threads = [threading.Thread(target=self._run, args=(queue,), name=f'ff_dispatch_{i}', daemon=True)
+                         for i, queue in enumerate(self._queues)]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self, timeout:float = None):
+        """
+        Stop the workers after the queued messages have been dispatched
+        :param timeout: seconds to wait for each worker
+        :return:
+        """
+        self._running = False
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def submit(self, data):
+        """
+        Queue a decoded message for dispatch. Called on the websocket thread.
+        :param data: decoded message
+        :return: True if queued, False if it was dropped
+        """
+        key = self._key(self.decode(data) if self.decode else data) if self.workers > 1 else None
+        queue = self._queues[self._index(key)]
+
+        dropped = queue.put(data, self.overflow)
+
+        with self._lock:
+            self._received += 1
+            if dropped > 0:
+                self._dropped_oldest += 1
+            elif dropped < 0:
+                self._dropped_newest += 1
+
+        return dropped >= 0
+
+    def _index(self, key) -> int:
+        if key is None:
+            return 0
+        if isinstance(key, str):
+            # stable across processes, unlike hash() of a str
+            return zlib.crc32(key.encode('utf-8')) % self.workers
+        return hash(key) % self.workers
+
+    def _run(self, queue:_WorkerQueue):
+        while self._running or len(queue):
+            data = queue.get(timeout=0.5)
+            if data is _EMPTY:
+                continue
+
+            try:
+                self._target(data)
+            except Exception as e:
+                self._logger.error(f"error dispatching message: {e}")
+
+            with self._lock:
+                self._processed += 1
+
+
+_EMPTY = object()
@@ -1,4 +1,6 @@
+from collections import namedtuple
 from types import SimpleNamespace
+import time
 
 """
 The Response class returns 
@@ -32,9 +34,52 @@ class Response(object):
         except KeyError:
             return []
 
+    def columns(self):
+        """
+        Returns the data list as contiguous typed columns, int64 epoch seconds for the timestamp and float64 for every
+        numeric field. Use .to_numpy() on the result for zero copy arrays, or .to_pandas() for a DataFrame.
+        :return: financefeast.columnar.Columns
+        """
+        from financefeast.columnar import to_columns
+
+        return to_columns(self.data)
+
     @property
     def all(self):
         try:
             return SimpleNamespace(**self._payload)
         except KeyError:
             return []
+
+
+class BulkResult(namedtuple('BulkResult', ['ticker', 'endpoint', 'response', 'error'])):
+    """
+    One result from a bulk request. Either response is the endpoint Response, or error is the exception raised for
+    this ticker and endpoint.
+    """
+    __slots__ = ()
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+class RequestInfo(object):
+    """
+    One HTTP request attempt, passed to the Rest on_request and on_response hooks. The same object is passed to both,
+    so a hook can keep its own state, eg a tracing span, in `context`.
+    """
+
+    def __init__(self, endpoint:str, url:str, params:dict, attempt:int):
+        self.endpoint = endpoint
+        self.url = url
+        self.params = params
+        self.attempt = attempt
+        self.started = time.time()
+        self.elapsed = None
+        self.status_code = None
+        self.error = None
+        self.context = {}
+
+    def __repr__(self):
+        return "{}({!r})".format(self.__class__.__name__, self.__dict__)
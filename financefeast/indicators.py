@@ -0,0 +1,368 @@
+import math
+import threading
+from collections import deque
+from financefeast.entity import Response
+from financefeast.message import MessageFields, DEFAULT_FIELDS
+
+"""
+Incremental technical indicators for live data.
+
+Each indicator keeps a small running state and updates in constant time per price, so values can be kept current on
+every Stream message instead of calling the ta/* endpoints on a timer. The conventions match financefeast.ta, so an
+indicator seeded from historical bars continues exactly where the vectorized result ends.
+
+    indicators = IndicatorSet({'ema_20': EMA(20), 'rsi': RSI(14)}, on_update=print)
+    indicators.seed('air.nz', client.intraday('air.nz', datetime_from='2021-08-01', datetime_to='2021-08-05'))
+    stream.attach(indicators)
+"""
+
+
+class Indicator(object):
+    """
+    Base class of the incremental indicators. `value` is None until enough prices have been seen.
+    """
+
+    def __init__(self):
+        self.count = 0
+
+    def __repr__(self):
+        return "{}(value={!r})".format(self.__class__.__name__, self.value)
+
+    @property
+    def value(self):
+        raise NotImplementedError()
+
+    @property
+    def ready(self) -> bool:
+        return self.value is not None
+
+    def update(self, price:float):
+        """
+        Add the next price
+        :param price: trade price or bar close
+        :return: the new value
+        """
+        raise NotImplementedError()
+
+    def update_bar(self, high:float, low:float, close:float):
+        """
+        Add the next bar. Indicators that only use the close ignore high and low.
+        :return: the new value
+        """
+        return self.update(close)
+
+    def seed(self, bars):
+        """
+        Replay historical bars so the value is correct from the first live price
+        :param bars: Response, list of bar records, or list of close prices, oldest first
+        :return: self
+        """
+        records = bars.data if isinstance(bars, Response) else bars
+        for record in records:
+            if isinstance(record, dict):
+                close = record.get('close')
+                if close is not None:
+                    self.update_bar(record.get('high', close), record.get('low', close), close)
+            else:
+                self.update(record)
+        return self
+
+    def clone(self):
+        """
+        A new indicator with the same parameters and no state
+        """
+        raise NotImplementedError()
+
+
+class EMA(Indicator):
+    """
+    Exponential moving average, not bias adjusted, starting from the first price
+    """
+
+    def __init__(self, window:int = 30):
+        super().__init__()
+        self.window = window
+        self._alpha = 2.0 / (window + 1)
+        self._ema = None
+
+    @property
+    def value(self):
+        return self._ema if self.count >= self.window else None
+
+    def update(self, price:float):
+        self.count += 1
+        self._ema = price if self._ema is None else self._ema + self._alpha * (price - self._ema)
+        return self.value
+
+    def clone(self):
+        return EMA(self.window)
+
+
+class SMA(Indicator):
+    """
+    Simple moving average over a ring buffer of the last window prices
+    """
+
+    def __init__(self, window:int = 30):
+        super().__init__()
+        self.window = window
+        self._buffer = [0.0] * window
+        self._sum = 0.0
+
+    @property
+    def value(self):
+        return self._sum / self.window if self.count >= self.window else None
+
+    def update(self, price:float):
+        index = self.count % self.window
+        self._sum += price - self._buffer[index]
+        self._buffer[index] = price
+        self.count += 1
+
+        # recompute once per lap of the buffer so rounding errors in the running sum do not accumulate
+        if index == self.window - 1 or not math.isfinite(self._sum):
+            self._sum = math.fsum(self._buffer)
+
+        return self.value
+
+    def clone(self):
+        return SMA(self.window)
+
+
+class RSI(Indicator):
+    """
+    Relative strength index with Wilder smoothing
+    """
+
+    def __init__(self, window:int = 14):
+        super().__init__()
+        self.window = window
+        self._alpha = 1.0 / window
+        self._last = None
+        self._up = 0.0
+        self._down = 0.0
+
+    @property
+    def value(self):
+        if self.count < self.window:
+            return None
+        if self._down == 0:
+            return 100.0
+        return 100.0 - 100.0 / (1.0 + self._up / self._down)
+
+    def update(self, price:float):
+        if self._last is not None:
+            change = price - self._last
+            self._up += self._alpha * (max(change, 0.0) - self._up)
+            self._down += self._alpha * (max(-change, 0.0) - self._down)
+        self._last = price
+        self.count += 1
+        return self.value
+
+    def clone(self):
+        return RSI(self.window)
+
+
+class MACD(Indicator):
+    """
+    Moving average convergence divergence. The value is a dict with macd, macd_signal and macd_diff, the signal and
+    diff are None until the signal line has a full window.
+    """
+
+    def __init__(self, window_fast:int = 12, window_slow:int = 26, window_sign:int = 9):
+        super().__init__()
+        self.window_fast = window_fast
+        self.window_slow = window_slow
+        self.window_sign = window_sign
+        self._fast = EMA(window_fast)
+        self._slow = EMA(window_slow)
+        self._signal = EMA(window_sign)
+        self._line = None
+
+    @property
+    def value(self):
+        if self._line is None:
+            return None
+        signal = self._signal.value
+        return {'macd': self._line, 'macd_signal': signal, 'macd_diff': None if signal is None else self._line - signal}
+
+    def update(self, price:float):
+        self.count += 1
+        fast = self._fast.update(price)
+        slow = self._slow.update(price)
+        if fast is not None and slow is not None:
+            self._line = fast - slow
+            self._signal.update(self._line)
+        return self.value
+
+    def clone(self):
+        return MACD(self.window_fast, self.window_slow, self.window_sign)
+
+
+class Bollinger(Indicator):
+    """
+    Bollinger bands over a ring buffer, using the population standard deviation. The value is a dict with
+    bollinger_mavg, bollinger_hband and bollinger_lband.
+    """
+
+    def __init__(self, window:int = 20, window_dev:float = 2):
+        super().__init__()
+        self.window = window
+        self.window_dev = window_dev
+        self._buffer = [0.0] * window
+        self._sum = 0.0
+        self._sum_sq = 0.0
+
+    @property
+    def value(self):
+        if self.count < self.window:
+            return None
+        mavg = self._sum / self.window
+        std = math.sqrt(max(self._sum_sq / self.window - mavg * mavg, 0.0))
+        return {
+            'bollinger_mavg': mavg,
+            'bollinger_hband': mavg + self.window_dev * std,
+            'bollinger_lband': mavg - self.window_dev * std,
+        }
+
+    def update(self, price:float):
+        index = self.count % self.window
+        previous = self._buffer[index]
+        self._sum += price - previous
+        self._sum_sq += price * price - previous * previous
+        self._buffer[index] = price
+        self.count += 1
+
+        if index == self.window - 1:
+            self._sum = math.fsum(self._buffer)
+            self._sum_sq = math.fsum(value * value for value in self._buffer)
+
+        return self.value
+
+    def clone(self):
+        return Bollinger(self.window, self.window_dev)
+
+
+class Stochastic(Indicator):
+    """
+    Stochastic oscillator. Highs and lows over the window are tracked with monotonic queues, so each update is constant
+    time on average. Live prices count as bars with high, low and close all equal to the price. The value is a dict
+    with stoch and stoch_signal, the signal is None until it has a full window.
+    """
+
+    def __init__(self, window:int = 14, window_sma:int = 3):
+        super().__init__()
+        self.window = window
+        self.window_sma = window_sma
+        self._highs = deque()
+        self._lows = deque()
+        self._signal = SMA(window_sma)
+        self._k = None
+
+    @property
+    def value(self):
+        if self._k is None:
+            return None
+        return {'stoch': self._k, 'stoch_signal': self._signal.value}
+
+    def update(self, price:float):
+        return self.update_bar(price, price, price)
+
+    def update_bar(self, high:float, low:float, close:float):
+        index = self.count
+        self.count += 1
+
+        while self._highs and self._highs[-1][1] <= high:
+            self._highs.pop()
+        self._highs.append((index, high))
+        while self._lows and self._lows[-1][1] >= low:
+            self._lows.pop()
+        self._lows.append((index, low))
+
+        oldest = index - self.window + 1
+        while self._highs[0][0] < oldest:
+            self._highs.popleft()
+        while self._lows[0][0] < oldest:
+            self._lows.popleft()
+
+        if self.count >= self.window:
+            highest, lowest = self._highs[0][1], self._lows[0][1]
+            self._k = 100.0 * (close - lowest) / (highest - lowest) if highest != lowest else math.nan
+            self._signal.update(self._k)
+
+        return self.value
+
+    def clone(self):
+        return Stochastic(self.window, self.window_sma)
+
+
+class IndicatorSet(object):
+    """
+    A set of named indicators kept per ticker and updated from Stream messages. Attach it to a Stream with
+    Stream.attach(). Indicators passed in are templates, each ticker gets its own clones.
+    """
+
+    def __init__(self, indicators:dict, tickers:list = None, on_update=None, fields:MessageFields = None):
+        """
+        :param indicators: dict of name to Indicator
+        :param tickers: only track these tickers, default is every ticker seen
+        :param on_update: optional callback called with (ticker, values) after each update, values is a dict of name to value
+        :param fields: MessageFields used to read ticker and price from messages
+        """
+        self._templates = dict(indicators)
+        self._tickers = {ticker.lower() for ticker in tickers} if tickers else None
+        self._on_update = on_update
+        self._fields = fields or DEFAULT_FIELDS
+        self._state = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, stream, data):
+        for tick in self._fields.ticks(data):
+            self.update(tick.ticker, tick.price)
+
+    def indicators(self, ticker:str) -> dict:
+        """
+        Returns the indicator objects of a ticker, created on first use
+        :param ticker: ticker symbol
+        :return: dict of name to Indicator
+        """
+        ticker = ticker.lower() if isinstance(ticker, str) else ticker
+        state = self._state.get(ticker)
+        if state is None:
+            with self._lock:
+                state = self._state.setdefault(ticker, {name: template.clone() for name, template in self._templates.items()})
+        return state
+
+    def values(self, ticker:str) -> dict:
+        """
+        Current values of a ticker
+        :param ticker: ticker symbol
+        :return: dict of name to value, None where an indicator is not ready
+        """
+        return {name: indicator.value for name, indicator in self.indicators(ticker).items()}
+
+    def update(self, ticker:str, price:float) -> dict:
+        """
+        Add a price for a ticker
+        :param ticker: ticker symbol
+        :param price: trade price
+        :return: dict of name to value, or None if the ticker is not tracked
+        """
+        if ticker is None or (self._tickers is not None and ticker.lower() not in self._tickers):
+            return None
+
+        values = {name: indicator.update(price) for name, indicator in self.indicators(ticker).items()}
+        if self._on_update:
+            self._on_update(ticker, values)
+        return values
+
+    def seed(self, ticker:str, bars):
+        """
+        Replay historical bars for a ticker, eg the Response of Rest.intraday
+        :param ticker: ticker symbol
+        :param bars: Response, list of bar records, or list of close prices, oldest first
+        :return: dict of name to value
+        """
+        for indicator in self.indicators(ticker).values():
+            indicator.seed(bars)
+        return self.values(ticker)
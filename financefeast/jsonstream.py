@@ -0,0 +1,238 @@
+import codecs
+import json
+
+"""
+Incremental JSON decoding of large API responses.
+
+The API wraps records in an object such as {"ticker": ..., "data": [{...}, {...}]}. JSONArrayParser is fed the body in
+chunks as it arrives and returns the records of the data array as soon as each one is complete, so the whole body and
+the whole decoded list are never held in memory at once.
+"""
+
+_WHITESPACE = ' \t\n\r'
+_DELIMITERS = _WHITESPACE + ',]}'
+
+# parser states
+_START = 0
+_KEY = 1
+_COLON = 2
+_VALUE = 3
+_AFTER_VALUE = 4
+_ITEM = 5
+_AFTER_ITEM = 6
+_DONE = 7
+
+
+class JSONArrayParser(object):
+    """
+    Push parser that yields the elements of one array inside a JSON object. If the body is itself an array its
+    elements are returned. Other top level fields of the object are collected in `payload`.
+    """
+
+    def __init__(self, key:str = 'data'):
+        """
+        :param key: name of the top level field holding the array to stream
+        """
+        self.key = key
+        self.payload = {}
+        self._buf = ''
+        self._pos = 0
+        self._state = _START
+        self._current_key = None
+        self._top_level_array = False
+        self._decoder = json.JSONDecoder()
+        self._utf8 = codecs.getincrementaldecoder('utf-8')()
+
+    @property
+    def done(self) -> bool:
+        return self._state == _DONE
+
+    def feed(self, chunk) -> list:
+        """
+        Feed the next part of the body
+        :param chunk: bytes or str
+        :return: list of records completed by this chunk
+        """
+        if isinstance(chunk, bytes):
+            chunk = self._utf8.decode(chunk)
+
+        self._buf += chunk
+        records = self._parse(final=False)
+
+        # drop text that has been consumed
+        self._buf = self._buf[self._pos:]
+        self._pos = 0
+        return records
+
+    def close(self) -> list:
+        """
+        Signal the end of the body
+        :return: list of any remaining records
+        """
+        self._buf += self._utf8.decode(b'', final=True)
+        records = self._parse(final=True)
+
+        if self._state != _DONE:
+            raise ValueError("JSON body ended before it was complete")
+
+        return records
+
+    def _skip_whitespace(self):
+        buf = self._buf
+        pos = self._pos
+        while pos < len(buf) and buf[pos] in _WHITESPACE:
+            pos += 1
+        self._pos = pos
+        return pos < len(buf)
+
+    def _decode(self, final:bool):
+        """
+        Decode one complete value at the current position
+        :return: (True, value) or (False, None) if more data is needed
+        """
+        try:
+            value, end = self._decoder.raw_decode(self._buf, self._pos)
+        except json.JSONDecodeError:
+            if final:
+                raise
+            return False, None
+
+        # a number or literal is only complete once a delimiter follows it, "12." or "1e" may be the start of "12.5" or
+        # "1e3" split across chunks
+        if not final and not isinstance(value, (str, dict, list)):
+            if end >= len(self._buf) or self._buf[end] not in _DELIMITERS:
+                return False, None
+
+        self._pos = end
+        return True, value
+
+    def _parse(self, final:bool) -> list:
+        records = []
+
+        while self._state != _DONE and self._skip_whitespace():
+            char = self._buf[self._pos]
+
+            if self._state == _START:
+                if char == '{':
+                    self._state = _KEY
+                elif char == '[':
+                    self._top_level_array = True
+                    self._state = _ITEM
+                else:
+                    raise ValueError(f"Expected a JSON object or array, found {char!r}")
+                self._pos += 1
+
+            elif self._state == _KEY:
+                if char == '}':
+                    self._pos += 1
+                    self._state = _DONE
+                    continue
+                complete, self._current_key = self._decode(final)
+                if not complete:
+                    break
+                self._state = _COLON
+
+            elif self._state == _COLON:
+                if char != ':':
+                    raise ValueError(f"Expected ':' after key {self._current_key!r}, found {char!r}")
+                self._pos += 1
+                self._state = _VALUE
+
+            elif self._state == _VALUE:
+                if self._current_key == self.key and char == '[':
+                    self._pos += 1
+                    self._state = _ITEM
+                    continue
+                complete, value = self._decode(final)
+                if not complete:
+                    break
+                self.payload[self._current_key] = value
+                self._state = _AFTER_VALUE
+
+            elif self._state == _AFTER_VALUE:
+                self._pos += 1
+                if char == ',':
+                    self._state = _KEY
+                elif char == '}':
+                    self._state = _DONE
+                else:
+                    raise ValueError(f"Expected ',' or '}}', found {char!r}")
+
+            elif self._state == _ITEM:
+                if char == ']':
+                    self._pos += 1
+                    self._end_array()
+                    continue
+                complete, value = self._decode(final)
+                if not complete:
+                    break
+                records.append(value)
+                self._state = _AFTER_ITEM
+
+            elif self._state == _AFTER_ITEM:
+                self._pos += 1
+                if char == ',':
+                    self._state = _ITEM
+                elif char == ']':
+                    self._end_array()
+                else:
+                    raise ValueError(f"Expected ',' or ']', found {char!r}")
+
+        return records
+
+    def _end_array(self):
+        self._state = _DONE if self._top_level_array else _AFTER_VALUE
+
+
+class RecordBatcher(object):
+    """
+    Groups records into lists of batch_size. With no batch_size records are passed through one by one.
+    """
+
+    def __init__(self, batch_size:int = None):
+        self.batch_size = batch_size
+        self._batch = []
+
+    def add(self, records:list) -> list:
+        """
+        :param records: newly parsed records
+        :return: list of items ready to yield, either records or full batches
+        """
+        if self.batch_size is None:
+            return records
+
+        ready = []
+        for record in records:
+            self._batch.append(record)
+            if len(self._batch) >= self.batch_size:
+                ready.append(self._batch)
+                self._batch = []
+        return ready
+
+    def flush(self) -> list:
+        """
+        :return: the final partial batch, if any
+        """
+        if not self._batch:
+            return []
+        ready = [self._batch]
+        self._batch = []
+        return ready
+
+
+def iter_records(chunks, key:str = 'data', batch_size:int = None):
+    """
+    Yield the records of a JSON body from an iterable of chunks
+    :param chunks: iterable of bytes or str
+    :param key: name of the top level field holding the records
+    :param batch_size: if set, yield lists of up to batch_size records instead of single records
+    :return: generator
+    """
+    parser = JSONArrayParser(key=key)
+    batcher = RecordBatcher(batch_size)
+
+    for chunk in chunks:
+        yield from batcher.add(parser.feed(chunk))
+
+    yield from batcher.add(parser.close())
+    yield from batcher.flush()
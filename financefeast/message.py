@@ -0,0 +1,150 @@
+from collections import namedtuple
+from datetime import datetime, timezone
+from financefeast.chunking import TIMESTAMP_FIELDS
+from financefeast.columnar import to_epoch
+
+"""
+Extract price updates from decoded Stream messages.
+
+Stream messages are JSON objects. Fields are looked up on the message itself and then on its `data` member, which may be
+an object or a list of objects. The field names tried for each value can be changed with MessageFields.
+"""
+
+Tick = namedtuple('Tick', ['ticker', 'price', 'volume', 'timestamp'])
+
+
+class MessageFields(object):
+    """
+    Names of the message fields holding the ticker, price, volume and timestamp of an update. The first name present
+    in a message is used.
+    """
+    TICKER = ('ticker', 'symbol')
+    PRICE = ('price', 'last', 'close')
+    VOLUME = ('volume', 'size', 'quantity')
+    TIMESTAMP = ('timestamp',) + tuple(field for field in TIMESTAMP_FIELDS if field != 'timestamp')
+
+    def __init__(self, ticker:tuple = TICKER, price:tuple = PRICE, volume:tuple = VOLUME, timestamp:tuple = TIMESTAMP):
+        """
+        :param ticker: field names for the ticker
+        :param price: field names for the price
+        :param volume: field names for the traded volume
+        :param timestamp: field names for the exchange timestamp, epoch seconds or ISO 8601 string
+        """
+        self.ticker = _names(ticker)
+        self.price = _names(price)
+        self.volume = _names(volume)
+        self.timestamp = _names(timestamp)
+
+    def ticks(self, message) -> list:
+        """
+        Returns the price updates held in a decoded message
+        :param message: decoded Stream message
+        :return: list of Tick, empty if the message carries no price
+        """
+        if not isinstance(message, dict):
+            return []
+
+        data = message.get('data')
+        if isinstance(data, list):
+            return [tick for tick in (self._tick(item, message) for item in data if isinstance(item, dict)) if tick]
+
+        tick = self._tick(data, message) if isinstance(data, dict) else self._tick(message, {})
+        return [tick] if tick else []
+
+    def _tick(self, record:dict, parent:dict):
+        price = _number(_first(record, parent, self.price))
+        if price is None:
+            return None
+
+        ticker = _first(record, parent, self.ticker)
+        volume = _number(_first(record, parent, self.volume))
+        timestamp = _first(record, parent, self.timestamp)
+        return Tick(ticker.lower() if isinstance(ticker, str) else ticker, price, volume or 0.0, _timestamp(timestamp))
+
+
+def _names(names) -> tuple:
+    return (names,) if isinstance(names, str) else tuple(names)
+
+
+def _first(record:dict, parent:dict, names:tuple):
+    for name in names:
+        if name in record:
+            return record[name]
+    for name in names:
+        if name in parent:
+            return parent[name]
+    return None
+
+
+def _timestamp(value):
+    """
+    Epoch seconds of a timestamp value, keeping fractions of a second. Values above 1e11 are taken as milliseconds.
+    """
+    if value is None:
+        return None
+    number = _number(value)
+    if number is not None:
+        return number / 1000.0 if number > 1e11 else number
+    if isinstance(value, str):
+        try:
+            parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        except ValueError:
+            return None
+        return (parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)).timestamp()
+    return to_epoch(value)
+
+
+def _number(value):
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        try:
+            return float(value)
+        except ValueError:
+            return None
+    return None
+
+
+DEFAULT_FIELDS = MessageFields()
+
+
+def message_ticker(message, names:tuple = MessageFields.TICKER):
+    """
+    Ticker of a decoded message, looked up on the message and then on its data member. For a data list the first
+    record is used.
+    :param message: decoded Stream message
+    :param names: ticker field names
+    :return: lower case ticker, or None
+    """
+    if not isinstance(message, dict):
+        return None
+
+    data = message.get('data')
+    if isinstance(data, list):
+        data = data[0] if data and isinstance(data[0], dict) else None
+
+    ticker = _first(data if isinstance(data, dict) else {}, message, names)
+    return ticker.lower() if isinstance(ticker, str) else ticker
+
+
+def message_timestamp(message, names:tuple = MessageFields.TIMESTAMP):
+    """
+    Exchange timestamp of a decoded message, looked up on the message and then on its data member. For a data list
+    the first record is used.
+    :param message: decoded Stream message
+    :param names: timestamp field names
+    :return: epoch seconds, or None
+    """
+    if not isinstance(message, dict):
+        return None
+
+    data = message.get('data')
+    if isinstance(data, list):
+        data = data[0] if data and isinstance(data[0], dict) else None
+
+    try:
+        return _timestamp(_first(data if isinstance(data, dict) else {}, message, names))
+    except (TypeError, ValueError):
+        return None
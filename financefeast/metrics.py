@@ -0,0 +1,560 @@
+import logging
+import math
+import sys
+import threading
+import time
+from collections import namedtuple
+from urllib.parse import urlsplit
+from financefeast.message import MessageFields, message_timestamp
+
+"""
+Metrics for the Stream and Rest clients.
+
+Counters and histograms are updated inline as messages are read and dispatched, each update costs a lock and a few
+arithmetic operations so they can be left on in production. Histograms are streaming, with log-linear buckets: memory
+depends on the range of the values, not on how many are recorded, and percentiles are within 1/SUB_BUCKETS of the
+recorded values.
+
+    metrics = StreamMetrics(report_interval=60)
+    client = Stream(token='your_api_token', on_data=on_data, metrics=metrics)
+    ...
+    print(metrics.snapshot().latency.p99)
+
+RestMetrics does the same per endpoint for Rest requests and can be exported in the Prometheus text format.
+
+All times are in seconds.
+"""
+
+HistogramSnapshot = namedtuple('HistogramSnapshot', ['count', 'mean', 'min', 'max', 'p50', 'p90', 'p99', 'p999'])
+
+StreamSnapshot = namedtuple('StreamSnapshot', [
+    'timestamp', 'interval', 'messages', 'bytes', 'messages_per_sec', 'bytes_per_sec', 'decode', 'callback', 'latency',
+    'queue_depth', 'dropped', 'connected', 'connections', 'reconnects', 'downtime', 'ping_rtt'])
+
+EndpointSnapshot = namedtuple('EndpointSnapshot', [
+    'endpoint', 'requests', 'attempts', 'statuses', 'errors', 'retries', 'rate_limited', 'bytes', 'time_to_headers',
+    'total', 'size', 'ratelimit_remaining'])
+
+PERCENTILES = (50, 90, 99, 99.9)
+
+
+class Histogram(object):
+    """
+    Streaming histogram of float values with log-linear buckets. Each power of two is split into SUB_BUCKETS buckets,
+    so a bucket spans about 1/SUB_BUCKETS of its values. Negative values, eg latency under clock skew, are kept too.
+    """
+    SUB_BUCKETS = 32
+    _EXPONENT_OFFSET = 1100
+
+    def __init__(self, sub_buckets:int = SUB_BUCKETS):
+        """
+        :param sub_buckets: buckets per power of two
+        """
+        self.sub_buckets = sub_buckets
+        self._lock = threading.Lock()
+        self.reset()
+
+    def __len__(self):
+        return self.count
+
+    def reset(self):
+        with self._lock:
+            self._counts = {}
+            self.count = 0
+            self.sum = 0.0
+            self.min = None
+            self.max = None
+
+    def record(self, value:float):
+        """
+        Add a value
+        :param value: float
+        :return:
+        """
+        index = self._index(value)
+        with self._lock:
+            self._counts[index] = self._counts.get(index, 0) + 1
+            self.count += 1
+            self.sum += value
+            if self.min is None or value < self.min:
+                self.min = value
+            if self.max is None or value > self.max:
+                self.max = value
+
+    def merge(self, other:'Histogram'):
+        """
+        Add the values recorded by another histogram with the same sub_buckets
+        :param other: Histogram
+        :return:
+        """
+        if other.sub_buckets != self.sub_buckets:
+            raise ValueError("can only merge histograms with the same sub_buckets")
+        with other._lock:
+            counts, count, total, low, high = dict(other._counts), other.count, other.sum, other.min, other.max
+        with self._lock:
+            for index, n in counts.items():
+                self._counts[index] = self._counts.get(index, 0) + n
+            self.count += count
+            self.sum += total
+            if low is not None and (self.min is None or low < self.min):
+                self.min = low
+            if high is not None and (self.max is None or high > self.max):
+                self.max = high
+
+    @property
+    def mean(self):
+        return self.sum / self.count if self.count else None
+
+    def percentile(self, percentile:float):
+        """
+        :param percentile: 0 to 100
+        :return: value at the percentile, or None if nothing was recorded
+        """
+        return self.percentiles((percentile,))[0]
+
+    def percentiles(self, percentiles:tuple = PERCENTILES) -> list:
+        """
+        :param percentiles: percentiles, 0 to 100
+        :return: list of values at each percentile, None if nothing was recorded
+        """
+        with self._lock:
+            counts, count, low, high = sorted(self._counts.items()), self.count, self.min, self.max
+
+        if not count:
+            return [None] * len(percentiles)
+
+        ranks = sorted((max(1, math.ceil(p / 100.0 * count)), i) for i, p in enumerate(percentiles))
+        values = [None] * len(percentiles)
+        seen = 0
+        position = 0
+        for index, n in counts:
+            seen += n
+            while position < len(ranks) and ranks[position][0] <= seen:
+                values[ranks[position][1]] = float(min(max(self._value(index), low), high))
+                position += 1
+            if position == len(ranks):
+                break
+        return values
+
+    def buckets(self) -> list:
+        """
+        :return: sorted list of (bucket upper bound, count) for the non empty buckets
+        """
+        with self._lock:
+            counts = sorted(self._counts.items())
+        return [(self._upper(index), n) for index, n in counts]
+
+    def snapshot(self) -> HistogramSnapshot:
+        p50, p90, p99, p999 = self.percentiles(PERCENTILES)
+        return HistogramSnapshot(self.count, self.mean, self.min, self.max, p50, p90, p99, p999)
+
+    def _index(self, value:float) -> int:
+        """
+        Bucket index, increasing with the value. 0 holds zero and negative values mirror positive ones.
+        """
+        if value == 0 or value != value:
+            return 0
+        # infinity goes in the highest bucket, percentiles are still clamped to the recorded max
+        mantissa, exponent = math.frexp(min(abs(value), sys.float_info.max))
+        index = (exponent + self._EXPONENT_OFFSET) * self.sub_buckets + int((mantissa - 0.5) * 2 * self.sub_buckets) + 1
+        return index if value > 0 else -index
+
+    def _bounds(self, index:int) -> tuple:
+        """
+        Lower and upper bound of a bucket
+        """
+        if index == 0:
+            return 0.0, 0.0
+        position = abs(index) - 1
+        exponent = position // self.sub_buckets - self._EXPONENT_OFFSET
+        sub = position % self.sub_buckets
+        lower = math.ldexp(0.5 + sub / (2.0 * self.sub_buckets), exponent)
+        try:
+            upper = math.ldexp(0.5 + (sub + 1) / (2.0 * self.sub_buckets), exponent)
+        except OverflowError:
+            upper = float('inf')
+        return (lower, upper) if index > 0 else (-upper, -lower)
+
+    def _value(self, index:int) -> float:
+        lower, upper = self._bounds(index)
+        return (lower + upper) / 2.0
+
+    def _upper(self, index:int) -> float:
+        return self._bounds(index)[1]
+
+
+class StreamMetrics(object):
+    """
+    Throughput, timing, latency and connection metrics of a Stream. Pass one to Stream as `metrics`, or metrics=True.
+
+    latency is the receive time minus the exchange timestamp of each message with one, so it includes any clock
+    difference between the exchange and this machine.
+    """
+
+    def __init__(self, report_interval:float = None, on_report=None, log:bool = True, logger:logging.Logger = None,
+                 timestamp_fields:tuple = MessageFields.TIMESTAMP):
+        """
+        :param report_interval: seconds between reports, None to only take snapshots on demand
+        :param on_report: function called with each periodic StreamSnapshot, eg to export it
+        :param log: log a summary line with each periodic report
+        :param logger: supply your own logger or use the default
+        :param timestamp_fields: field names for the exchange timestamp, see message.MessageFields
+        """
+        self.report_interval = report_interval
+        self.on_report = on_report
+        self.log = log
+        self._logger = logger or logging.getLogger('ff_stream_metrics')
+        self._timestamp_fields = timestamp_fields
+        self._lock = threading.Lock()
+        self._stream = None
+        self._reporter = None
+        self._stop = threading.Event()
+
+        self.decode = Histogram()
+        self.callback = Histogram()
+        self.latency = Histogram()
+        self.messages = 0
+        self.bytes = 0
+        self.connections = 0
+        self.downtime = 0.0
+        self._down_since = None
+        self._window_start = time.monotonic()
+        self._window_messages = 0
+        self._window_bytes = 0
+
+    def bind(self, stream):
+        """
+        Attach to a stream, called by Stream. Starts the periodic reports if report_interval is set.
+        :param stream: Stream
+        :return:
+        """
+        self._stream = stream
+        if self.report_interval and self._reporter is None:
+            self._stop.clear()
+            self._reporter = threading.Thread(target=self._run_reporter, name='ff_stream_metrics', daemon=True)
+            self._reporter.start()
+
+    def stop(self):
+        """
+        Stop the periodic reports
+        :return:
+        """
+        self._stop.set()
+        if self._reporter is not None:
+            self._reporter.join()
+            self._reporter = None
+
+    @property
+    def reconnects(self) -> int:
+        return max(0, self.connections - 1)
+
+    def received(self, message, data, decode_time:float, received_at:float):
+        """
+        Count a received message, called by Stream after decoding it
+        :param message: message as received
+        :param data: decoded message
+        :param decode_time: seconds spent decoding
+        :param received_at: epoch receive time
+        :return:
+        """
+        size = len(message) if isinstance(message, (str, bytes, bytearray, memoryview)) else 0
+        with self._lock:
+            self.messages += 1
+            self.bytes += size
+
+        self.decode.record(decode_time)
+
+        exchange_time = message_timestamp(data, self._timestamp_fields)
+        if exchange_time is not None:
+            self.latency.record(received_at - exchange_time)
+
+    def dispatched(self, callback_time:float):
+        """
+        Record the time spent in on_data and the attached handlers for one message
+        :param callback_time: seconds
+        :return:
+        """
+        self.callback.record(callback_time)
+
+    def connected(self):
+        """
+        Count a connection, ending any downtime
+        :return:
+        """
+        with self._lock:
+            self.connections += 1
+            if self._down_since is not None:
+                self.downtime += time.monotonic() - self._down_since
+                self._down_since = None
+
+    def disconnected(self):
+        """
+        Start counting downtime
+        :return:
+        """
+        with self._lock:
+            if self._down_since is None:
+                self._down_since = time.monotonic()
+
+    def snapshot(self, reset:bool = False) -> StreamSnapshot:
+        """
+        Current metrics. Rates and histograms cover the time since the last reset, totals cover the life of the stream.
+        :param reset: start a new window for rates and histograms
+        :return: StreamSnapshot
+        """
+        now = time.monotonic()
+        with self._lock:
+            interval = now - self._window_start
+            messages = self.messages - self._window_messages
+            size = self.bytes - self._window_bytes
+            downtime = self.downtime + (now - self._down_since if self._down_since is not None else 0.0)
+            if reset:
+                self._window_start = now
+                self._window_messages = self.messages
+                self._window_bytes = self.bytes
+
+        histograms = [self.decode.snapshot(), self.callback.snapshot(), self.latency.snapshot()]
+        if reset:
+            for histogram in (self.decode, self.callback, self.latency):
+                histogram.reset()
+
+        stream = self._stream
+        dispatcher = getattr(stream, 'dispatcher', None)
+
+        return StreamSnapshot(
+            timestamp=time.time(),
+            interval=interval,
+            messages=self.messages,
+            bytes=self.bytes,
+            messages_per_sec=messages / interval if interval > 0 else 0.0,
+            bytes_per_sec=size / interval if interval > 0 else 0.0,
+            decode=histograms[0],
+            callback=histograms[1],
+            latency=histograms[2],
+            queue_depth=dispatcher.queue_depth if dispatcher is not None else 0,
+            dropped=dispatcher.dropped if dispatcher is not None else 0,
+            connected=bool(getattr(stream, '_connected', False)),
+            connections=self.connections,
+            reconnects=self.reconnects,
+            downtime=downtime,
+            ping_rtt=getattr(stream, 'ping_rtt', None),
+        )
+
+    def report(self) -> StreamSnapshot:
+        """
+        Take a snapshot, starting a new window, then log it and pass it to on_report
+        :return: StreamSnapshot
+        """
+        snapshot = self.snapshot(reset=True)
+        if self.log:
+            self._logger.info(format_snapshot(snapshot))
+        if self.on_report:
+            try:
+                self.on_report(snapshot)
+            except Exception as e:
+                self._logger.error(f"error from on_report {self.on_report}: {e}")
+        return snapshot
+
+    def _run_reporter(self):
+        while not self._stop.wait(self.report_interval):
+            self.report()
+
+
+def format_snapshot(snapshot:StreamSnapshot) -> str:
+    """
+    One line summary of a StreamSnapshot
+    :param snapshot: StreamSnapshot
+    :return: str
+    """
+    def ms(value):
+        return 'n/a' if value is None else f"{value * 1000:.2f}ms"
+
+    return (f"Stream {snapshot.messages_per_sec:.1f} msg/s {snapshot.bytes_per_sec / 1024:.1f} KB/s, "
+            f"latency p50 {ms(snapshot.latency.p50)} p99 {ms(snapshot.latency.p99)}, "
+            f"decode p99 {ms(snapshot.decode.p99)}, callback p99 {ms(snapshot.callback.p99)}, "
+            f"queue {snapshot.queue_depth}, dropped {snapshot.dropped}, reconnects {snapshot.reconnects}, "
+            f"downtime {snapshot.downtime:.1f}s, ping rtt {ms(snapshot.ping_rtt)}")
+
+
+class _EndpointMetrics(object):
+
+    def __init__(self):
+        self.requests = 0
+        self.attempts = 0
+        self.statuses = {}
+        self.errors = 0
+        self.retries = 0
+        self.rate_limited = 0
+        self.bytes = 0
+        self.ratelimit_remaining = None
+        self.time_to_headers = Histogram()
+        self.total = Histogram()
+        self.size = Histogram()
+
+
+class RestMetrics(object):
+    """
+    Per endpoint request metrics of a Rest client. Pass one to Rest as `metrics`, or metrics=True.
+
+    Each HTTP attempt, including retries, counts towards attempts, statuses, errors and time_to_headers, the time from
+    sending the request to receiving the response headers. Each call counts once towards requests, total, the time
+    including retries and reading the body, and size, the body bytes.
+    """
+
+    def __init__(self, endpoint=None):
+        """
+        :param endpoint: function returning the endpoint name of a url, defaults to the url path
+        """
+        self._endpoint = endpoint or _url_path
+        self._lock = threading.Lock()
+        self._endpoints = {}
+
+    def endpoint(self, url:str) -> str:
+        return self._endpoint(url)
+
+    def attempted(self, endpoint:str, status_code:int = None, time_to_headers:float = None, retry:bool = False,
+                  error:Exception = None, ratelimit_remaining = None):
+        """
+        Record one HTTP attempt, called by Rest
+        :param endpoint: endpoint name
+        :param status_code: HTTP status code, None if the attempt failed
+        :param time_to_headers: seconds until the response headers were received
+        :param retry: True if this attempt was a retry
+        :param error: exception raised by the attempt
+        :param ratelimit_remaining: x-ratelimit-remaining header value
+        :return:
+        """
+        with self._lock:
+            metrics = self._metrics(endpoint)
+            metrics.attempts += 1
+            if retry:
+                metrics.retries += 1
+            if error is not None:
+                metrics.errors += 1
+            if status_code is not None:
+                metrics.statuses[status_code] = metrics.statuses.get(status_code, 0) + 1
+                if status_code == 429:
+                    metrics.rate_limited += 1
+            if ratelimit_remaining is not None:
+                metrics.ratelimit_remaining = _number(ratelimit_remaining)
+
+        if time_to_headers is not None:
+            metrics.time_to_headers.record(time_to_headers)
+
+    def completed(self, endpoint:str, total:float, size:int = None):
+        """
+        Record one call, called by Rest once the body has been read
+        :param endpoint: endpoint name
+        :param total: seconds including retries and reading the body
+        :param size: body bytes
+        :return:
+        """
+        with self._lock:
+            metrics = self._metrics(endpoint)
+            metrics.requests += 1
+            if size is not None:
+                metrics.bytes += size
+
+        metrics.total.record(total)
+        if size is not None:
+            metrics.size.record(size)
+
+    def snapshot(self) -> dict:
+        """
+        :return: dict of endpoint name to EndpointSnapshot
+        """
+        with self._lock:
+            endpoints = list(self._endpoints.items())
+
+        return {endpoint: EndpointSnapshot(endpoint, m.requests, m.attempts, dict(m.statuses), m.errors, m.retries,
+                                           m.rate_limited, m.bytes, m.time_to_headers.snapshot(), m.total.snapshot(),
+                                           m.size.snapshot(), m.ratelimit_remaining)
+                for endpoint, m in endpoints}
+
+    def reset(self):
+        with self._lock:
+            self._endpoints = {}
+
+    def prometheus(self, prefix:str = 'financefeast_rest') -> str:
+        """
+        Metrics in the Prometheus text exposition format. Latencies and sizes are exported as summaries.
+        :param prefix: metric name prefix
+        :return: str
+        """
+        snapshot = self.snapshot()
+        lines = []
+
+        def metric(name, kind, description, samples):
+            lines.append(f"# HELP {prefix}_{name} {description}")
+            lines.append(f"# TYPE {prefix}_{name} {kind}")
+            for suffix, labels, value in samples:
+                if value is not None:
+                    label = ','.join(f'{key}="{_escape(label_value)}"' for key, label_value in labels)
+                    lines.append(f"{prefix}_{name}{suffix}{{{label}}} {_format(value)}")
+
+        def summary(name, description, field):
+            samples = []
+            for endpoint, s in snapshot.items():
+                histogram = getattr(s, field)
+                for quantile, value in zip(('0.5', '0.9', '0.99', '0.999'), (histogram.p50, histogram.p90, histogram.p99, histogram.p999)):
+                    samples.append(('', (('endpoint', endpoint), ('quantile', quantile)), value))
+                samples.append(('_sum', (('endpoint', endpoint),), (histogram.mean or 0.0) * histogram.count))
+                samples.append(('_count', (('endpoint', endpoint),), histogram.count))
+            metric(name, 'summary', description, samples)
+
+        metric('requests_total', 'counter', 'Requests made, not counting retries',
+               [('', (('endpoint', e),), s.requests) for e, s in snapshot.items()])
+        metric('responses_total', 'counter', 'HTTP responses received, including retried ones',
+               [('', (('endpoint', e), ('status', status)), n) for e, s in snapshot.items() for status, n in sorted(s.statuses.items())])
+        metric('errors_total', 'counter', 'Attempts that failed without a response',
+               [('', (('endpoint', e),), s.errors) for e, s in snapshot.items()])
+        metric('retries_total', 'counter', 'Retried attempts',
+               [('', (('endpoint', e),), s.retries) for e, s in snapshot.items()])
+        metric('rate_limited_total', 'counter', 'Responses with status 429',
+               [('', (('endpoint', e),), s.rate_limited) for e, s in snapshot.items()])
+        metric('response_bytes_total', 'counter', 'Response body bytes',
+               [('', (('endpoint', e),), s.bytes) for e, s in snapshot.items()])
+        metric('ratelimit_remaining', 'gauge', 'Last x-ratelimit-remaining header value',
+               [('', (('endpoint', e),), s.ratelimit_remaining) for e, s in snapshot.items()])
+        summary('time_to_headers_seconds', 'Time from sending a request to receiving the response headers', 'time_to_headers')
+        summary('duration_seconds', 'Time of a request including retries and reading the body', 'total')
+        summary('response_size_bytes', 'Response body size', 'size')
+
+        return '\n'.join(lines) + '\n'
+
+    def _metrics(self, endpoint:str) -> _EndpointMetrics:
+        """
+        Metrics of an endpoint, creating them on first use. Requires the lock.
+        """
+        metrics = self._endpoints.get(endpoint)
+        if metrics is None:
+            metrics = self._endpoints[endpoint] = _EndpointMetrics()
+        return metrics
+
+
+def _url_path(url:str) -> str:
+    return urlsplit(url).path or '/'
+
+
+def _number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format(value) -> str:
+    """
+    Sample value in the Prometheus text format, which spells infinity and NaN as +Inf, -Inf and NaN
+    """
+    if not isinstance(value, float):
+        return str(value)
+    if math.isnan(value):
+        return 'NaN'
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(value)
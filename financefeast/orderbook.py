@@ -0,0 +1,505 @@
+import logging
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import deque, namedtuple
+from itertools import accumulate
+from financefeast.entity import Response
+
+"""
+Local level 2 order book kept current from Stream updates.
+
+The book is seeded from Rest.orderbook(ticker, condensed=False) and then updated from orderbook messages on the Stream.
+Messages of any other type, eg trades, are ignored even though they may carry a side, price and size.
+Each side is held as two parallel typed arrays, prices in ascending order and the total size at each price, so the top
+of the book is an index lookup and depth queries are a binary search. Cumulative depth uses prefix sums of the sizes,
+rebuilt on the first query after the side changes, so repeated queries between updates are a binary search too.
+
+Snapshots hold `bids` and `asks` lists, either [price, size] pairs or objects with price and size fields. Individual
+orders at the same price are added together. Updates carry a side, price and the new total size at that price, a size
+of zero removes the level, or `bids` / `asks` lists of such levels. If updates carry a sequence number a gap triggers a
+resync from a fresh snapshot, as does a reconnect of the Stream.
+
+A resync fetches the snapshot on a background thread so the Stream keeps reading. Updates received meanwhile are
+buffered, then those already included in the snapshot are dropped and the rest applied on top of it. If the snapshot
+is older than the buffered updates another one is fetched, with the wait between fetches doubling up to
+max_resync_interval so a lagging snapshot service does not burn the request quota.
+"""
+
+BID = 'bid'
+ASK = 'ask'
+
+Level = namedtuple('Level', ['price', 'size'])
+TopOfBook = namedtuple('TopOfBook', ['bid', 'bid_size', 'ask', 'ask_size'])
+
+_SIDES = {
+    BID: ('bids', 'bid', 'buys', 'buy'),
+    ASK: ('asks', 'ask', 'sells', 'sell', 'offers', 'offer'),
+}
+_SIDE_VALUES = {'bid': BID, 'bids': BID, 'buy': BID, 'b': BID,
+                'ask': ASK, 'asks': ASK, 'sell': ASK, 's': ASK, 'a': ASK, 'offer': ASK}
+_PRICE = ('price', 'p')
+_SIZE = ('size', 'volume', 'quantity', 'qty', 'amount')
+_SEQUENCE = ('sequence', 'seq', 'sequence_number')
+_DELETE = ('delete', 'remove', 'deleted')
+# Stream message types that carry order book updates, other types such as trades are ignored
+_BOOK_TYPES = ('orderbook', 'order_book', 'book', 'depth', 'l2', 'level2')
+
+
+class _Side(object):
+    """
+    One side of the book as sorted price and size arrays
+    """
+    __slots__ = ('prices', 'sizes', '_prefix')
+
+    def __init__(self):
+        self.prices = array('d')
+        self.sizes = array('d')
+        self._prefix = None
+
+    def __len__(self):
+        return len(self.prices)
+
+    def set(self, price:float, size:float):
+        index = bisect_left(self.prices, price)
+        exists = index < len(self.prices) and self.prices[index] == price
+        self._prefix = None
+
+        if size <= 0:
+            if exists:
+                del self.prices[index]
+                del self.sizes[index]
+        elif exists:
+            self.sizes[index] = size
+        else:
+            self.prices.insert(index, price)
+            self.sizes.insert(index, size)
+
+    def size_before(self, index:int) -> float:
+        """
+        Total size of the levels below an index
+        """
+        if self._prefix is None:
+            self._prefix = array('d', accumulate(self.sizes, initial=0.0))
+        return self._prefix[index]
+
+    def size_at(self, price:float) -> float:
+        index = bisect_left(self.prices, price)
+        if index < len(self.prices) and self.prices[index] == price:
+            return self.sizes[index]
+        return 0.0
+
+
+class OrderBook(object):
+    """
+    Level 2 order book for one ticker. Attach it to a Stream with Stream.attach().
+    """
+    DEFAULT_MAX_BUFFER = 10000
+    DEFAULT_MIN_RESYNC_INTERVAL = 1.0
+    DEFAULT_MAX_RESYNC_INTERVAL = 30.0
+
+    def __init__(self, ticker:str, rest=None, exchange:str = 'nzx', on_update=None, logger:logging.Logger = None,
+                 max_buffer:int = DEFAULT_MAX_BUFFER, min_resync_interval:float = DEFAULT_MIN_RESYNC_INTERVAL,
+                 max_resync_interval:float = DEFAULT_MAX_RESYNC_INTERVAL):
+        """
+        :param ticker: ticker symbol
+        :param rest: Rest client used to fetch snapshots, required for automatic resync
+        :param exchange: exchange ticker is in
+        :param on_update: optional callback called with this book after each applied update or resync
+        :param logger: supply your own logger or use the default
+        :param max_buffer: maximum number of updates buffered while out of sync, the oldest are dropped beyond this
+        :param min_resync_interval: seconds between snapshot fetches while a resync has not caught up with the updates
+        :param max_resync_interval: the interval doubles on each fetch that does not catch up, up to this
+        """
+        self.ticker = ticker.lower()
+        self.exchange = exchange
+        self.sequence = None
+        self.resyncs = 0
+        self.min_resync_interval = min_resync_interval
+        self.max_resync_interval = max_resync_interval
+        self._rest = rest
+        self._on_update = on_update
+        self._logger = logger or logging.getLogger('ff_orderbook')
+        self._lock = threading.RLock()
+        self._bids = _Side()
+        self._asks = _Side()
+        self._synced = False
+        self._buffer = deque(maxlen=max_buffer)
+        self._resync_thread = None
+        self._resync_requested = False
+        self._stop = threading.Event()
+
+    def __repr__(self):
+        return "{}(ticker={!r}, top={!r})".format(self.__class__.__name__, self.ticker, self.top())
+
+    def __call__(self, stream, data):
+        if not isinstance(data, dict) or not self._is_book_message(data):
+            return
+
+        for update in self._updates(data):
+            ticker = update.get('ticker') or update.get('symbol') or data.get('ticker') or data.get('symbol')
+            if isinstance(ticker, str) and ticker.lower() != self.ticker:
+                continue
+            if not self._has_levels(update):
+                continue
+            self.apply(update)
+
+    @property
+    def synced(self) -> bool:
+        return self._synced
+
+    @property
+    def buffered(self) -> int:
+        """
+        Number of updates waiting for a snapshot
+        """
+        return len(self._buffer)
+
+    def on_reconnect(self, stream):
+        """
+        Called by Stream after it reconnects, updates may have been missed so the book is resynced
+        """
+        self._logger.info(f"Stream reconnected, resyncing {self.ticker} order book")
+        self.resync()
+
+    def seed(self, snapshot):
+        """
+        Replace the book with a snapshot, then apply the buffered updates that are newer than it. The book stays out of
+        sync if the snapshot is older than the first buffered update.
+        :param snapshot: Response of Rest.orderbook(ticker, condensed=False), or the snapshot dict
+        :return: self
+        """
+        payload = snapshot._payload if isinstance(snapshot, Response) else snapshot
+        if isinstance(payload.get('data'), dict):
+            payload = dict(payload, **payload['data'])
+
+        bids, asks = _Side(), _Side()
+        for side, book in ((BID, bids), (ASK, asks)):
+            totals = {}
+            for price, size in _levels(_first(payload, _SIDES[side])):
+                totals[price] = totals.get(price, 0.0) + size
+            for price in sorted(totals):
+                book.set(price, totals[price])
+
+        with self._lock:
+            self._bids, self._asks = bids, asks
+            self.sequence = _sequence(payload)
+            self._synced = self._replay()
+
+        if self._synced:
+            self._notify()
+        return self
+
+    def resync(self, wait:bool = False):
+        """
+        Mark the book out of sync and fetch a fresh snapshot with the Rest client on a background thread. Updates are
+        buffered until the snapshot has been applied.
+        :param wait: fetch on the calling thread and return once the book is synced or the fetch failed
+        :return: self
+        """
+        with self._lock:
+            self._synced = False
+            if self._rest is None:
+                self._logger.warning(f"{self.ticker} order book is out of sync and no Rest client was given to resync it")
+                return self
+
+            if not wait:
+                # a running resync thread fetches again when asked, one thread per book
+                self._resync_requested = True
+                if self._resync_thread is None:
+                    self._resync_thread = threading.Thread(target=self._run_resync, name=f'ff_orderbook_{self.ticker}',
+                                                           daemon=True)
+                    self._resync_thread.start()
+                return self
+
+        self._fetch_snapshot()
+        return self
+
+    def close(self):
+        """
+        Stop any background resync
+        :return:
+        """
+        self._stop.set()
+        thread = self._resync_thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+
+    def _run_resync(self):
+        """
+        Fetch snapshots until one catches up with the buffered updates, backing off between fetches
+        """
+        interval = self.min_resync_interval
+        try:
+            while not self._stop.is_set():
+                with self._lock:
+                    if not self._resync_requested:
+                        return
+                    self._resync_requested = False
+
+                if self._fetch_snapshot():
+                    with self._lock:
+                        if not self._resync_requested:
+                            return
+                    interval = self.min_resync_interval
+                else:
+                    with self._lock:
+                        self._resync_requested = True
+                    self._logger.info(f"{self.ticker} order book snapshot has not caught up, fetching again in {interval:.1f}s")
+
+                if self._stop.wait(interval):
+                    return
+                interval = min(interval * 2, self.max_resync_interval)
+        finally:
+            with self._lock:
+                self._resync_thread = None
+                requested = self._resync_requested and not self._stop.is_set()
+            if requested:
+                self.resync()
+
+    def _fetch_snapshot(self) -> bool:
+        """
+        Fetch and apply one snapshot
+        :return: True if the book is synced
+        """
+        self.resyncs += 1
+        try:
+            snapshot = self._rest.orderbook(self.ticker, condensed=False, exchange=self.exchange)
+        except Exception as e:
+            self._logger.error(f"{self.ticker} order book snapshot failed: {e!r}")
+            return False
+
+        self.seed(snapshot)
+        return self._synced
+
+    def _replay(self) -> bool:
+        """
+        Apply the buffered updates newer than the book sequence. Requires the lock.
+        :return: False if the updates do not follow on from the book, they are kept for the next snapshot
+        """
+        updates = list(self._buffer)
+        if self.sequence is not None:
+            updates = [(sequence, update) for sequence, update in updates if sequence is None or sequence > self.sequence]
+            first = next((sequence for sequence, _ in updates if sequence is not None), None)
+            if first is not None and first != self.sequence + 1:
+                self._logger.warning(f"{self.ticker} order book snapshot at {self.sequence} is behind the buffered updates from {first}")
+                self._buffer = deque(updates, maxlen=self._buffer.maxlen)
+                return False
+
+        self._buffer.clear()
+        for sequence, update in updates:
+            if sequence is not None and self.sequence is not None and sequence != self.sequence + 1:
+                if sequence <= self.sequence:
+                    continue
+                # gap inside the buffer, keep the rest for the next snapshot
+                self._buffer.extend(u for u in updates if u[0] is None or u[0] >= sequence)
+                return False
+            self._apply(update, sequence)
+        return True
+
+    def apply(self, update:dict) -> bool:
+        """
+        Apply one update message. While the book is out of sync the update is buffered for the next snapshot.
+        :param update: dict with side, price and size, or bids / asks level lists, and an optional sequence number
+        :return: True if applied, False if it was stale or buffered
+        """
+        sequence = _sequence(update)
+
+        with self._lock:
+            gap = False
+            if self._synced and sequence is not None and self.sequence is not None:
+                if sequence <= self.sequence:
+                    return False
+                if sequence != self.sequence + 1:
+                    self._logger.warning(f"{self.ticker} order book sequence gap, expected {self.sequence + 1} got {sequence}")
+                    self._synced = False
+                    gap = True
+
+            if not self._synced:
+                if len(self._buffer) == self._buffer.maxlen:
+                    self._logger.warning(f"{self.ticker} order book buffer is full, dropping the oldest update")
+                self._buffer.append((sequence, update))
+                # start a resync, or ask a running one to fetch again after it has finished
+                resync = self._rest is not None and (gap or self._resync_thread is None)
+            else:
+                self._apply(update, sequence)
+                resync = None
+
+        if resync is None:
+            self._notify()
+            return True
+
+        if resync:
+            self.resync()
+        return False
+
+    def _apply(self, update:dict, sequence):
+        """
+        Apply an update to the arrays. Requires the lock.
+        """
+        side = _SIDE_VALUES.get(str(update.get('side', '')).lower())
+        if side is not None:
+            price = _number(_first(update, _PRICE))
+            size = 0.0 if str(update.get('action', '')).lower() in _DELETE else _number(_first(update, _SIZE)) or 0.0
+            if price is not None:
+                self._side(side).set(price, size)
+
+        for side in (BID, ASK):
+            for price, size in _levels(_first(update, _SIDES[side])):
+                self._side(side).set(price, size)
+
+        if sequence is not None:
+            self.sequence = sequence
+
+    def best_bid(self):
+        """
+        :return: Level of the highest bid, or None if there are no bids
+        """
+        with self._lock:
+            if not self._bids:
+                return None
+            return Level(self._bids.prices[-1], self._bids.sizes[-1])
+
+    def best_ask(self):
+        """
+        :return: Level of the lowest ask, or None if there are no asks
+        """
+        with self._lock:
+            if not self._asks:
+                return None
+            return Level(self._asks.prices[0], self._asks.sizes[0])
+
+    def top(self) -> TopOfBook:
+        """
+        :return: TopOfBook, fields are None for an empty side
+        """
+        bid, ask = self.best_bid(), self.best_ask()
+        return TopOfBook(bid.price if bid else None, bid.size if bid else None,
+                         ask.price if ask else None, ask.size if ask else None)
+
+    def spread(self):
+        """
+        :return: best ask minus best bid, or None if either side is empty
+        """
+        top = self.top()
+        if top.bid is None or top.ask is None:
+            return None
+        return top.ask - top.bid
+
+    def depth(self, side:str, price:float) -> float:
+        """
+        Size resting at a price
+        :param side: BID or ASK
+        :param price: price level
+        :return: size, 0 if there is no level at the price
+        """
+        with self._lock:
+            return self._side(side).size_at(price)
+
+    def cumulative_depth(self, side:str, price:float) -> float:
+        """
+        Total size at prices as good as or better than a price, bids at or above it and asks at or below it
+        :param side: BID or ASK
+        :param price: limit price
+        :return: size
+        """
+        with self._lock:
+            book = self._side(side)
+            if side == BID:
+                return book.size_before(len(book)) - book.size_before(bisect_left(book.prices, price))
+            return book.size_before(bisect_right(book.prices, price))
+
+    def levels(self, side:str, count:int = None) -> list:
+        """
+        Price levels of a side from the best price outwards
+        :param side: BID or ASK
+        :param count: number of levels, default is all
+        :return: list of Level
+        """
+        with self._lock:
+            book = self._side(side)
+            pairs = zip(reversed(book.prices), reversed(book.sizes)) if side == BID else zip(book.prices, book.sizes)
+            return [Level(price, size) for price, size in list(pairs)[:count]]
+
+    def _side(self, side:str) -> _Side:
+        if side == BID:
+            return self._bids
+        if side == ASK:
+            return self._asks
+        raise ValueError(f"side must be {BID!r} or {ASK!r}")
+
+    def _notify(self):
+        if self._on_update:
+            try:
+                self._on_update(self)
+            except Exception as e:
+                self._logger.error(f"error from on_update callback {self._on_update}: {e}")
+
+    @staticmethod
+    def _updates(data:dict) -> list:
+        inner = data.get('data')
+        if isinstance(inner, list):
+            return [item for item in inner if isinstance(item, dict)]
+        if isinstance(inner, dict):
+            return [inner]
+        return [data]
+
+    @staticmethod
+    def _is_book_message(data:dict) -> bool:
+        """
+        Messages with a type must be an order book type, a trade also has a side, price and size
+        """
+        message_type = data.get('type')
+        return message_type is None or str(message_type).lower() in _BOOK_TYPES
+
+    @staticmethod
+    def _has_levels(update:dict) -> bool:
+        if 'side' in update:
+            return _first(update, _PRICE) is not None
+        return any(isinstance(update.get(name), list) for names in _SIDES.values() for name in names)
+
+
+def _first(record:dict, names:tuple):
+    for name in names:
+        if name in record:
+            return record[name]
+    return None
+
+
+def _number(value):
+    if isinstance(value, bool) or value is None:
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _sequence(record:dict):
+    value = _first(record, _SEQUENCE)
+    if isinstance(value, bool) or value is None:
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _levels(levels) -> list:
+    """
+    Normalise a list of levels or orders to (price, size) tuples
+    """
+    result = []
+    if not isinstance(levels, (list, tuple)):
+        return result
+
+    for level in levels:
+        if isinstance(level, dict):
+            price, size = _number(_first(level, _PRICE)), _number(_first(level, _SIZE))
+        elif isinstance(level, (list, tuple)) and len(level) >= 2:
+            price, size = _number(level[0]), _number(level[1])
+        else:
+            continue
+        if price is not None:
+            result.append((price, size or 0.0))
+    return result
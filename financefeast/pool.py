@@ -0,0 +1,280 @@
+import hashlib
+import logging
+import threading
+from bisect import bisect_right
+from financefeast.common import EnvironmentsStream
+from financefeast.codec import JSONCodec
+from financefeast.dispatch import Dispatcher
+from financefeast.stream import Stream
+
+"""
+A pool of Stream connections sharing the ticker subscriptions.
+
+Tickers are spread over the connections with a consistent hash ring. When a connection drops only its tickers move, to
+the connections next to it on the ring, and they move back when it reconnects. All connections feed one Dispatcher, so
+the merged output keeps the order of each ticker's messages. Each ticker is only ever subscribed on one connection at
+a time.
+
+The number of connections counts towards the concurrent streams limit of your subscription plan.
+"""
+
+
+class HashRing(object):
+    """
+    Consistent hash ring mapping keys to nodes, with `replicas` virtual points per node
+    """
+    DEFAULT_REPLICAS = 64
+
+    def __init__(self, nodes:list = (), replicas:int = DEFAULT_REPLICAS):
+        self.replicas = replicas
+        self._points = []
+        self._nodes = {}
+        for node in nodes:
+            self.add(node)
+
+    def __contains__(self, node):
+        return node in self._nodes.values()
+
+    def __len__(self):
+        return len(set(self._nodes.values()))
+
+    @staticmethod
+    def _hash(value:str) -> int:
+        return int.from_bytes(hashlib.md5(value.encode('utf-8')).digest()[:8], 'big')
+
+    def add(self, node):
+        for replica in range(self.replicas):
+            point = self._hash(f"{node}#{replica}")
+            if point not in self._nodes:
+                self._nodes[point] = node
+        self._points = sorted(self._nodes)
+
+    def remove(self, node):
+        self._nodes = {point: owner for point, owner in self._nodes.items() if owner != node}
+        self._points = sorted(self._nodes)
+
+    def node_for(self, key:str):
+        """
+        :return: the node owning a key, or None if the ring is empty
+        """
+        if not self._points:
+            return None
+        index = bisect_right(self._points, self._hash(key)) % len(self._points)
+        return self._nodes[self._points[index]]
+
+
+class _Shard(Stream):
+    """
+    Stream that reports its connection state to the pool
+    """
+
+    def __init__(self, pool, index:int, *args, **kwargs):
+        self._pool = pool
+        self.index = index
+        super().__init__(*args, **kwargs)
+
+    def _on_open(self, wsapp):
+        super()._on_open(wsapp)
+        self._pool._shard_up(self)
+
+    def _on_close(self, wsapp, close_status_code, close_msg):
+        super()._on_close(wsapp, close_status_code, close_msg)
+        self._pool._shard_down(self)
+
+    def _on_error(self, wsapp, err):
+        super()._on_error(wsapp, err)
+        if not self._connected:
+            self._pool._shard_down(self)
+
+
+class StreamPool(object):
+    """
+    Spreads subscriptions over `size` Stream connections and merges their messages into one feed
+    """
+    DEFAULT_SIZE = 2
+
+    def __init__(self, token:str, on_data=None, size:int = DEFAULT_SIZE, logger:logging.Logger = None,
+                 environment:EnvironmentsStream=EnvironmentsStream.prod, codec:JSONCodec = None, dispatcher = None,
+                 replicas:int = HashRing.DEFAULT_REPLICAS, **kwargs):
+        """
+        :param token: API authentication token
+        :param on_data: callback called with (pool, data) for every message from every connection
+        :param size: number of connections
+        :param logger: supply your own logger or use the default
+        :param environment: supply an optional Financefeast Environment ENUM object
+        :param codec: JSON codec used to decode and encode messages
+        :param dispatcher: Dispatcher or Conflator merging the connections, defaults to a single worker Dispatcher
+        :param replicas: virtual points per connection on the hash ring
+        :param kwargs: other Stream parameters passed to each connection, eg reconnect or backfill
+        """
+        self._logger = logger or logging.getLogger('ff_stream_pool')
+        self._on_data = on_data
+        self._handlers = []
+        self._dispatcher = dispatcher or Dispatcher()
+        self._lock = threading.RLock()
+        self._ring = HashRing(replicas=replicas)
+        self._assignment = {}
+        self._threads = []
+        self.rebalances = 0
+
+        self.shards = [_Shard(self, i, token, on_data=self._on_shard_data, logger=logger, environment=environment,
+                              codec=codec, **kwargs) for i in range(size)]
+        for shard in self.shards:
+            self._ring.add(shard.index)
+
+        if kwargs.get('raw') and getattr(self._dispatcher, 'decode', False) is None:
+            self._dispatcher.decode = self.shards[0]._handler_data
+
+    @property
+    def subscriptions(self) -> dict:
+        """
+        :return: dict of ticker to the index of the connection it is subscribed on
+        """
+        with self._lock:
+            return dict(self._assignment)
+
+    @property
+    def dispatcher(self):
+        return self._dispatcher
+
+    def attach(self, handler):
+        """
+        Attach a handler that receives every message after on_data, see Stream.attach
+        :param handler: callable
+        :return: the handler
+        """
+        self._handlers.append(handler)
+        return handler
+
+    def detach(self, handler):
+        if handler in self._handlers:
+            self._handlers.remove(handler)
+
+    def subscribe(self, tickers:list):
+        """
+        Subscribe to tickers, each on the connection the hash ring assigns it
+        :param tickers: ticker or list of tickers
+        :return:
+        """
+        tickers = [tickers] if isinstance(tickers, str) else tickers
+        groups = {}
+        with self._lock:
+            for ticker in dict.fromkeys(t.lower() for t in tickers):
+                if ticker in self._assignment:
+                    continue
+                index = self._ring.node_for(ticker)
+                if index is None:
+                    index = self.shards[0].index
+                self._assignment[ticker] = index
+                groups.setdefault(index, []).append(ticker)
+
+        for index, group in groups.items():
+            self.shards[index].subscribe(group)
+
+    def unsubscribe(self, tickers:list):
+        """
+        Unsubscribe from tickers
+        :param tickers: ticker or list of tickers
+        :return:
+        """
+        tickers = [tickers] if isinstance(tickers, str) else tickers
+        groups = {}
+        with self._lock:
+            for ticker in dict.fromkeys(t.lower() for t in tickers):
+                index = self._assignment.pop(ticker, None)
+                if index is not None:
+                    groups.setdefault(index, []).append(ticker)
+
+        for index, group in groups.items():
+            self.shards[index].unsubscribe(group)
+
+    def start(self):
+        """
+        Connect every shard on its own thread
+        :return:
+        """
+        if not self._dispatcher.running:
+            self._dispatcher.start(self._dispatch)
+
+        for shard in self.shards:
+            thread = threading.Thread(target=shard.connect, name=f'ff_stream_{shard.index}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def connect(self):
+        """
+        Connect every shard and block, like Stream.connect
+        :return:
+        """
+        self.start()
+        for thread in self._threads:
+            thread.join()
+
+    def _on_shard_data(self, shard, data):
+        self._dispatcher.submit(data)
+
+    def _dispatch(self, data):
+        for callback in [self._on_data] + list(self._handlers):
+            if callback:
+                try:
+                    callback(self, data)
+                except Exception as e:
+                    self._logger.error("error from callback {}: {}".format(callback, e))
+
+    def _shard_down(self, shard:_Shard):
+        """
+        Move the tickers of a dropped connection to the remaining connections
+        """
+        with self._lock:
+            if shard.index not in self._ring:
+                return
+            self._ring.remove(shard.index)
+            if not len(self._ring):
+                # nowhere to move to, keep the tickers on the shard until a connection comes back
+                self._ring.add(shard.index)
+                return
+            moved = self._reassign()
+
+        self._logger.warning(f"Stream connection {shard.index} dropped, moving {len(moved)} tickers")
+        self._move(moved)
+
+    def _shard_up(self, shard:_Shard):
+        """
+        Move the tickers a reconnected connection owns on the ring back to it
+        """
+        with self._lock:
+            if shard.index in self._ring:
+                return
+            self._ring.add(shard.index)
+            moved = self._reassign()
+
+        if moved:
+            self._logger.info(f"Stream connection {shard.index} restored, moving {len(moved)} tickers back")
+        self._move(moved)
+
+    def _reassign(self) -> list:
+        """
+        Update the assignment from the ring. Requires the lock.
+        :return: list of (ticker, old index, new index)
+        """
+        moved = []
+        for ticker, old in self._assignment.items():
+            new = self._ring.node_for(ticker)
+            if new != old:
+                moved.append((ticker, old, new))
+        for ticker, old, new in moved:
+            self._assignment[ticker] = new
+        if moved:
+            self.rebalances += 1
+        return moved
+
+    def _move(self, moved:list):
+        removals, additions = {}, {}
+        for ticker, old, new in moved:
+            removals.setdefault(old, []).append(ticker)
+            additions.setdefault(new, []).append(ticker)
+
+        for index, tickers in removals.items():
+            self.shards[index].unsubscribe(tickers)
+        for index, tickers in additions.items():
+            self.shards[index].subscribe(tickers)
@@ -0,0 +1,213 @@
+import asyncio
+import threading
+import time
+from collections import namedtuple
+
+"""
+Client side rate limiting driven by the x-ratelimit response headers
+"""
+
+RateLimitState = namedtuple('RateLimitState', ['limit', 'remaining', 'reset', 'tokens', 'fill_rate'])
+
+EPOCH_THRESHOLD = 1e9
+
+
+def reset_seconds(reset):
+    """
+    Normalise a x-ratelimit-reset header value to the number of seconds until the reset
+    :param reset: either seconds until reset or an epoch timestamp
+    :return: float seconds, or None if the value can not be parsed
+    """
+    try:
+        reset = float(reset)
+    except (TypeError, ValueError):
+        return None
+
+    if reset > EPOCH_THRESHOLD:
+        reset = reset - time.time()
+
+    return max(reset, 0.0)
+
+
+class RateLimiter(object):
+    """
+    Token bucket rate limiter. The bucket is re-sized from the x-ratelimit-limit, x-ratelimit-remaining and
+    x-ratelimit-reset headers after each response, so the remaining budget is spread evenly until the window resets
+    instead of being spent in a burst and hitting a 429.
+
+    Until the first set of headers is seen, or once the window has reset, requests are not paced.
+    """
+    DEFAULT_BURST = 5
+    MIN_RESET_SECONDS = 0.001
+
+    def __init__(self, burst:int = DEFAULT_BURST, clock=time.monotonic):
+        """
+        :param burst: maximum number of requests that can be sent back to back while budget remains
+        :param clock: monotonic clock function, returns seconds
+        """
+        self.burst = burst
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._limit = None
+        self._remaining = None
+        self._reset_at = None
+        self._tokens = None
+        self._capacity = None
+        self._fill_rate = None
+        self._last = clock()
+
+    @property
+    def state(self) -> RateLimitState:
+        """
+        Current budget. reset is the number of seconds until the server side window resets, tokens is the number of
+        requests that can be sent right now without waiting. Values are None while the budget is unknown.
+        :return: RateLimitState
+        """
+        with self._lock:
+            now = self._clock()
+            self._refill(now)
+            reset = max(self._reset_at - now, 0.0) if self._reset_at is not None else None
+            return RateLimitState(self._limit, self._remaining, reset, self._tokens, self._fill_rate)
+
+    def update(self, limit, remaining, reset):
+        """
+        Update the bucket from rate limit header values
+        :param limit: x-ratelimit-limit value
+        :param remaining: x-ratelimit-remaining value
+        :param reset: x-ratelimit-reset value, either seconds until reset or an epoch timestamp
+        :return:
+        """
+        try:
+            remaining = int(remaining)
+        except (TypeError, ValueError):
+            return
+
+        reset = reset_seconds(reset)
+        if reset is None:
+            return
+        reset = max(reset, self.MIN_RESET_SECONDS)
+
+        with self._lock:
+            now = self._clock()
+            self._refill(now)
+
+            try:
+                self._limit = int(limit)
+            except (TypeError, ValueError):
+                self._limit = None
+            self._remaining = remaining
+            self._reset_at = now + reset
+
+            if remaining <= 0:
+                self._capacity = self.burst
+                self._tokens = 0.0
+                self._fill_rate = 0.0
+                return
+
+            self._capacity = min(self.burst, remaining)
+            self._fill_rate = remaining / reset
+            if self._tokens is None:
+                self._tokens = float(self._capacity)
+            else:
+                self._tokens = min(self._tokens, float(self._capacity))
+
+    def exhausted(self, reset=None):
+        """
+        Mark the budget as spent, eg after a 429 response
+        :param reset: seconds until reset if known
+        :return:
+        """
+        self.update(self._limit, 0, reset if reset is not None else self.MIN_RESET_SECONDS)
+
+    def acquire(self, blocking:bool = True, timeout:float = None) -> bool:
+        """
+        Take a token from the bucket
+        :param blocking: if True wait until a token is available, otherwise return straight away
+        :param timeout: maximum number of seconds to wait when blocking
+        :return: True if a token was taken
+        """
+        deadline = None if timeout is None else self._clock() + timeout
+
+        while True:
+            wait = self._reserve()
+            if wait is None:
+                return True
+            wait = self._bounded_wait(wait, blocking, deadline)
+            if wait is None:
+                return False
+            time.sleep(wait)
+
+    def try_acquire(self) -> bool:
+        """
+        Non blocking acquire
+        :return: True if a token was taken
+        """
+        return self.acquire(blocking=False)
+
+    async def acquire_async(self, blocking:bool = True, timeout:float = None) -> bool:
+        """
+        Take a token from the bucket, waiting on the event loop instead of blocking the thread
+        :param blocking: if True wait until a token is available, otherwise return straight away
+        :param timeout: maximum number of seconds to wait when blocking
+        :return: True if a token was taken
+        """
+        deadline = None if timeout is None else self._clock() + timeout
+
+        while True:
+            wait = self._reserve()
+            if wait is None:
+                return True
+            wait = self._bounded_wait(wait, blocking, deadline)
+            if wait is None:
+                return False
+            await asyncio.sleep(wait)
+
+    def _bounded_wait(self, wait:float, blocking:bool, deadline:float):
+        """
+        Returns how long to sleep before trying again, or None to give up
+        """
+        if not blocking:
+            return None
+        if deadline is not None:
+            left = deadline - self._clock()
+            if left <= 0:
+                return None
+            wait = min(wait, left)
+        return wait
+
+    def _reserve(self):
+        """
+        Take a token if one is available
+        :return: None if a token was taken, otherwise the number of seconds until one is expected
+        """
+        with self._lock:
+            now = self._clock()
+            self._refill(now)
+
+            if self._tokens is None:
+                return None
+
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return None
+
+            if self._fill_rate:
+                return (1 - self._tokens) / self._fill_rate
+
+            return max(self._reset_at - now, self.MIN_RESET_SECONDS)
+
+    def _refill(self, now:float):
+        """
+        Top up the bucket for the time elapsed. Must be called with the lock held.
+        """
+        if self._reset_at is not None and now >= self._reset_at:
+            # server side window has reset, budget is unknown until the next response
+            self._remaining = None
+            self._reset_at = None
+            self._tokens = None
+            self._capacity = None
+            self._fill_rate = None
+        elif self._tokens is not None and self._fill_rate:
+            self._tokens = min(float(self._capacity), self._tokens + (now - self._last) * self._fill_rate)
+
+        self._last = now
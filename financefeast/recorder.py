@@ -0,0 +1,217 @@
+import asyncio
+import mmap
+import os
+import struct
+import threading
+import time
+from bisect import bisect_right
+
+"""
+Record Stream messages to an append-only binary log and replay them.
+
+The log starts with an 8 byte header, followed by one record per message:
+
+    receive time   float64, epoch seconds
+    frame type     uint8, 1 for text and 2 for binary
+    frame length   uint32
+    frame          the message exactly as received
+
+All numbers are little endian. Every index_every records the receive time and file offset of the next record are
+appended to a sidecar index file, path + '.idx', so a replay can seek to a time without reading the log from the start.
+The replayer reads the log through mmap and feeds messages through the same path as live messages, so on_data, attached
+handlers and any dispatcher see exactly what they saw live.
+"""
+
+MAGIC = b'FFLOG\x00\x01\x00'
+RECORD = struct.Struct('<dBI')
+INDEX_ENTRY = struct.Struct('<dQ')
+TEXT = 1
+BINARY = 2
+
+
+class Recorder(object):
+    """
+    Appends received messages to a binary log. Pass one to Stream as `recorder`.
+    """
+    DEFAULT_INDEX_EVERY = 1000
+
+    def __init__(self, path:str, index_every:int = DEFAULT_INDEX_EVERY, clock=time.time):
+        """
+        :param path: log file path, appended to if it exists
+        :param index_every: number of records between index entries
+        :param clock: function returning the receive time in epoch seconds
+        """
+        self.path = path
+        self.index_every = index_every
+        self.count = 0
+        self._clock = clock
+        self._lock = threading.Lock()
+
+        exists = os.path.exists(path) and os.path.getsize(path) > 0
+        self._log = open(path, 'ab')
+        self._index = open(path + '.idx', 'ab')
+        if not exists:
+            self._log.write(MAGIC)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def write(self, message, timestamp:float = None):
+        """
+        Append a message
+        :param message: str or bytes as received from the socket
+        :param timestamp: receive time, defaults to now
+        :return:
+        """
+        if isinstance(message, str):
+            frame, kind = message.encode('utf-8'), TEXT
+        else:
+            frame, kind = bytes(message), BINARY
+        timestamp = self._clock() if timestamp is None else timestamp
+
+        with self._lock:
+            if self.count % self.index_every == 0:
+                self._index.write(INDEX_ENTRY.pack(timestamp, self._log.tell()))
+            self._log.write(RECORD.pack(timestamp, kind, len(frame)))
+            self._log.write(frame)
+            self.count += 1
+
+    def flush(self):
+        with self._lock:
+            self._log.flush()
+            self._index.flush()
+
+    def close(self):
+        with self._lock:
+            if not self._log.closed:
+                self._log.close()
+                self._index.close()
+
+
+class Replayer(object):
+    """
+    Reads a log written by Recorder and replays it into a Stream or AsyncStream
+    """
+
+    def __init__(self, path:str):
+        """
+        :param path: log file path
+        """
+        self.path = path
+        self._file = open(path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._map[:len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not a financefeast stream log")
+        self._index = self._read_index(path + '.idx')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __iter__(self):
+        return self.records()
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+    def records(self, start:float = None, end:float = None):
+        """
+        Yield the recorded messages in order
+        :param start: skip messages received before this epoch time
+        :param end: stop at messages received after this epoch time
+        :return: generator of (receive time, message)
+        """
+        data = self._map
+        size = len(data)
+        offset = self._seek(start)
+
+        while offset + RECORD.size <= size:
+            timestamp, kind, length = RECORD.unpack_from(data, offset)
+            offset += RECORD.size
+            if offset + length > size:
+                # the recorder was stopped part way through writing this record
+                return
+
+            if end is not None and timestamp > end:
+                return
+            if start is None or timestamp >= start:
+                frame = data[offset:offset + length]
+                yield timestamp, frame.decode('utf-8') if kind == TEXT else frame
+            offset += length
+
+    def replay(self, stream, speed:float = 1.0, start:float = None, end:float = None) -> int:
+        """
+        Feed the log into a Stream as if the messages were being received
+        :param stream: Stream
+        :param speed: 1 for the original timing, N for N times faster, None or 0 for as fast as possible
+        :param start: first receive time to replay
+        :param end: last receive time to replay
+        :return: number of messages replayed
+        """
+        count = 0
+        pace = self._pacer(speed)
+        for timestamp, message in self.records(start, end):
+            delay = pace(timestamp)
+            if delay > 0:
+                time.sleep(delay)
+            stream._receive(message)
+            count += 1
+        return count
+
+    async def replay_async(self, stream, speed:float = 1.0, start:float = None, end:float = None) -> int:
+        """
+        Feed the log into an AsyncStream, see replay()
+        :return: number of messages replayed
+        """
+        count = 0
+        pace = self._pacer(speed)
+        for timestamp, message in self.records(start, end):
+            delay = pace(timestamp)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            await stream._receive(message)
+            count += 1
+        return count
+
+    @staticmethod
+    def _pacer(speed:float):
+        """
+        Returns a function giving the seconds to wait before a message received at a recorded time
+        """
+        origin = []
+
+        def pace(timestamp:float) -> float:
+            if not speed:
+                return 0.0
+            now = time.monotonic()
+            if not origin:
+                origin.extend((timestamp, now))
+                return 0.0
+            return (timestamp - origin[0]) / speed - (now - origin[1])
+
+        return pace
+
+    def _seek(self, start:float) -> int:
+        """
+        Offset of the last indexed record at or before start
+        """
+        if start is None or not self._index:
+            return len(MAGIC)
+        position = bisect_right(self._index, (start, float('inf'))) - 1
+        return self._index[position][1] if position >= 0 else len(MAGIC)
+
+    @staticmethod
+    def _read_index(path:str) -> list:
+        if not os.path.exists(path):
+            return []
+        with open(path, 'rb') as f:
+            raw = f.read()
+        usable = len(raw) - len(raw) % INDEX_ENTRY.size
+        return [INDEX_ENTRY.unpack_from(raw, offset) for offset in range(0, usable, INDEX_ENTRY.size)]
@@ -1,13 +1,24 @@
 import os
+import inspect
 import logging
-import requests
+import time
 from enum import Enum
-from functools import lru_cache
-from requests.exceptions import ReadTimeout, Timeout, HTTPError
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from requests.exceptions import ReadTimeout, Timeout, HTTPError, ConnectionError
+from urllib.parse import urlsplit
 import os
 from .exceptions import NotAuthorised, MissingClientId, MissingClientSecret, MissingTicker, RateLimitExceeded
 from financefeast.common import Environments
-from financefeast.entity import Response
+from financefeast.entity import Response, BulkResult, RequestInfo
+from financefeast.chunking import split_range, merge_responses, parse_datetime, record_key
+from financefeast.cache import BarCache, TTLCache
+from financefeast.jsonstream import iter_records, RecordBatcher
+from financefeast.metrics import RestMetrics
+from financefeast.codec import JSONCodec, default_codec
+from financefeast.transport import Transport, default_transport
+from financefeast.ratelimit import RateLimiter, reset_seconds
+from financefeast.retry import RetryPolicy
 
 
 os.environ['NO_PROXY'] = 'localhost'
@@ -53,14 +64,46 @@ class APIError(Exception):
 class Rest:
 
     DEFAULT_LOG_LEVEL = logging.INFO
-
-    def __init__(self, client_id:str = None, client_secret:str = None, token:str = None, logger:logging.Logger = None, environment:Environments=Environments.prod, **kwargs):
+    DEFAULT_MAX_WORKERS = 8
+    DEFAULT_MAX_CHUNK_BARS = 5000
+    DEFAULT_STREAM_BATCH = 1000
+    BULK_ENDPOINTS = ('eod', 'intraday', 'last', 'orderbook', 'sma', 'ema', 'macd', 'rsi', 'adx', 'bollinger', 'stochastic',
+                      'cashflow', 'income', 'balance', 'dividend', 'split')
+
+    def __init__(self, client_id:str = None, client_secret:str = None, token:str = None, logger:logging.Logger = None, environment:Environments=Environments.prod,
+                 transport:Transport = None, rate_limiter:RateLimiter = None, retry:RetryPolicy = None,
+                 max_chunk_bars:int = DEFAULT_MAX_CHUNK_BARS, bar_cache:BarCache = None,
+                 response_cache:TTLCache = None, codec:JSONCodec = None, metrics:RestMetrics = None, on_request = None,
+                 on_response = None, **kwargs):
+        """
+        Rest client for the Financefeast API
+        :param client_id: depreciated, use token
+        :param client_secret: depreciated, use token
+        :param token: API authentication token
+        :param logger: supply your own logger or use the default
+        :param environment: supply an optional Financefeast Environment ENUM object
+        :param transport: HTTP transport to send requests through. Defaults to a pooled keep-alive transport shared by all clients
+        :param rate_limiter: client side rate limiter, share one between clients using the same token. Defaults to a new RateLimiter
+        :param retry: retry policy for failed requests. Defaults to RetryPolicy(), pass RetryPolicy(max_retries=0) to disable
+        :param max_chunk_bars: eod and intraday ranges with more bars than this are split into parallel requests. None to disable
+        :param bar_cache: optional on-disk BarCache for historical eod and intraday bars
+        :param response_cache: optional in-memory TTLCache for reference data and past year financial data
+        :param codec: JSON codec used to decode responses. Defaults to the fastest installed library
+        :param metrics: optional RestMetrics, or True for a default one, to collect per endpoint counts, latencies,
+        response sizes, retries, 429s and the last x-ratelimit-remaining. See metrics.RestMetrics
+        :param on_request: function called with an entity.RequestInfo before each HTTP attempt, including retries
+        :param on_response: function called with the same RequestInfo and the response after each attempt. The
+        response is None and RequestInfo.error is set if the attempt failed
+        """
         self._client_id = client_id
         self._client_secret = client_secret
         self._token = token
         self._logger = logger
         self._kwargs = kwargs
         self._environment = environment
+        self._max_chunk_bars = max_chunk_bars
+        self._bar_cache = bar_cache
+        self._response_cache = response_cache
 
         if not logger:
             self._logger = logging.getLogger('ff_client')
@@ -68,7 +111,9 @@ class Rest:
         # set log level
         logging.basicConfig(level=self.DEFAULT_LOG_LEVEL)
 
-        self._requests = self.RequestRateLimited(self._logger)
+        self._requests = self._create_requests(transport=transport, rate_limiter=rate_limiter, retry=retry, codec=codec,
+                                               metrics=RestMetrics() if metrics is True else metrics or None,
+                                               on_request=on_request, on_response=on_response)
 
         self._logger.info(f"API environment set as {self._environment.name}")
 
@@ -78,6 +123,14 @@ class Rest:
         if not self._token:
             self._token = os.environ.get('FF-TOKEN')
 
+    def _create_requests(self, **kwargs):
+        """
+        Build the requester used for every API call
+        :param kwargs: RequestRateLimited parameters
+        :return: RequestRateLimited
+        """
+        return self.RequestRateLimited(self._logger, **kwargs)
+
     def __authorize(self):
         """
         Authorize client credentials
@@ -85,40 +138,62 @@ class Rest:
         """
 
         if not self._token:
-            if not self._client_id:
-                self._client_id = os.environ.get('FF-CLIENT-ID')
-            if not self._client_secret:
-                self._client_secret = os.environ.get('FF-CLIENT-SECRET')
+            url, headers = self._login_request()
+            return self._login_token(self._login(url=url, headers=headers))
 
-            if not self._client_secret and not self._token:
-                raise MissingClientSecret(
-                    "Missng authentication token. Set environment variable FF-TOKEN=YOUR_API_TOKEN, or pass token=YOUR_API_TOKEN as a parameter when creating an instance of FinanceFeast. Please check the readme or API documentation for more help https://doc.financefeast.io"
-                )
+        return self._token
 
-            if not self._client_id and not self._token:
-                raise MissingClientId(
-                    "Missng authentication token. Set environment variable FF-TOKEN=YOUR_API_TOKEN, or pass token=YOUR_API_TOKEN as a parameter when creating an instance of FinanceFeast. Please check the readme or API documentation for more help https://doc.financefeast.io"
-                )
+    def _login_request(self):
+        """
+        Build the client credential login request, reading the credentials from the environment if they were not passed
+        :return: tuple of (url, headers)
+        """
+        if not self._client_id:
+            self._client_id = os.environ.get('FF-CLIENT-ID')
+        if not self._client_secret:
+            self._client_secret = os.environ.get('FF-CLIENT-SECRET')
 
-            if not self._token and self._client_id and self._client_secret:
-                url = f'{self._environment.value}/oauth/login'
-                self._logger.debug(f'Constructed url {url} for authorization')
+        if not self._client_secret:
+            raise MissingClientSecret(
+                "Missng authentication token. Set environment variable FF-TOKEN=YOUR_API_TOKEN, or pass token=YOUR_API_TOKEN as a parameter when creating an instance of FinanceFeast. Please check the readme or API documentation for more help https://doc.financefeast.io"
+            )
 
-                headers = {"X-FF-ID": self._client_id, "X-FF-SECRET": self._client_secret}
+        if not self._client_id:
+            raise MissingClientId(
+                "Missng authentication token. Set environment variable FF-TOKEN=YOUR_API_TOKEN, or pass token=YOUR_API_TOKEN as a parameter when creating an instance of FinanceFeast. Please check the readme or API documentation for more help https://doc.financefeast.io"
+            )
 
-                r = self._requests.get(url=url, headers=headers)
+        url = f'{self._environment.value}/oauth/login'
+        self._logger.debug(f'Constructed url {url} for authorization')
 
-                if r.access_token:
-                    self._token = r.access_token
-                    self._logger.debug('Found a valid access_token')
+        headers = {"X-FF-ID": self._client_id, "X-FF-SECRET": self._client_secret}
 
-                    self._logger.info("Client successfully authorized to API using client credentials")
-                    return self._token
+        return url, headers
 
-            self._logger.warning("No client_id, client_secret or an invalid token has been submitted. Pass a valid token or supply your client credentails to authorize to the Financefeast API")
-            raise NotAuthorised()
+    def _login_token(self, r):
+        """
+        Keep the access token from a login response
+        :param r: oauth/login Response
+        :return: access token
+        """
+        if r is not None and r.access_token:
+            self._token = r.access_token
+            self._logger.debug('Found a valid access_token')
 
-        return self._token
+            self._logger.info("Client successfully authorized to API using client credentials")
+            return self._token
+
+        self._logger.warning("No client_id, client_secret or an invalid token has been submitted. Pass a valid token or supply your client credentails to authorize to the Financefeast API")
+        raise NotAuthorised()
+
+    def _login(self, url:str, headers:dict):
+        """
+        Request an access token using client credentials
+        :param url: oauth/login url
+        :param headers: client credential headers
+        :return: Response
+        """
+        return self._requests.get(url=url, headers=headers)
 
     def __check_authorization(self):
         """
@@ -147,15 +222,29 @@ class Rest:
         RATE_LIMIT_HEADER_LIMIT_NAME = 'x-ratelimit-limit'
         RATE_LIMIT_HEADER_REMAINING_NAME = 'x-ratelimit-remaining'
         RATE_LIMIT_HEADER_RESET_NAME = 'x-ratelimit-reset'
+        STREAM_CHUNK_SIZE = 65536
 
-        def __init__(self, logger:logging.Logger = None):
+        def __init__(self, logger:logging.Logger = None, transport:Transport = None, rate_limiter:RateLimiter = None,
+                     retry:RetryPolicy = None, codec:JSONCodec = None, metrics:RestMetrics = None, on_request = None,
+                     on_response = None):
             self.logger = logger
-            self.session = requests.Session()
+            self.transport = transport or self._default_transport()
+            self.session = getattr(self.transport, 'session', None)
+            self.limiter = rate_limiter or RateLimiter()
+            self.retry = retry or RetryPolicy()
+            self.codec = codec or default_codec()
             self.rate_limit = None
             self.rate_limit_remaining = None
             self.rate_limit_reset = None
+            self.metrics = metrics
+            self.on_request = on_request
+            self.on_response = on_response
 
-        def __parse_request_rate_limit_headers(self, request):
+        @staticmethod
+        def _default_transport():
+            return default_transport()
+
+        def _parse_request_rate_limit_headers(self, request):
 
             try:
                 self.rate_limit = request.headers[self.RATE_LIMIT_HEADER_LIMIT_NAME]
@@ -178,37 +267,178 @@ class Rest:
                 self.logger.debug(f'No request header found for {self.RATE_LIMIT_HEADER_RESET_NAME}')
                 self.rate_limit_reset = None
 
+            self.limiter.update(self.rate_limit, self.rate_limit_remaining, self.rate_limit_reset)
+
             return
 
         def get(self, *args, **kwargs):
 
             self.logger.debug(f'Calling url {kwargs.get("url")}')
 
+            started = time.perf_counter()
+            r = self._send(*args, **kwargs)
+
+            if self.metrics is not None:
+                self.metrics.completed(self._endpoint(kwargs.get('url')), time.perf_counter() - started, len(r.content))
+
+            return self._build_response(r.status_code, r.content, lambda: self.codec.loads(r.content))
+
+        def iter_data(self, url:str, headers:dict = None, params:dict = None, batch_size:int = None, key:str = 'data'):
+            """
+            Stream the records of a response as the body is received, without holding the whole body in memory
+            :param url: endpoint url
+            :param headers: request headers
+            :param params: query parameters
+            :param batch_size: if set, yield lists of up to batch_size records instead of single records
+            :param key: name of the top level field holding the records
+            :return: generator of records, or of lists of records
+            """
+            self.logger.debug(f'Streaming url {url}')
+
+            started = time.perf_counter()
+            r = self._send(url=url, headers=headers, params=params, stream=True)
+            size = [0]
+
             try:
-                r = requests.get(*args, timeout=(self.TIMEOUT_CONN, self.TIMEOUT_RESP), **kwargs)
-            except (ReadTimeout, Timeout) as e:
-                # timeout error
-                raise
-            except HTTPError as e:
-                if 'detail' in r.text:
-                    error = r.json()
-                    raise APIError(error=error, http_error=e)
-                else:
-                    raise
-
-            if r.status_code == 403:
-                raise NotAuthorised(r.json())
-            if r.status_code == 404:
-                raise MissingTicker(r.json())
-            if r.status_code == 429:
-                raise RateLimitExceeded(r.json())
-
-            if r.text:
+                if r.status_code >= 400:
+                    self._build_response(r.status_code, r.content, lambda: self.codec.loads(r.content))
+                    r.raise_for_status()
+
+                yield from iter_records(_counted(r.iter_content(chunk_size=self.STREAM_CHUNK_SIZE), size), key=key, batch_size=batch_size)
+            finally:
+                r.close()
+                if self.metrics is not None:
+                    self.metrics.completed(self._endpoint(url), time.perf_counter() - started, size[0])
+
+        def _send(self, *args, **kwargs):
+            """
+            Send a GET request through the transport, retrying as set by the retry policy
+            :return: requests.Response
+            """
+            started = self.retry.start()
+            attempt = 0
+
+            while True:
+                if not self.limiter.acquire(timeout=self.retry.remaining(started)):
+                    raise self._deadline_exceeded(kwargs.get('url'))
+                info = self._attempt_started(kwargs.get('url'), kwargs.get('params'), attempt)
+
+                try:
+                    r = self.transport.get(*args, timeout=(self.TIMEOUT_CONN, self.TIMEOUT_RESP), **kwargs)
+                except (ReadTimeout, Timeout, ConnectionError) as e:
+                    self._attempt_finished(info, error=e)
+                    # timeout or connection reset
+                    delay = self.retry.delay(attempt, started)
+                    if delay is None:
+                        raise
+                    self.logger.warning(f'Retrying url {kwargs.get("url")} in {delay:.2f}s after error: {e}')
+                    time.sleep(delay)
+                    attempt += 1
+                    continue
+                except HTTPError as e:
+                    if 'detail' in r.text:
+                        error = r.json()
+                        raise APIError(error=error, http_error=e)
+                    else:
+                        raise
+
+                self._parse_request_rate_limit_headers(r)
+                self._attempt_finished(info, r, r.status_code)
+
+                if self.retry.is_retryable(r.status_code):
+                    delay = self._retry_delay(r.status_code, attempt, started)
+                    if delay is not None:
+                        self.logger.warning(f'Retrying url {kwargs.get("url")} in {delay:.2f}s after status {r.status_code}')
+                        r.close()
+                        time.sleep(delay)
+                        attempt += 1
+                        continue
+
+                return r
+
+        def _deadline_exceeded(self, url:str) -> RateLimitExceeded:
+            """
+            Error for a request that could not get rate limit budget before the retry deadline
+            """
+            return RateLimitExceeded(f"Rate limit budget for url {url} not available within the {self.retry.deadline}s deadline")
+
+        def _endpoint(self, url:str) -> str:
+            return self.metrics.endpoint(url) if self.metrics is not None else urlsplit(url or '').path
+
+        def _attempt_started(self, url:str, params:dict, attempt:int):
+            """
+            Call on_request before a HTTP attempt
+            :return: RequestInfo, or None if there are no metrics or hooks
+            """
+            if self.metrics is None and self.on_request is None and self.on_response is None:
+                return None
+
+            info = RequestInfo(self._endpoint(url), url, params, attempt)
+            if self.on_request is not None:
                 try:
-                    r = r.json()
+                    self.on_request(info)
                 except Exception as e:
-                    r = {}
-                return Response(r)
+                    self.logger.error(f"error from on_request {self.on_request}: {e}")
+            return info
+
+        def _attempt_finished(self, info:RequestInfo, response = None, status_code:int = None, error:Exception = None):
+            """
+            Record a HTTP attempt in the metrics and call on_response
+            :return:
+            """
+            if info is None:
+                return
+
+            info.elapsed = time.time() - info.started
+            info.status_code = status_code
+            info.error = error
+
+            if self.metrics is not None:
+                # requests measures the time to the response headers, use it when the body was read with them
+                elapsed = getattr(response, 'elapsed', None)
+                time_to_headers = elapsed.total_seconds() if hasattr(elapsed, 'total_seconds') else info.elapsed
+                self.metrics.attempted(info.endpoint, status_code, time_to_headers if error is None else None,
+                                       retry=info.attempt > 0, error=error,
+                                       ratelimit_remaining=self.rate_limit_remaining if response is not None else None)
+
+            if self.on_response is not None:
+                try:
+                    self.on_response(info, response)
+                except Exception as e:
+                    self.logger.error(f"error from on_response {self.on_response}: {e}")
+
+        def _retry_delay(self, status_code:int, attempt:int, started:float):
+            """
+            Seconds to wait before retrying a retryable status code, or None to give up
+            """
+            reset = None
+            if status_code == 429:
+                self.limiter.exhausted(self.rate_limit_reset)
+                reset = reset_seconds(self.rate_limit_reset)
+
+            return self.retry.delay(attempt, started, reset=reset)
+
+        def _build_response(self, status_code:int, body, decode):
+            """
+            Map a HTTP response to a Response object, raising for error status codes
+            :param status_code: HTTP status code
+            :param body: raw response body
+            :param decode: callable that returns the decoded json body
+            :return: Response or None for an empty body
+            """
+            if status_code == 403:
+                raise NotAuthorised(decode())
+            if status_code == 404:
+                raise MissingTicker(decode())
+            if status_code == 429:
+                raise RateLimitExceeded(decode())
+
+            if body:
+                try:
+                    payload = decode()
+                except Exception as e:
+                    payload = {}
+                return Response(payload)
 
             return None
 
@@ -220,6 +450,56 @@ class Rest:
     def request(self):
         return self._requests
 
+    @property
+    def rate_limiter(self) -> RateLimiter:
+        return self._requests.limiter
+
+    @property
+    def metrics(self) -> RestMetrics:
+        return self._requests.metrics
+
+    @property
+    def response_cache(self) -> TTLCache:
+        return self._response_cache
+
+    def _cached_get(self, endpoint:str, url:str, headers:dict = None, query:dict = None):
+        """
+        GET through the response cache, if one was supplied
+        :param endpoint: endpoint name, used for the cache TTL policy and invalidation
+        :return: Response
+        """
+        if self._response_cache is None:
+            return self._requests.get(url=url, headers=headers, params=query)
+
+        key = (endpoint, url, tuple(sorted((k, str(v)) for k, v in (query or {}).items())))
+        response = self._response_cache.get(key)
+        if response is not None:
+            return response
+
+        response = self._requests.get(url=url, headers=headers, params=query)
+        if response is not None:
+            self._response_cache.set(key, response, ttl=self._response_cache.ttl_for(endpoint))
+        return response
+
+    @staticmethod
+    def _is_past_period(year:str = None, date_to:str = None) -> bool:
+        """
+        True if a financial query only covers years before the current one, so the data is final and can be cached
+        """
+        current = datetime.now().year
+        if year:
+            try:
+                return int(year) < current
+            except (TypeError, ValueError):
+                return False
+        end = parse_datetime(date_to)
+        return end is not None and end.year < current
+
+    def _get_financial(self, url:str, headers:dict, query:dict, year:str = None, date_to:str = None):
+        if self._is_past_period(year, date_to):
+            return self._cached_get('financial', url, headers, query)
+        return self._requests.get(url=url, headers=headers, params=query)
+
     """
         Endpoint methods below
     """
@@ -290,7 +570,7 @@ class Rest:
         if exchange:
             query.update({'exchange': exchange})
 
-        return self._requests.get(url=url, params=query)
+        return self._cached_get('tickers', url, query=query)
 
     def tickers_search(self, search_str:str, exchange:str=None):
         """
@@ -307,7 +587,7 @@ class Rest:
         if exchange:
             query.update({'exchange': exchange})
 
-        return self._requests.get(url=url, params=query)
+        return self._cached_get('tickers_search', url, query=query)
 
     def exchange(self):
         """
@@ -316,7 +596,7 @@ class Rest:
         """
         url = url = f'{self._environment.value}/info/exchange'
 
-        return self._requests.get(url=url)
+        return self._cached_get('exchange', url)
 
     def exchange_status(self, exchange:str='nzx'):
         """
@@ -332,7 +612,7 @@ class Rest:
         if exchange:
             query.update({'exchange' : exchange})
 
-        return self._requests.get(url=url, params=query)
+        return self._cached_get('exchange_status', url, query=query)
 
     def social_sentiment(self, ticker:str, date_from:str=None, date_to:str=None, platform:str=None, exchange:str='nzx'):
         """
@@ -467,6 +747,7 @@ class Rest:
         :param date_to: in format YYYY-MM-DD
         :param exchange: exhange ticker is in
         :param interval: data time interval, eg 1d
+        Ranges longer than max_chunk_bars bars are fetched as parallel chunks and merged. With a bar_cache only uncached gaps are fetched
         :return:
         """
 
@@ -499,7 +780,10 @@ class Rest:
         if interval:
             query.update({'interval' : interval})
 
-        return self._requests.get(url=url, headers=headers, params=query)
+        if self._bar_cache is not None:
+            return self._get_cached(BarCache.key('eod', ticker, exchange, interval), url, headers, query, 'date_from', 'date_to', interval, date_only=True)
+
+        return self._get_range(url, headers, query, 'date_from', 'date_to', interval, date_only=True)
 
 
     def intraday(self, ticker:str, datetime_from:str=None, datetime_to:str=None, exchange:str='nzx', interval:str='1h'):
@@ -510,6 +794,7 @@ class Rest:
         :param datetime_to: in format YYYY-MM-DD 00:00:00
         :param exchange: exchange ticker is in
         :param interval: data time interval, eg 1h
+        Ranges longer than max_chunk_bars bars are fetched as parallel chunks and merged. With a bar_cache only uncached gaps are fetched
         :return:
         """
 
@@ -542,8 +827,71 @@ class Rest:
         if interval:
             query.update({'interval' : interval})
 
-        return self._requests.get(url=url, headers=headers, params=query)
+        if self._bar_cache is not None:
+            return self._get_cached(BarCache.key('intraday', ticker, exchange, interval), url, headers, query, 'datetime_from', 'datetime_to', interval)
+
+        return self._get_range(url, headers, query, 'datetime_from', 'datetime_to', interval)
+
+
+    def iter_eod(self, ticker:str, date_from:str=None, date_to:str=None, exchange:str='nzx', interval:str='1d', batch_size:int=None):
+        """
+        Stream data/eod records as they are received instead of building the whole response in memory.
+        Large ranges are requested chunk by chunk, in order.
+        :param ticker: ticker to search data for, eg air.nz
+        :param date_from: in format YYYY-MM-DD
+        :param date_to: in format YYYY-MM-DD
+        :param exchange: exhange ticker is in
+        :param interval: data time interval, eg 1d
+        :param batch_size: if set, yield lists of up to batch_size records instead of single records
+        :return: generator of records
+        """
+        self.__authorize()
+
+        url = f'{self._environment.value}/data/eod'
+        headers = self.__generate_authorization_header()
+
+        # check required parameters
+        if not ticker:
+            raise MissingTicker(
+                "parameter `ticker` must be either passed"
+            )
+
+        # build query parameters for endpoint
+        query = {'ticker' : ticker, 'exchange' : exchange, 'interval' : interval}
 
+        chunks = split_range(date_from, date_to, interval, self._max_chunk_bars, date_only=True)
+
+        return self._iter_range(url, headers, query, 'date_from', 'date_to', chunks, batch_size)
+
+    def iter_intraday(self, ticker:str, datetime_from:str=None, datetime_to:str=None, exchange:str='nzx', interval:str='1h', batch_size:int=None):
+        """
+        Stream data/intraday records as they are received instead of building the whole response in memory.
+        Large ranges are requested chunk by chunk, in order.
+        :param ticker: ticker to search data for, eg air.nz
+        :param datetime_from: in format YYYY-MM-DD 00:00:00
+        :param datetime_to: in format YYYY-MM-DD 00:00:00
+        :param exchange: exchange ticker is in
+        :param interval: data time interval, eg 1h
+        :param batch_size: if set, yield lists of up to batch_size records instead of single records
+        :return: generator of records
+        """
+        self.__authorize()
+
+        url = f'{self._environment.value}/data/intraday'
+        headers = self.__generate_authorization_header()
+
+        # check required parameters
+        if not ticker:
+            raise MissingTicker(
+                "parameter `ticker` must be either passed"
+            )
+
+        # build query parameters for endpoint
+        query = {'ticker' : ticker, 'exchange' : exchange, 'interval' : interval}
+
+        chunks = split_range(datetime_from, datetime_to, interval, self._max_chunk_bars)
+
+        return self._iter_range(url, headers, query, 'datetime_from', 'datetime_to', chunks, batch_size)
 
     def last(self, ticker:str, exchange:str='nzx'):
         """
@@ -984,7 +1332,7 @@ class Rest:
         if year:
             query.update({'year' : year})
 
-        return self._requests.get(url=url, headers=headers, params=query)
+        return self._get_financial(url, headers, query, year=year, date_to=date_to)
 
 
     def income(self, ticker:str, date_from:str=None, date_to:str=None, year:str=None, exchange:str='nzx'):
@@ -1027,7 +1375,7 @@ class Rest:
         if year:
             query.update({'year' : year})
 
-        return self._requests.get(url=url, headers=headers, params=query)
+        return self._get_financial(url, headers, query, year=year, date_to=date_to)
 
 
 
@@ -1071,7 +1419,7 @@ class Rest:
         if year:
             query.update({'year' : year})
 
-        return self._requests.get(url=url, headers=headers, params=query)
+        return self._get_financial(url, headers, query, year=year, date_to=date_to)
 
 
     def dividend(self, ticker:str, date_from:str=None, date_to:str=None, year:str=None, exchange:str='nzx'):
@@ -1114,7 +1462,7 @@ class Rest:
         if year:
             query.update({'year' : year})
 
-        return self._requests.get(url=url, headers=headers, params=query)
+        return self._get_financial(url, headers, query, year=year, date_to=date_to)
 
 
     def split(self, ticker:str, date_from:str=None, date_to:str=None, year:str=None, exchange:str='nzx'):
@@ -1157,5 +1505,163 @@ class Rest:
         if year:
             query.update({'year' : year})
 
+        return self._get_financial(url, headers, query, year=year, date_to=date_to)
+
+    def _get_range(self, url:str, headers:dict, query:dict, from_name:str, to_name:str, interval:str, date_only:bool = False):
+        """
+        Fetch a date range, split into parallel chunk requests if it is longer than max_chunk_bars bars
+        :return: Response
+        """
+        chunks = split_range(query.get(from_name), query.get(to_name), interval, self._max_chunk_bars, date_only=date_only)
+        if len(chunks) > 1:
+            return self._get_chunked(url, headers, query, from_name, to_name, chunks)
+
         return self._requests.get(url=url, headers=headers, params=query)
 
+    def _get_cached(self, key:str, url:str, headers:dict, query:dict, from_name:str, to_name:str, interval:str, date_only:bool = False):
+        """
+        Fetch a date range through the bar cache. Only the gaps missing from the cache and the part of the range that
+        is not yet closed are requested from the API.
+        :return: Response
+        """
+        plan = self._bar_cache.plan(key, query.get(from_name), query.get(to_name), interval, date_only=date_only)
+        if plan is None:
+            return self._get_range(url, headers, query, from_name, to_name, interval, date_only=date_only)
+
+        self._logger.debug(f"Bar cache {key} fetching {len(plan.gaps)} gaps")
+
+        for start, end in plan.gaps:
+            response = self._get_range(url, headers, dict(query, **{from_name: start, to_name: end}), from_name, to_name, interval, date_only=date_only)
+            if not self._bar_cache.storable(response):
+                self._logger.warning(f"Bar cache {key} fetch of {start} to {end} returned no data, not caching it")
+                return response
+            if not self._bar_cache.store(plan, response, start, end):
+                self._logger.warning(f"Bar cache {key} can not read the record timestamps, fetching without the cache")
+                return self._get_range(url, headers, query, from_name, to_name, interval, date_only=date_only)
+
+        open_response = None
+        if plan.open_range:
+            start, end = plan.open_range
+            open_response = self._get_range(url, headers, dict(query, **{from_name: start, to_name: end}), from_name, to_name, interval, date_only=date_only)
+            if not self._bar_cache.storable(open_response):
+                return open_response
+
+        return self._bar_cache.result(plan, open_response)
+
+    def _iter_range(self, url:str, headers:dict, query:dict, from_name:str, to_name:str, chunks:list, batch_size:int = None):
+        """
+        Stream the records of each chunk in turn, dropping records repeated at chunk boundaries
+        :return: generator of records, or of lists of records
+        """
+        batcher = RecordBatcher(batch_size)
+        last_key = None
+
+        for start, end in chunks:
+            chunk_query = dict(query, **{from_name: start, to_name: end})
+            chunk_query = {k: v for k, v in chunk_query.items() if v}
+
+            for batch in self._requests.iter_data(url, headers=headers, params=chunk_query, batch_size=self.DEFAULT_STREAM_BATCH):
+                if last_key is not None and batch and record_key(batch[0]) == last_key:
+                    batch = batch[1:]
+                if not batch:
+                    continue
+                last_key = record_key(batch[-1])
+
+                yield from batcher.add(batch)
+
+        yield from batcher.flush()
+
+    def _get_chunked(self, url:str, headers:dict, query:dict, from_name:str, to_name:str, chunks:list):
+        """
+        Fetch a date range as parallel chunk requests and merge the responses in order
+        :param url: endpoint url
+        :param headers: request headers
+        :param query: query parameters of the full range
+        :param from_name: name of the range start query parameter
+        :param to_name: name of the range end query parameter
+        :param chunks: list of (start, end) tuples from split_range
+        :return: Response
+        """
+        self._logger.debug(f"Splitting request to {url} into {len(chunks)} chunks")
+
+        queries = [dict(query, **{from_name: start, to_name: end}) for start, end in chunks]
+
+        with ThreadPoolExecutor(max_workers=min(len(queries), self.DEFAULT_MAX_WORKERS)) as pool:
+            responses = list(pool.map(lambda q: self._requests.get(url=url, headers=headers, params=q), queries))
+
+        return merge_responses(responses)
+
+    """
+        Bulk methods below
+    """
+
+    def _bulk_calls(self, tickers:list, endpoints:list, kwargs:dict):
+        """
+        Build the (ticker, endpoint, method, kwargs) calls for a bulk request. Keyword arguments are only passed to
+        endpoints that accept them, so eg date_from and datetime_from can be mixed in one call.
+        """
+        calls = []
+        for endpoint in endpoints:
+            if endpoint not in self.BULK_ENDPOINTS:
+                raise ValueError(f"endpoint `{endpoint}` is not supported for bulk requests, use one of {self.BULK_ENDPOINTS}")
+
+            method = getattr(self, endpoint)
+            parameters = inspect.signature(method).parameters
+            endpoint_kwargs = {k: v for k, v in kwargs.items() if k in parameters}
+
+            for ticker in tickers:
+                calls.append((ticker, endpoint, method, endpoint_kwargs))
+
+        return calls
+
+    def many(self, tickers:list, endpoints:list = ('eod',), max_workers:int = DEFAULT_MAX_WORKERS, **kwargs):
+        """
+        Call one or more endpoints for each ticker concurrently on a bounded thread pool. Results are yielded as they
+        complete, and an error for one ticker is returned in its BulkResult instead of failing the batch.
+        Requests share this client's rate limiter and retry policy.
+        :param tickers: list of tickers, eg ['air.nz', 'fph.nz']
+        :param endpoints: list of endpoint method names, eg ['eod', 'rsi']
+        :param max_workers: maximum number of concurrent requests
+        :param kwargs: endpoint parameters, eg date_from='2021-01-01'. Only passed to endpoints that accept them
+        :return: generator of BulkResult
+        """
+        calls = self._bulk_calls(tickers, endpoints, kwargs)
+
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            futures = {pool.submit(method, ticker, **endpoint_kwargs): (ticker, endpoint)
+                       for ticker, endpoint, method, endpoint_kwargs in calls}
+            try:
+                for future in as_completed(futures):
+                    ticker, endpoint = futures[future]
+                    try:
+                        yield BulkResult(ticker, endpoint, future.result(), None)
+                    except Exception as e:
+                        self._logger.warning(f"Bulk request {endpoint} for {ticker} failed: {e!r}")
+                        yield BulkResult(ticker, endpoint, None, e)
+            finally:
+                # stop queued requests if the caller stops iterating early
+                for future in futures:
+                    future.cancel()
+
+    def eod_many(self, tickers:list, date_from:str=None, date_to:str=None, exchange:str='nzx', interval:str='1d', max_workers:int = DEFAULT_MAX_WORKERS):
+        """
+        Concurrent eod for a list of tickers, see many()
+        :return: generator of BulkResult
+        """
+        return self.many(tickers, ['eod'], max_workers=max_workers, date_from=date_from, date_to=date_to, exchange=exchange, interval=interval)
+
+    def intraday_many(self, tickers:list, datetime_from:str=None, datetime_to:str=None, exchange:str='nzx', interval:str='1h', max_workers:int = DEFAULT_MAX_WORKERS):
+        """
+        Concurrent intraday for a list of tickers, see many()
+        :return: generator of BulkResult
+        """
+        return self.many(tickers, ['intraday'], max_workers=max_workers, datetime_from=datetime_from, datetime_to=datetime_to, exchange=exchange, interval=interval)
+
+
+def _counted(chunks, size:list):
+    """
+    Pass through chunks of a response body, adding their length to size[0]
+    """
+    for chunk in chunks:
+        size[0] += len(chunk)
+        yield chunk
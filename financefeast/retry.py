@@ -0,0 +1,118 @@
+import random
+import time
+
+"""
+Retry policy for idempotent Rest requests
+"""
+
+
+class RetryPolicy(object):
+    """
+    Retry failed GET requests with exponential backoff and full jitter. Timeouts, connection errors and the status codes
+    in `status_codes` are retried. When the API returns a x-ratelimit-reset header with a 429 the retry waits until the
+    reset instead. No retry is started once it would run past `deadline` seconds from the first attempt.
+
+    Pass RetryPolicy(max_retries=0) to disable retries.
+    """
+    DEFAULT_MAX_RETRIES = 3
+    DEFAULT_BACKOFF_FACTOR = 0.5
+    DEFAULT_BACKOFF_MAX = 30.0
+    DEFAULT_DEADLINE = 60.0
+    RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+    def __init__(self, max_retries:int = DEFAULT_MAX_RETRIES, backoff_factor:float = DEFAULT_BACKOFF_FACTOR,
+                 backoff_max:float = DEFAULT_BACKOFF_MAX, deadline:float = DEFAULT_DEADLINE,
+                 status_codes:tuple = RETRY_STATUS_CODES, clock=time.monotonic):
+        """
+        :param max_retries: maximum number of retries after the first attempt
+        :param backoff_factor: base delay in seconds, the backoff ceiling for retry n is backoff_factor * 2 ** n
+        :param backoff_max: maximum backoff ceiling in seconds
+        :param deadline: total seconds allowed for a call including retries, None for no deadline
+        :param status_codes: HTTP status codes that are retried
+        :param clock: monotonic clock function, returns seconds
+        """
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.backoff_max = backoff_max
+        self.deadline = deadline
+        self.status_codes = status_codes
+        self._clock = clock
+
+    def start(self) -> float:
+        """
+        Returns the start time of a call, pass this to delay()
+        :return: float
+        """
+        return self._clock()
+
+    def remaining(self, started:float):
+        """
+        Seconds left before the deadline
+        :param started: start time of the call returned by start()
+        :return: float seconds, or None if there is no deadline
+        """
+        if self.deadline is None:
+            return None
+        return max(self.deadline - (self._clock() - started), 0.0)
+
+    def is_retryable(self, status_code:int) -> bool:
+        return status_code in self.status_codes
+
+    def delay(self, attempt:int, started:float, reset:float = None):
+        """
+        Seconds to wait before the next attempt
+        :param attempt: number of retries already made
+        :param started: start time of the call returned by start()
+        :param reset: seconds until the rate limit resets, if known
+        :return: float seconds, or None if the call should not be retried
+        """
+        if attempt >= self.max_retries:
+            return None
+
+        if reset is not None:
+            # jitter the wake up so clients sharing a token do not all retry at the reset
+            wait = reset + random.uniform(0, self.backoff_factor)
+        else:
+            wait = random.uniform(0, min(self.backoff_max, self.backoff_factor * 2 ** attempt))
+
+        if self.deadline is not None and self._clock() - started + wait > self.deadline:
+            return None
+
+        return wait
+
+
+class ReconnectPolicy(object):
+    """
+    Delay between Stream reconnect attempts, exponential backoff with full jitter so many clients dropped at once do
+    not reconnect together. The attempt count starts again once a connection has stayed up for `reset_after` seconds.
+
+    ReconnectPolicy(initial=5, multiplier=1, jitter=False) gives a fixed 5 second delay.
+    """
+    DEFAULT_INITIAL = 1.0
+    DEFAULT_MAXIMUM = 60.0
+    DEFAULT_MULTIPLIER = 2.0
+    DEFAULT_RESET_AFTER = 60.0
+
+    def __init__(self, initial:float = DEFAULT_INITIAL, maximum:float = DEFAULT_MAXIMUM, multiplier:float = DEFAULT_MULTIPLIER,
+                 jitter:bool = True, reset_after:float = DEFAULT_RESET_AFTER):
+        """
+        :param initial: delay ceiling in seconds before the first reconnect
+        :param maximum: maximum delay ceiling in seconds
+        :param multiplier: growth of the ceiling per failed attempt
+        :param jitter: if True the delay is a random value between 0 and the ceiling, otherwise the ceiling
+        :param reset_after: seconds a connection must stay up for the attempt count to reset
+        """
+        self.initial = initial
+        self.maximum = maximum
+        self.multiplier = multiplier
+        self.jitter = jitter
+        self.reset_after = reset_after
+
+    def delay(self, attempt:int) -> float:
+        """
+        Seconds to wait before a reconnect
+        :param attempt: number of reconnects already made since the last stable connection
+        :return: float
+        """
+        ceiling = min(self.maximum, self.initial * self.multiplier ** attempt)
+        return random.uniform(0, ceiling) if self.jitter else ceiling
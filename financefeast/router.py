@@ -0,0 +1,212 @@
+import inspect
+import logging
+import threading
+from financefeast.message import MessageFields
+
+"""
+Routing of Stream messages to handlers by ticker, message type or predicate.
+
+Handlers are indexed by ticker and by type, so each message costs a dict lookup per key instead of every handler
+filtering the whole feed. Predicate handlers are the exception and are tested on every message. The index is rebuilt
+on each change and swapped in whole, so handlers can be added and removed while messages are flowing.
+
+    router = Router()
+    router.route(on_air, ticker='air.nz')
+    router.route(on_trade, type='trade')
+    stream.attach(router)
+"""
+
+
+class Router(object):
+    """
+    Routes each message to the handlers registered for its ticker, its type, a matching predicate, or every message.
+    A handler registered under several routes that match one message is called once. Handlers are called like on_data,
+    with the stream object and the data.
+    """
+
+    def __init__(self, logger:logging.Logger = None, ticker_fields:tuple = MessageFields.TICKER):
+        """
+        :param logger: supply your own logger or use the default
+        :param ticker_fields: field names for the ticker
+        """
+        self._logger = logger or logging.getLogger('ff_router')
+        self._ticker_fields = ticker_fields
+        self._lock = threading.Lock()
+        self._routes = []
+        # (by_ticker, by_type, predicates, everything), replaced in a single assignment
+        self._index = ({}, {}, (), ())
+
+    def __call__(self, stream, data):
+        pending = []
+        for handler in self.handlers_for(data):
+            try:
+                result = handler(stream, data)
+                if inspect.isawaitable(result):
+                    pending.append((handler, result))
+            except Exception as e:
+                self._logger.error(f"error from handler {handler}: {e}")
+
+        # coroutine handlers on AsyncStream, which awaits the returned coroutine
+        if pending:
+            return self._await_all(pending)
+
+    async def _await_all(self, pending:list):
+        for handler, result in pending:
+            try:
+                await result
+            except Exception as e:
+                self._logger.error(f"error from handler {handler}: {e}")
+
+    def route(self, handler, ticker = None, type:str = None, predicate = None):
+        """
+        Register a handler. With no ticker, type or predicate the handler receives every message. Can be used as a decorator
+        through router.ticker(), router.type() and router.where().
+        :param handler: callable receiving (stream, data)
+        :param ticker: ticker or list of tickers
+        :param type: message type or list of types, matched against the message `type` field
+        :param predicate: function receiving the data and returning True for messages to route to the handler
+        :return: the handler
+        """
+        tickers = _as_tuple(ticker)
+        types = _as_tuple(type)
+
+        with self._lock:
+            if tickers:
+                self._routes.extend(('ticker', t.lower() if isinstance(t, str) else t, handler) for t in tickers)
+            if types:
+                self._routes.extend(('type', t, handler) for t in types)
+            if predicate is not None:
+                self._routes.append(('predicate', predicate, handler))
+            if not tickers and not types and predicate is None:
+                self._routes.append(('all', None, handler))
+            self._rebuild()
+
+        return handler
+
+    def unroute(self, handler, ticker = None, type:str = None):
+        """
+        Remove a handler from the given tickers or types, or from every route if none are given
+        :param handler: handler passed to route()
+        :param ticker: ticker or list of tickers
+        :param type: message type or list of types
+        :return:
+        """
+        tickers = {t.lower() if isinstance(t, str) else t for t in _as_tuple(ticker)}
+        types = set(_as_tuple(type))
+
+        def keep(route):
+            kind, key, registered = route
+            if registered is not handler:
+                return True
+            if not tickers and not types:
+                return False
+            return not ((kind == 'ticker' and key in tickers) or (kind == 'type' and key in types))
+
+        with self._lock:
+            self._routes = [route for route in self._routes if keep(route)]
+            self._rebuild()
+
+    def ticker(self, ticker):
+        """
+        Decorator registering a handler for a ticker or list of tickers
+        """
+        return lambda handler: self.route(handler, ticker=ticker)
+
+    def type(self, type):
+        """
+        Decorator registering a handler for a message type or list of types
+        """
+        return lambda handler: self.route(handler, type=type)
+
+    def where(self, predicate):
+        """
+        Decorator registering a handler for messages matching a predicate
+        """
+        return lambda handler: self.route(handler, predicate=predicate)
+
+    def handlers_for(self, data) -> list:
+        """
+        Handlers a message is routed to
+        :param data: decoded message
+        :return: list of handlers
+        """
+        # read the index once, a concurrent route() swaps in a new one rather than changing it
+        by_ticker, by_type, predicates, everything = self._index
+
+        if not isinstance(data, dict):
+            return list(everything)
+
+        handlers = list(everything)
+        if by_type:
+            handlers.extend(_lookup(by_type, data.get('type')))
+        if by_ticker:
+            for ticker in self._tickers(data):
+                handlers.extend(_lookup(by_ticker, ticker))
+        for predicate, handler in predicates:
+            try:
+                if predicate(data):
+                    handlers.append(handler)
+            except Exception as e:
+                self._logger.error(f"error from predicate {predicate}: {e}")
+
+        if len(handlers) > 1:
+            handlers = list(dict.fromkeys(handlers))
+        return handlers
+
+    def _tickers(self, data:dict) -> list:
+        """
+        Tickers of a message, from the message, its data member or each record of a data list
+        """
+        records = data.get('data')
+        records = records if isinstance(records, list) else [records]
+
+        tickers = []
+        for record in records:
+            ticker = None
+            if isinstance(record, dict):
+                ticker = next((record[name] for name in self._ticker_fields if name in record), None)
+            if ticker is None:
+                ticker = next((data[name] for name in self._ticker_fields if name in data), None)
+            if ticker is not None:
+                ticker = ticker.lower() if isinstance(ticker, str) else ticker
+                if ticker not in tickers:
+                    tickers.append(ticker)
+        return tickers
+
+    def _rebuild(self):
+        """
+        Build new indexes from the routes. Requires the lock.
+        """
+        by_ticker, by_type, predicates, everything = {}, {}, [], []
+
+        for kind, key, handler in self._routes:
+            if kind == 'ticker':
+                by_ticker.setdefault(key, []).append(handler)
+            elif kind == 'type':
+                by_type.setdefault(key, []).append(handler)
+            elif kind == 'predicate':
+                predicates.append((key, handler))
+            else:
+                everything.append(handler)
+
+        self._index = ({key: tuple(handlers) for key, handlers in by_ticker.items()},
+                       {key: tuple(handlers) for key, handlers in by_type.items()},
+                       tuple(predicates), tuple(everything))
+
+
+def _lookup(index:dict, key) -> tuple:
+    """
+    Handlers indexed under a message value, none if the value can not be a dict key, eg a list
+    """
+    try:
+        return index.get(key, ())
+    except TypeError:
+        return ()
+
+
+def _as_tuple(value) -> tuple:
+    if value is None:
+        return ()
+    if isinstance(value, (list, tuple, set)):
+        return tuple(value)
+    return (value,)
@@ -1,28 +1,97 @@
 from financefeast.common import EnvironmentsStream
+from financefeast.chunking import DATETIME_FORMAT, parse_timestamp, record_key
+from financefeast.codec import JSONCodec, default_codec
+from financefeast.conflate import Conflator
+from financefeast.dispatch import Dispatcher, BLOCK, DROP_NEWEST
+from financefeast.metrics import StreamMetrics
+from financefeast.recorder import Recorder
+from financefeast.retry import ReconnectPolicy
+from collections import deque
+from datetime import datetime, timezone, tzinfo
 from websocket import (
     create_connection, WebSocketException, WebSocketConnectionClosedException, WebSocketBadStatusException, WebSocketApp, enableTrace
 )
 import logging
+import threading
 import time
 import json
 
 class Stream(object):
     DEFAULT_LOG_LEVEL = logging.INFO
     DEFAULT_SOCKET_HEADER = None
+    SUBSCRIBE_BATCH = 500
+    DEFAULT_MAX_HELD = 10000
+    DEFAULT_BACKFILL_TIMEOUT = 30.0
 
-    def __init__(self, token:str, on_data=None, logger:logging.Logger = None, environment:EnvironmentsStream=EnvironmentsStream.prod):
+    def __init__(self, token:str, on_data=None, logger:logging.Logger = None, environment:EnvironmentsStream=EnvironmentsStream.prod,
+                 codec:JSONCodec = None, raw:bool = False, dispatcher:Dispatcher = None, reconnect:ReconnectPolicy = None,
+                 backfill = None, backfill_interval:str = '1m', backfill_exchange:str = 'nzx', conflate:bool = False,
+                 recorder:Recorder = None, metrics:StreamMetrics = None, max_held:int = DEFAULT_MAX_HELD,
+                 backfill_timeout:float = DEFAULT_BACKFILL_TIMEOUT, backfill_timezone:tzinfo = timezone.utc):
         """
         Stream class for Financefeast Streaming data
         :param token: API authentication token
         :param on_data: callback object that is called when streamed data is received. 1st arg is this class object, 2nd is the data payload in json format
         :param logger: supply your own logger or use the default
         :param environment: supply an optional Financefeast Environment ENUM object
+        :param codec: JSON codec used to decode and encode messages. Defaults to the fastest installed library
+        :param raw: if True on_data receives the undecoded message, so it can decode only the messages it needs with stream.codec.
+        A Conflator or multi worker Dispatcher still decodes each message to find its ticker
+        :param dispatcher: optional Dispatcher or Conflator to call on_data and attached handlers from worker threads, so
+        slow callbacks do not stall reading from the socket
+        :param reconnect: ReconnectPolicy for the delay between reconnect attempts, defaults to exponential backoff with jitter
+        :param backfill: optional Rest client. After a reconnect the data missed by each subscribed ticker is fetched with
+        intraday, or last if there are no bars, and delivered in order with "backfilled": true before live messages resume
+        :param backfill_interval: intraday interval used for backfill
+        :param backfill_exchange: exchange passed to the backfill requests
+        :param conflate: if True and no dispatcher is given, use a Conflator so on_data only receives the newest
+        undelivered message per ticker
+        :param recorder: optional Recorder that every received message is written to, for replay with recorder.Replayer
+        :param metrics: optional StreamMetrics, or True for a default one, to measure throughput, decode and callback
+        time, exchange to receive latency and reconnects. See metrics.StreamMetrics
+        :param max_held: maximum number of live messages held during backfill. When it is reached the overflow policy of
+        the dispatcher applies, BLOCK (the default without a dispatcher) pauses reading until the backfill finishes
+        :param backfill_timeout: seconds after which live messages stop being held if the backfill data has not been
+        fetched yet, that backfill is then discarded. None to hold until it finishes
+        :param backfill_timezone: time zone of the datetime_from and datetime_to sent with backfill requests, and of
+        backfilled record timestamps without an offset. Defaults to UTC
         """
         self._token = token
         self._logger = logger
         self._environment = environment
         self._websocket = None
         self._on_data = on_data
+        self._codec = codec or default_codec()
+        self._raw = raw
+        self._handlers = []
+        self._connections = 0
+        self._dispatcher = dispatcher if dispatcher is not None or not conflate else Conflator()
+        if raw and self._dispatcher is not None and getattr(self._dispatcher, 'decode', False) is None:
+            # conflation and worker routing key on the ticker, which needs the decoded message
+            self._dispatcher.decode = self._handler_data
+        self._subscriptions = {}
+        self._subscription_lock = threading.Lock()
+        self._connected = False
+        self._reconnect = reconnect or ReconnectPolicy()
+        self._backfill = backfill
+        self._backfill_interval = backfill_interval
+        self._backfill_exchange = backfill_exchange
+        self._backfill_timezone = backfill_timezone
+        self._backfill_generation = 0
+        self._backfilling = False
+        self._max_held = max_held
+        self._backfill_timeout = backfill_timeout
+        self._held = deque()
+        self._held_dropped = 0
+        self._hold_deadline = None
+        self._hold_lock = threading.Lock()
+        self._hold_changed = threading.Condition(self._hold_lock)
+        self._last_received = None
+        self._opened_at = None
+        self._recorder = recorder
+        self._metrics = StreamMetrics() if metrics is True else metrics or None
+        if self._metrics is not None:
+            self._metrics.bind(self)
 
         if not logger:
             self._logger = logging.getLogger('ff_stream')
@@ -36,6 +105,29 @@ class Stream(object):
         if not self._on_data:
             self._logger.info("Supply an on_data callback object when instantiating the Stream class. Check readme for more info. Received data will be sent to log")
 
+    @property
+    def codec(self) -> JSONCodec:
+        return self._codec
+
+    @property
+    def dispatcher(self):
+        return self._dispatcher
+
+    @property
+    def metrics(self) -> StreamMetrics:
+        return self._metrics
+
+    @property
+    def ping_rtt(self):
+        """
+        Round trip time of the last answered websocket ping in seconds, or None
+        """
+        websocket = self._websocket
+        ping, pong = getattr(websocket, 'last_ping_tm', 0), getattr(websocket, 'last_pong_tm', 0)
+        if ping and pong and pong >= ping:
+            return pong - ping
+        return None
+
     def connect(self):
         """
         Creates initial websocket connection
@@ -51,6 +143,59 @@ class Stream(object):
         """
         self._send(message)
 
+    @property
+    def subscriptions(self) -> list:
+        """
+        Tickers currently subscribed to, replayed after each reconnect
+        """
+        with self._subscription_lock:
+            return list(self._subscriptions)
+
+    def subscribe(self, tickers:list):
+        """
+        Subscribe to tickers. Tickers are sent in batches of up to SUBSCRIBE_BATCH per message and remembered, so they are
+        subscribed again after a reconnect. If the stream is not connected yet they are sent once it is.
+        :param tickers: ticker or list of tickers
+        :return: list of tickers that were not already subscribed
+        """
+        added = self._add_subscriptions(tickers)
+        if self._connected:
+            for frame in self._subscription_frames('subscribe', added):
+                self._send(frame)
+        return added
+
+    def unsubscribe(self, tickers:list):
+        """
+        Unsubscribe from tickers
+        :param tickers: ticker or list of tickers
+        :return: list of tickers that were subscribed
+        """
+        removed = self._remove_subscriptions(tickers)
+        if self._connected:
+            for frame in self._subscription_frames('unsubscribe', removed):
+                self._send(frame)
+        return removed
+
+    def attach(self, handler):
+        """
+        Attach a handler that receives every decoded message after on_data, eg an indicators.IndicatorSet.
+        Handlers are called like on_data, with this stream object and the data. If the handler has an on_reconnect
+        method it is called with this stream object after the connection is re-established.
+        :param handler: callable
+        :return: the handler
+        """
+        self._handlers.append(handler)
+        return handler
+
+    def detach(self, handler):
+        """
+        Remove a handler added with attach
+        :param handler: callable
+        :return:
+        """
+        if handler in self._handlers:
+            self._handlers.remove(handler)
+
     def _callback(self, callback, *args):
         """
         Callback object. If supplied data will be pushed there, otherwise we just log out to the logger.
@@ -81,7 +226,9 @@ class Stream(object):
         Creates actual socket connection
         :return:
         """
+        attempt = 0
         while True:
+            self._opened_at = None
             try:
                 enableTrace(False)
                 self._websocket = WebSocketApp(self._environment.value,
@@ -93,8 +240,20 @@ class Stream(object):
                 self._websocket.run_forever(skip_utf8_validation=True,ping_interval=10,ping_timeout=8)
             except Exception as e:
                 self._logger.exception("Websocket connection Error  : {0}".format(e))
-            self._logger.info("Reconnecting websocket after 5 sec")
-            time.sleep(5)
+
+            attempt = self._next_attempt(attempt)
+            delay = self._reconnect.delay(attempt - 1)
+            self._logger.info(f"Reconnecting websocket after {delay:.1f} sec")
+            time.sleep(delay)
+
+    def _next_attempt(self, attempt:int) -> int:
+        """
+        Count a reconnect attempt, starting again after a connection that stayed up
+        :return: int
+        """
+        if self._opened_at is not None and time.monotonic() - self._opened_at >= self._reconnect.reset_after:
+            return 1
+        return attempt + 1
 
     def _on_open(self, wsapp):
         """
@@ -103,11 +262,241 @@ class Stream(object):
         :return:
         """
         self._logger.info(f"Attempting to authorise to the Stream server")
-        self._send({"type": "authenticate",
-                    "data": {
-                        "token": self._token
-                    }})
+        self._send(self._authentication())
+        self._connected = True
+
+        for frame in self._subscription_frames('subscribe', self.subscriptions):
+            self._send(frame)
+
+        for on_reconnect in self._opened():
+            self._callback(on_reconnect)
+
+        window = self._start_backfill()
+        if window:
+            threading.Thread(target=self._run_backfill, args=window, name='ff_backfill', daemon=True).start()
+
+    def _authentication(self) -> dict:
+        """
+        Authentication message sent when the socket opens
+        :return:
+        """
+        return {"type": "authenticate",
+                "data": {
+                    "token": self._token
+                }}
+
+    def _subscription_frames(self, message_type:str, tickers:list) -> list:
+        """
+        Split tickers into as few subscribe or unsubscribe messages as SUBSCRIBE_BATCH allows
+        :return: list of messages
+        """
+        return [{"type": message_type,
+                 "data": {
+                     "tickers": tickers[i:i + self.SUBSCRIBE_BATCH]
+                 }} for i in range(0, len(tickers), self.SUBSCRIBE_BATCH)]
+
+    def _add_subscriptions(self, tickers) -> list:
+        tickers = [tickers] if isinstance(tickers, str) else tickers
+        with self._subscription_lock:
+            added = [ticker for ticker in dict.fromkeys(t.lower() for t in tickers) if ticker not in self._subscriptions]
+            self._subscriptions.update(dict.fromkeys(added))
+        return added
+
+    def _remove_subscriptions(self, tickers) -> list:
+        tickers = [tickers] if isinstance(tickers, str) else tickers
+        with self._subscription_lock:
+            removed = [ticker for ticker in dict.fromkeys(t.lower() for t in tickers) if ticker in self._subscriptions]
+            for ticker in removed:
+                del self._subscriptions[ticker]
+        return removed
+
+    def _opened(self) -> list:
+        """
+        Count a new connection
+        :return: on_reconnect methods of attached handlers to call if this is a reconnect
+        """
+        self._connections += 1
+        self._opened_at = time.monotonic()
+        if self._metrics is not None:
+            self._metrics.connected()
+        if self._connections == 1:
+            return []
+
+        """
+        Messages may have been missed while disconnected, let handlers that keep state catch up
+        """
+        return [handler.on_reconnect for handler in list(self._handlers) if getattr(handler, 'on_reconnect', None)]
+
+    def _start_backfill(self):
+        """
+        Hold live messages while the data missed during an outage is fetched. Called when a connection opens,
+        before any message is read from it.
+        :return: (tickers, since, until, generation) to backfill, or None. since and until are naive datetimes in the
+        backfill time zone
+        """
+        if self._backfill is None or self._connections < 2 or self._last_received is None:
+            return None
+
+        tickers = self.subscriptions
+        if not tickers:
+            return None
+
+        with self._hold_lock:
+            self._backfilling = True
+            self._backfill_generation += 1
+            self._held_dropped = 0
+            self._hold_deadline = time.monotonic() + self._backfill_timeout if self._backfill_timeout is not None else None
+            generation = self._backfill_generation
+
+        since = datetime.fromtimestamp(self._last_received, self._backfill_timezone).replace(tzinfo=None, microsecond=0)
+        until = datetime.now(self._backfill_timezone).replace(tzinfo=None)
+        return tickers, since, until, generation
+
+    def _fetch_backfill(self, tickers:list, since:datetime, until:datetime) -> dict:
+        """
+        Fetch intraday bars for the outage window, or the last record where there are none
+        :return: dict of ticker to list of backfill messages
+        """
+        results = {}
+        for result in self._backfill.intraday_many(tickers, datetime_from=since.strftime(DATETIME_FORMAT),
+                                                   datetime_to=until.strftime(DATETIME_FORMAT),
+                                                   exchange=self._backfill_exchange, interval=self._backfill_interval):
+            if result.ok:
+                results[result.ticker] = self._backfill_messages(result.ticker, result.response, since, self._backfill_timezone)
+
+        for ticker in tickers:
+            if not results.get(ticker):
+                try:
+                    results[ticker] = self._backfill_messages(ticker, self._backfill.last(ticker, exchange=self._backfill_exchange),
+                                                              since, self._backfill_timezone)
+                except Exception as e:
+                    self._logger.warning(f"Backfill of {ticker} failed: {e!r}")
+
+        return results
+
+    @staticmethod
+    def _backfill_messages(ticker:str, response, since:datetime, tz:tzinfo = timezone.utc) -> list:
+        """
+        Wrap the records of a Rest response as backfilled stream messages, oldest first, skipping records before since
+        :param since: naive datetime in the time zone tz
+        :param tz: time zone record timestamps with an offset are converted to before comparing them with since
+        :return: list of messages
+        """
+        if response is None:
+            return []
+
+        records = response.data
+        records = [records] if isinstance(records, dict) else list(records or [])
+
+        timed = []
+        for record in records:
+            timestamp = parse_timestamp(record_key(record), tz=tz) if isinstance(record, dict) else None
+            if timestamp is None or timestamp >= since:
+                timed.append((timestamp or since, record))
+        timed.sort(key=lambda item: item[0])
 
+        return [{"type": "backfill", "ticker": ticker, "backfilled": True, "data": record} for _, record in timed]
+
+    def _run_backfill(self, tickers:list, since:datetime, until:datetime, generation:int):
+        """
+        Deliver backfilled data then the live messages held meanwhile
+        :return:
+        """
+        self._logger.info(f"Backfilling {len(tickers)} tickers from {since:%Y-%m-%d %H:%M:%S}")
+        try:
+            results = self._fetch_backfill(tickers, since, until)
+            if self._claim_delivery(generation):
+                for ticker in tickers:
+                    for message in results.get(ticker, []):
+                        self._deliver(self._backfill_data(message))
+        except Exception as e:
+            self._logger.error(f"Backfill failed: {e!r}")
+        finally:
+            self._release_held(generation)
+
+    def _claim_delivery(self, generation:int) -> bool:
+        """
+        Make the backfill the only deliverer until the held messages are released, so backfill_timeout no longer applies
+        :return: False if the hold has already timed out, or a newer backfill started, and this backfill is discarded
+        """
+        with self._hold_lock:
+            if not self._backfilling or generation != self._backfill_generation:
+                self._logger.warning(f"Backfill finished after live messages were released, discarding it")
+                return False
+            self._hold_deadline = None
+            return True
+
+    def _backfill_data(self, message:dict):
+        """
+        Backfill messages are passed to on_data encoded in raw mode, like live messages
+        """
+        return self._codec.dumps(message) if self._raw else message
+
+    def _release_held(self, generation:int):
+        """
+        Deliver the live messages received during backfill, then deliver live messages directly again
+        :return:
+        """
+        with self._hold_lock:
+            if not self._backfilling or generation != self._backfill_generation:
+                return
+            # the held messages are delivered now, so the timeout no longer applies
+            self._hold_deadline = None
+
+        while True:
+            with self._hold_lock:
+                held, self._held = self._held, deque()
+                self._hold_changed.notify_all()
+                if not held:
+                    self._end_hold()
+                    return
+            for data in held:
+                self._deliver(data)
+
+    def _hold(self, data):
+        """
+        Hold a live message received during backfill. Requires the hold lock.
+        :return: list of messages to deliver now, empty if data was held or dropped, or None if the held messages are
+        at max_held and the overflow policy is BLOCK, in which case wait for them to be released and try again
+        """
+        if not self._backfilling:
+            return [data]
+
+        if self._hold_deadline is not None and time.monotonic() >= self._hold_deadline:
+            # the backfill has not started delivering, _claim_delivery makes it discard its data
+            self._logger.warning(f"Backfill did not finish within {self._backfill_timeout}s, releasing {len(self._held)} "
+                                 f"held messages")
+            held, self._held = list(self._held), deque()
+            self._end_hold()
+            return held + [data]
+
+        if len(self._held) >= self._max_held:
+            overflow = getattr(self._dispatcher, 'overflow', BLOCK)
+            if overflow == BLOCK:
+                return None
+            self._held_dropped += 1
+            if overflow == DROP_NEWEST:
+                return []
+            self._held.popleft()
+
+        self._held.append(data)
+        return []
+
+    def _hold_remaining(self):
+        """
+        :return: seconds until held messages are released regardless of the backfill, or None
+        """
+        return None if self._hold_deadline is None else max(0.0, self._hold_deadline - time.monotonic())
+
+    def _end_hold(self):
+        """
+        Deliver live messages directly again. Requires the hold lock.
+        """
+        self._backfilling = False
+        self._hold_deadline = None
+        if self._held_dropped:
+            self._logger.warning(f"Dropped {self._held_dropped} live messages held during backfill")
+            self._held_dropped = 0
 
     def _on_error(self, wsapp, err):
         """
@@ -121,6 +510,9 @@ class Stream(object):
         Handle socket close
         :return:
         """
+        self._connected = False
+        if self._metrics is not None:
+            self._metrics.disconnected()
         if close_status_code and close_msg:
             self._logger.info(f"{close_msg} : {close_status_code}")
 
@@ -131,18 +523,95 @@ class Stream(object):
         """
 
         #self._logger.info(f"Received message {message}")
-        if isinstance(message, str):
+        if self._recorder is not None:
+            self._recorder.write(message)
+
+        self._receive(message)
+
+    def _receive(self, message):
+        """
+        Decode a received or replayed message and hold or deliver it
+        :return:
+        """
+        self._last_received = time.time()
+        if self._metrics is None:
+            data = self._decode(message)
+        else:
+            started = time.perf_counter()
+            data = self._decode(message)
+            self._metrics.received(message, data, time.perf_counter() - started, self._last_received)
+
+        if self._backfilling:
+            with self._hold_lock:
+                deliver = self._hold(data)
+                while deliver is None:
+                    self._hold_changed.wait(self._hold_remaining())
+                    deliver = self._hold(data)
+            for data in deliver:
+                self._deliver(data)
+            return
+
+        self._deliver(data)
+
+    def _deliver(self, data):
+        """
+        Dispatch a decoded message on this thread, or queue it for the dispatcher
+        :return:
+        """
+        if self._dispatcher is not None:
+            if not self._dispatcher.running:
+                self._dispatcher.start(self._dispatch)
+            self._dispatcher.submit(data)
+        else:
+            self._dispatch(data)
+
+    def _dispatch(self, data):
+        """
+        Pass a decoded message to on_data and the attached handlers
+        :return:
+        """
+        started = time.perf_counter()
+        self._callback(self._on_data, data)
+
+        if self._handlers:
+            data = self._handler_data(data)
+            for handler in list(self._handlers):
+                self._callback(handler, data)
+
+        if self._metrics is not None:
+            self._metrics.dispatched(time.perf_counter() - started)
+
+    def _decode(self, message):
+        """
+        Decode a received message for on_data
+        :return:
+        """
+        if self._raw:
+            """
+            Pass the message through undecoded
+            """
+            data = message
+        elif isinstance(message, (str, bytes)):
             """
             Convert str to json
             """
-            data = json.loads(message)
+            data = self._codec.loads(message)
         else:
             """
             Assume already json
             """
             data = message
 
-        self._callback(self._on_data, data)
+        return data
+
+    def _handler_data(self, data):
+        """
+        Attached handlers always receive decoded messages
+        :return:
+        """
+        if self._raw and isinstance(data, (str, bytes)):
+            return self._codec.loads(data)
+        return data
 
 
     def _send(self, data):
@@ -151,7 +620,7 @@ class Stream(object):
         :param data:
         :return:
         """
-        data = json.dumps(data)
+        data = self._codec.dumps(data)
         if self._websocket:
             self._websocket.send(data)
 
@@ -0,0 +1,277 @@
+try:
+    import numpy as np
+except ImportError:
+    raise ImportError("financefeast.ta requires numpy. Install it with `pip install financefeast[numpy]`")
+
+from financefeast.columnar import Columns
+from financefeast.entity import Response
+
+"""
+Local technical analysis.
+
+Vectorized versions of the ta/* endpoints computed from bar data you already hold, with the same default windows as the
+Rest methods. Every function takes numpy arrays, or anything numpy.asarray accepts, with time along the first axis.
+Pass 2-D arrays, one column per ticker or parameter set, to compute many series in one call.
+
+Moving averages follow the usual conventions: values are NaN until a full window is available, exponential averages
+are not bias adjusted and start from the first value, RSI and ADX use Wilder smoothing, standard deviation is the
+population standard deviation. Use compare() to check results against the server endpoints.
+
+    bars = ta.bars(client.intraday('air.nz', datetime_from='2021-08-01', datetime_to='2021-08-05'))
+    values = ta.rsi(bars['close'], window=14)
+"""
+
+_EWM_BLOCK = 256
+
+
+def bars(data) -> dict:
+    """
+    Numpy arrays of the numeric columns of a response
+    :param data: Response, Columns or dict of arrays
+    :return: dict of column name to numpy.ndarray
+    """
+    if isinstance(data, Response):
+        data = data.columns()
+    if isinstance(data, Columns):
+        return data.to_numpy()
+    return {name: np.asarray(values) for name, values in data.items()}
+
+
+def _as_array(values) -> np.ndarray:
+    return np.asarray(values, dtype=np.float64)
+
+
+def _windows(window) -> list:
+    return list(window) if isinstance(window, (list, tuple)) else [window]
+
+
+def _rolling(x:np.ndarray, window:int, func) -> np.ndarray:
+    """
+    Apply a reduction over a rolling window along the time axis, NaN until a full window is available
+    """
+    out = np.full(x.shape, np.nan)
+    if window <= 0 or len(x) < window:
+        return out
+    view = np.lib.stride_tricks.sliding_window_view(x, window, axis=0)
+    out[window - 1:] = func(view, axis=-1)
+    return out
+
+
+def _ewm(x:np.ndarray, alpha:float, min_periods:int = 1) -> np.ndarray:
+    """
+    Exponentially weighted mean y[t] = alpha * x[t] + (1 - alpha) * y[t - 1], starting from the first value that is not
+    NaN. NaN values are skipped and repeat the previous mean, like pandas ewm(adjust=False, ignore_na=True), and
+    min_periods counts values that are not NaN.
+    The recursion is evaluated block by block as a matrix product so the work is vectorized. Blocks holding a NaN, where
+    the zero weights of the product would still pick it up, are evaluated step by step instead.
+    """
+    out = np.empty(x.shape)
+    n = len(x)
+    if n == 0:
+        return out
+
+    decay = 1.0 - alpha
+    k = np.arange(_EWM_BLOCK)
+    lags = k[:, None] - k[None, :]
+    weights = np.where(lags >= 0, alpha * decay ** np.maximum(lags, 0), 0.0)
+    carry = (decay ** (k + 1)).reshape((-1,) + (1,) * (x.ndim - 1))
+
+    missing = np.isnan(x)
+    # seeding with the first value makes the first update return it unchanged
+    previous = np.take_along_axis(x, np.expand_dims(np.argmax(~missing, axis=0), 0), axis=0)[0]
+    started = np.zeros(x.shape[1:], dtype=bool)
+
+    for start in range(0, n, _EWM_BLOCK):
+        block = x[start:start + _EWM_BLOCK]
+        size = len(block)
+        if not missing[start:start + size].any():
+            y = weights[:size, :size] @ block + carry[:size] * previous
+            out[start:start + size] = y
+            previous = y[-1]
+            started |= True
+            continue
+
+        for i in range(size):
+            valid = ~missing[start + i]
+            started |= valid
+            previous = np.where(valid, alpha * block[i] + decay * previous, previous)
+            out[start + i] = np.where(started, previous, np.nan)
+
+    out[np.cumsum(~missing, axis=0) < min_periods] = np.nan
+    return out
+
+
+def _diff(x:np.ndarray) -> np.ndarray:
+    out = np.full(x.shape, np.nan)
+    out[1:] = x[1:] - x[:-1]
+    return out
+
+
+def sma(close, window:list = [30]) -> dict:
+    """
+    Simple moving average, see Rest.sma
+    :param close: close prices
+    :param window: a list of moving average windows to calculate, default is [30]
+    :return: dict of sma_<window> to numpy.ndarray
+    """
+    close = _as_array(close)
+    result = {}
+    for w in _windows(window):
+        out = np.full(close.shape, np.nan)
+        if 0 < w <= len(close):
+            cumsum = np.cumsum(np.concatenate([np.zeros((1,) + close.shape[1:]), close]), axis=0)
+            out[w - 1:] = (cumsum[w:] - cumsum[:-w]) / w
+        result[f'sma_{w}'] = out
+    return result
+
+
+def ema(close, window:list = [30]) -> dict:
+    """
+    Exponential moving average, see Rest.ema
+    :param close: close prices
+    :param window: a list of moving average windows to calculate, default is [30]
+    :return: dict of ema_<window> to numpy.ndarray
+    """
+    close = _as_array(close)
+    return {f'ema_{w}': _ewm(close, 2.0 / (w + 1), min_periods=w) for w in _windows(window)}
+
+
+def macd(close, window_fast:int = 12, window_slow:int = 26, window_sign:int = 9) -> dict:
+    """
+    Moving average convergence divergence, see Rest.macd
+    :param close: close prices
+    :param window_fast: fast ema window
+    :param window_slow: slow ema window
+    :param window_sign: signal line ema window
+    :return: dict with macd, macd_signal and macd_diff
+    """
+    close = _as_array(close)
+    line = _ewm(close, 2.0 / (window_fast + 1), min_periods=window_fast) - _ewm(close, 2.0 / (window_slow + 1), min_periods=window_slow)
+
+    signal = np.full(close.shape, np.nan)
+    start = window_slow - 1
+    if len(close) > start:
+        signal[start:] = _ewm(line[start:], 2.0 / (window_sign + 1), min_periods=window_sign)
+
+    return {'macd': line, 'macd_signal': signal, 'macd_diff': line - signal}
+
+
+def rsi(close, window:int = 14) -> dict:
+    """
+    Relative strength index with Wilder smoothing, see Rest.rsi
+    :param close: close prices
+    :param window: look-back window, default is 14
+    :return: dict with rsi
+    """
+    close = _as_array(close)
+    change = np.nan_to_num(_diff(close), nan=0.0)
+    up = _ewm(np.where(change > 0, change, 0.0), 1.0 / window, min_periods=window)
+    down = _ewm(np.where(change < 0, -change, 0.0), 1.0 / window, min_periods=window)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        out = np.where(down == 0, 100.0, 100.0 - 100.0 / (1.0 + up / down))
+    out[np.isnan(up)] = np.nan
+    return {'rsi': out}
+
+
+def adx(high, low, close, window:int = 5, window_adx:int = 15) -> dict:
+    """
+    Average directional index, see Rest.adx
+    :param high: high prices
+    :param low: low prices
+    :param close: close prices
+    :param window: Wilder smoothing window for the directional indicators, default is 5
+    :param window_adx: Wilder smoothing window for the adx, default is 15
+    :return: dict with adx, adx_pos (+DI) and adx_neg (-DI)
+    """
+    high, low, close = _as_array(high), _as_array(low), _as_array(close)
+    shape = close.shape
+    result = {name: np.full(shape, np.nan) for name in ('adx', 'adx_pos', 'adx_neg')}
+    if len(close) < 2:
+        return result
+
+    up = high[1:] - high[:-1]
+    down = low[:-1] - low[1:]
+    plus_dm = np.where((up > down) & (up > 0), up, 0.0)
+    minus_dm = np.where((down > up) & (down > 0), down, 0.0)
+    true_range = np.maximum(high[1:], close[:-1]) - np.minimum(low[1:], close[:-1])
+
+    atr = _ewm(true_range, 1.0 / window, min_periods=window)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        plus_di = 100.0 * _ewm(plus_dm, 1.0 / window, min_periods=window) / atr
+        minus_di = 100.0 * _ewm(minus_dm, 1.0 / window, min_periods=window) / atr
+        dx = 100.0 * np.abs(plus_di - minus_di) / (plus_di + minus_di)
+    dx = np.nan_to_num(dx, nan=0.0)
+
+    start = window - 1
+    if len(dx) > start:
+        result['adx'][1 + start:] = _ewm(dx[start:], 1.0 / window_adx, min_periods=window_adx)
+    result['adx_pos'][1:] = plus_di
+    result['adx_neg'][1:] = minus_di
+    return result
+
+
+def bollinger(close, window:int = 20, window_dev:float = 2) -> dict:
+    """
+    Bollinger bands, see Rest.bollinger
+    :param close: close prices
+    :param window: look-back window, default is 20
+    :param window_dev: number of standard deviations for the bands
+    :return: dict with bollinger_mavg, bollinger_hband and bollinger_lband
+    """
+    close = _as_array(close)
+    mavg = _rolling(close, window, np.mean)
+    std = _rolling(close, window, np.std)
+    return {
+        'bollinger_mavg': mavg,
+        'bollinger_hband': mavg + window_dev * std,
+        'bollinger_lband': mavg - window_dev * std,
+    }
+
+
+def stochastic(high, low, close, window:int = 14, window_sma:int = 3) -> dict:
+    """
+    Stochastic oscillator, see Rest.stochastic
+    :param high: high prices
+    :param low: low prices
+    :param close: close prices
+    :param window: look-back window, default is 14
+    :param window_sma: signal line sma window, default is 3
+    :return: dict with stoch (%K) and stoch_signal (%D)
+    """
+    high, low, close = _as_array(high), _as_array(low), _as_array(close)
+    highest = _rolling(high, window, np.max)
+    lowest = _rolling(low, window, np.min)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        k = 100.0 * (close - lowest) / (highest - lowest)
+
+    signal = np.full(close.shape, np.nan)
+    start = window - 1
+    if len(close) > start:
+        signal[start:] = _rolling(k[start:], window_sma, np.mean)
+
+    return {'stoch': k, 'stoch_signal': signal}
+
+
+def compare(local:dict, response, fields:dict = None) -> dict:
+    """
+    Compare locally computed indicators with the response of the matching ta/* endpoint
+    :param local: dict returned by one of the indicator functions
+    :param response: Response from the Rest endpoint for the same bars and parameters
+    :param fields: optional dict of local name to server field name, where they differ
+    :return: dict of indicator name to the largest absolute difference, NaN if the server did not return the field
+    """
+    remote = bars(response)
+    fields = fields or {}
+    result = {}
+
+    for name, values in local.items():
+        other = remote.get(fields.get(name, name))
+        if other is None or len(other) != len(values):
+            result[name] = np.nan
+            continue
+        both = ~np.isnan(values) & ~np.isnan(other)
+        result[name] = float(np.max(np.abs(values[both] - other[both]))) if both.any() else np.nan
+
+    return result
@@ -0,0 +1,78 @@
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+
+"""
+HTTP transports used by the Rest client.
+
+A transport owns the connection pool. Rest calls go through the transport so connections are kept alive and
+re-used between endpoint calls instead of paying a new TCP and TLS handshake on every request.
+"""
+
+
+class Transport(object):
+    """
+    Base transport. Subclass this and implement `get` to point Rest at a different HTTP backend.
+    `get` must accept the same keyword arguments as `requests.get` and return a `requests.Response` like object.
+    """
+
+    def get(self, url:str, **kwargs):
+        raise NotImplementedError
+
+    def close(self):
+        """
+        Release any pooled connections
+        :return:
+        """
+        pass
+
+
+class SessionTransport(Transport):
+    """
+    Transport backed by a `requests.Session` with a pooled keep-alive `HTTPAdapter` mounted for http and https.
+    The underlying urllib3 pool is thread safe, so a single instance can be shared between threads and Rest clients.
+    """
+    DEFAULT_POOL_CONNECTIONS = 10
+    DEFAULT_POOL_MAXSIZE = 10
+
+    def __init__(self, pool_connections:int = DEFAULT_POOL_CONNECTIONS, pool_maxsize:int = DEFAULT_POOL_MAXSIZE,
+                 pool_block:bool = False, session:requests.Session = None):
+        """
+        :param pool_connections: number of hosts to keep connection pools for
+        :param pool_maxsize: maximum number of keep-alive connections kept per host
+        :param pool_block: if True, block when all connections to a host are in use instead of opening a new one
+        :param session: supply your own requests.Session, the pooled adapter is mounted onto it
+        """
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.session = session or requests.Session()
+
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, pool_block=pool_block)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update({'Connection': 'keep-alive'})
+
+    def get(self, url:str, **kwargs):
+        return self.session.get(url, **kwargs)
+
+    def close(self):
+        self.session.close()
+
+
+_default_transport = None
+_default_transport_lock = threading.Lock()
+
+
+def default_transport() -> Transport:
+    """
+    Returns the process wide shared transport, creating it on first use
+    :return: SessionTransport
+    """
+    global _default_transport
+
+    if _default_transport is None:
+        with _default_transport_lock:
+            if _default_transport is None:
+                _default_transport = SessionTransport()
+
+    return _default_transport
@@ -27,6 +27,7 @@ setup(
     license='MIT',
     install_requires=['requests','websocket-client'],
     setup_requires=['requests','websocket-client'],
+    extras_require={'async': ['aiohttp'], 'numpy': ['numpy'], 'pandas': ['pandas'], 'fast': ['orjson']},
     tests_require=['pytest==4.4.1'],
     test_suite='tests',
     python_requires='>=3.6',
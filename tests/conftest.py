@@ -0,0 +1,106 @@
+import json
+from datetime import timedelta
+from financefeast.transport import Transport
+
+
+class FakeResponse(object):
+    """
+    Minimal requests.Response stand in
+    """
+
+    def __init__(self, status_code:int = 200, payload = None, headers:dict = None):
+        self.status_code = status_code
+        self.content = payload if isinstance(payload, bytes) else json.dumps(payload if payload is not None else {}).encode('utf-8')
+        self.headers = headers or {}
+        self.elapsed = timedelta(milliseconds=1)
+
+    @property
+    def text(self):
+        return self.content.decode('utf-8')
+
+    def json(self):
+        return json.loads(self.content)
+
+    def iter_content(self, chunk_size:int = 1):
+        for i in range(0, len(self.content), chunk_size):
+            yield self.content[i:i + chunk_size]
+
+    def raise_for_status(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class FakeTransport(Transport):
+    """
+    Transport that answers from a handler function instead of the network and records each call
+    """
+
+    def __init__(self, handler):
+        """
+        :param handler: function called with (url, params) returning a FakeResponse, or a payload for a 200 response
+        """
+        self.handler = handler
+        self.calls = []
+
+    def get(self, url:str, params:dict = None, **kwargs):
+        self.calls.append((url, dict(params or {})))
+        response = self.handler(url, params or {})
+        return response if isinstance(response, FakeResponse) else FakeResponse(200, response)
+
+
+class FakeAioResponse(object):
+    """
+    Minimal aiohttp.ClientResponse stand in, wrapping a FakeResponse
+    """
+
+    def __init__(self, response:FakeResponse):
+        self.status = response.status_code
+        self.headers = response.headers
+        self.content = self
+        self._body = response.content
+
+    async def read(self):
+        return self._body
+
+    async def iter_chunked(self, size:int):
+        for i in range(0, len(self._body), size):
+            yield self._body[i:i + size]
+
+    def raise_for_status(self):
+        pass
+
+    def release(self):
+        pass
+
+
+class FakeSession(object):
+    """
+    aiohttp.ClientSession stand in for AsyncRest, answering from a handler like FakeTransport
+    """
+
+    def __init__(self, handler):
+        """
+        :param handler: function called with (url, params) returning a FakeResponse, or a payload for a 200 response
+        """
+        self.handler = handler
+        self.calls = []
+        self.headers = []
+        self.closed = False
+
+    async def get(self, url:str, params:list = None, headers:dict = None, **kwargs):
+        query = {}
+        for key, value in params or []:
+            if key in query:
+                # repeated keys, as sent for list parameters
+                query[key] = (query[key] if isinstance(query[key], list) else [query[key]]) + [value]
+            else:
+                query[key] = value
+        self.calls.append((url, query))
+        self.headers.append(dict(headers or {}))
+        response = self.handler(url, query)
+        return FakeAioResponse(response if isinstance(response, FakeResponse) else FakeResponse(200, response))
+
+    async def close(self):
+        self.closed = True
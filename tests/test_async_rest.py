@@ -0,0 +1,107 @@
+import asyncio
+import inspect
+import pytest
+from financefeast.async_rest import AsyncRest
+from financefeast.common import Environments
+from financefeast.exceptions import MissingTicker, NotAuthorised
+from financefeast.rest import Rest
+from financefeast.retry import RetryPolicy
+from tests.conftest import FakeResponse, FakeSession
+
+
+def client(handler, **kwargs):
+    session = FakeSession(handler)
+    kwargs.setdefault('token', 'token')
+    rest = AsyncRest(environment=Environments.local, session=session, retry=RetryPolicy(max_retries=0),
+                     max_chunk_bars=None, **kwargs)
+    return rest, session
+
+
+def eod_handler(url, params):
+    if params.get('ticker') == 'bad.nz':
+        return FakeResponse(404, {'message': 'ticker not found'})
+    return {'ticker': params.get('ticker'), 'data': [{'date': params.get('date_from'), 'close': 1.0}]}
+
+
+def test_endpoints_are_coroutines():
+    for name in ('alive', 'tickers', 'validate', 'eod', 'intraday', 'last', 'rsi', 'cashflow'):
+        assert inspect.iscoroutinefunction(getattr(AsyncRest, name)), name
+    assert inspect.isasyncgenfunction(AsyncRest.iter_eod)
+    assert list(inspect.signature(AsyncRest.eod).parameters) == list(inspect.signature(Rest.eod).parameters)
+
+
+def test_no_blocking_transport_is_built():
+    rest, _ = client(eod_handler)
+    assert rest.request.transport is None
+
+
+def test_endpoint_request():
+    async def run():
+        rest, session = client(eod_handler)
+        response = await rest.eod('air.nz', date_from='2020-11-02', date_to='2020-11-03')
+        await rest.close()
+        return response, session
+
+    response, session = asyncio.run(run())
+
+    assert response.data == [{'date': '2020-11-02', 'close': 1.0}]
+    assert session.calls == [('http://localhost:5005/data/eod', {'ticker': 'air.nz', 'date_from': '2020-11-02',
+                                                                     'date_to': '2020-11-03', 'exchange': 'nzx',
+                                                                     'interval': '1d'})]
+    assert session.headers[0] == {'Authorization': 'Bearer token'}
+    assert session.closed
+
+
+def test_iter_endpoint():
+    async def run():
+        rest, _ = client(eod_handler)
+        return [record async for record in rest.iter_eod('air.nz', date_from='2020-11-02', date_to='2020-11-03')]
+
+    assert asyncio.run(run()) == [{'date': '2020-11-02', 'close': 1.0}]
+
+
+def test_many_returns_each_result_and_error():
+    async def run():
+        rest, _ = client(eod_handler)
+        return [result async for result in rest.eod_many(['air.nz', 'bad.nz', 'fph.nz'], date_from='2020-11-02')]
+
+    results = {result.ticker: result for result in asyncio.run(run())}
+
+    assert sorted(results) == ['air.nz', 'bad.nz', 'fph.nz']
+    assert results['air.nz'].response.data[0]['close'] == 1.0
+    assert results['fph.nz'].error is None
+    assert isinstance(results['bad.nz'].error, MissingTicker)
+
+
+def test_login_is_async_and_made_once(monkeypatch):
+    monkeypatch.delenv('FF-TOKEN', raising=False)
+
+    def handler(url, params):
+        if url.endswith('/oauth/login'):
+            return {'access_token': 'abc'}
+        return eod_handler(url, params)
+
+    async def run():
+        rest, session = client(handler, token=None, client_id='id', client_secret='secret')
+        await asyncio.gather(*[rest.last(ticker) for ticker in ('air.nz', 'fph.nz', 'spk.nz')])
+        return rest, session
+
+    rest, session = asyncio.run(run())
+
+    urls = [url for url, _ in session.calls]
+    assert urls.count('http://localhost:5005/oauth/login') == 1
+    assert urls[0].endswith('/oauth/login')
+    assert session.headers[0] == {'X-FF-ID': 'id', 'X-FF-SECRET': 'secret'}
+    assert session.headers[1:] == [{'Authorization': 'Bearer abc'}] * 3
+    assert rest.token == 'abc'
+
+
+def test_failed_login_raises(monkeypatch):
+    monkeypatch.delenv('FF-TOKEN', raising=False)
+
+    async def run():
+        rest, _ = client(lambda url, params: {}, token=None, client_id='id', client_secret='secret')
+        await rest.eod('air.nz')
+
+    with pytest.raises(NotAuthorised):
+        asyncio.run(run())
@@ -0,0 +1,164 @@
+import asyncio
+import json
+from datetime import datetime, timezone
+from types import SimpleNamespace
+import pytest
+
+aiohttp = pytest.importorskip('aiohttp')
+
+from financefeast.async_rest import AsyncRest
+from financefeast.async_stream import AsyncStream
+from financefeast.common import Environments
+from financefeast.retry import ReconnectPolicy
+from tests.conftest import FakeSession
+
+
+def message(price, ticker='air.nz'):
+    return json.dumps({'type': 'trade', 'data': {'ticker': ticker, 'price': price}})
+
+
+class FakeWebsocket(object):
+    """
+    aiohttp websocket stand in. Yields its messages then closes, or stays open until closed if keep_open
+    """
+
+    def __init__(self, messages:list, keep_open:bool):
+        self.messages = list(messages)
+        self.keep_open = keep_open
+        self.sent = []
+        self.closed = False
+        self.close_code = None
+        self._closing = asyncio.Event()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        self.closed = True
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self.messages:
+            return SimpleNamespace(type=aiohttp.WSMsgType.TEXT, data=self.messages.pop(0))
+        if self.keep_open:
+            await self._closing.wait()
+        self.closed = True
+        raise StopAsyncIteration
+
+    async def send_str(self, data:str):
+        self.sent.append(json.loads(data))
+
+    async def close(self):
+        self.closed = True
+        self._closing.set()
+
+
+class FakeWebsocketSession(object):
+    """
+    aiohttp.ClientSession stand in with one list of messages per connection. The last connection stays open.
+    """
+
+    def __init__(self, *connections):
+        self.connections = list(connections)
+        self.sockets = []
+        self.closed = False
+
+    def ws_connect(self, url:str, **kwargs):
+        messages = self.connections.pop(0) if self.connections else []
+        self.sockets.append(FakeWebsocket(messages, keep_open=not self.connections))
+        return self.sockets[-1]
+
+    async def close(self):
+        self.closed = True
+
+
+def test_async_iterator_yields_messages_after_authenticating():
+    async def run():
+        session = FakeWebsocketSession([message(n) for n in range(3)])
+        async with AsyncStream('token', session=session) as stream:
+            await stream.subscribe(['AIR.NZ', 'fph.nz'])
+            received = []
+            async for data in stream:
+                received.append(data['data']['price'])
+                if len(received) == 3:
+                    break
+        return session, stream, received
+
+    session, stream, received = asyncio.run(run())
+
+    assert received == [0, 1, 2]
+    assert session.sockets[0].sent == [{'type': 'authenticate', 'data': {'token': 'token'}},
+                                       {'type': 'subscribe', 'data': {'tickers': ['air.nz', 'fph.nz']}}]
+    assert session.sockets[0].closed and not session.closed
+    assert stream._task.done()
+
+
+def test_iteration_ends_when_the_stream_is_closed():
+    async def run():
+        stream = AsyncStream('token', session=FakeWebsocketSession([message(0)]))
+        received = []
+        async for data in stream:
+            received.append(data['data']['price'])
+            await stream.close()
+        return received
+
+    assert asyncio.run(run()) == [0]
+
+
+def test_coroutine_callbacks_are_awaited_with_decoded_handler_data():
+    async def run():
+        received, handled = [], []
+
+        async def on_data(stream, data):
+            await asyncio.sleep(0)
+            received.append(data)
+
+        async def handler(stream, data):
+            handled.append(data['data']['price'])
+
+        stream = AsyncStream('token', on_data=on_data, raw=True)
+        stream.attach(handler)
+        await stream._receive(message(1))
+        return received, handled
+
+    received, handled = asyncio.run(run())
+
+    assert received == [message(1)]
+    assert handled == [1]
+
+
+def test_reconnect_backfills_before_the_live_messages_held_meanwhile():
+    def intraday(url, params):
+        now = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+        return {'data': [{'datetime': now, 'close': 'missed'}]}
+
+    async def run():
+        received = []
+        done = asyncio.Event()
+
+        def on_data(stream, data):
+            received.append(data['data']['price'] if data['type'] == 'trade' else data['data']['close'])
+            if len(received) == 4:
+                done.set()
+
+        rest_session = FakeSession(intraday)
+        backfill = AsyncRest(token='token', environment=Environments.local, session=rest_session)
+        session = FakeWebsocketSession([message(0)], [message(1), message(2)])
+        stream = AsyncStream('token', on_data=on_data, session=session, backfill=backfill,
+                             reconnect=ReconnectPolicy(initial=0.01, jitter=False))
+        await stream.subscribe('air.nz')
+
+        stream.start()
+        await asyncio.wait_for(done.wait(), 5)
+        await stream.close()
+        return received, rest_session, session
+
+    received, rest_session, session = asyncio.run(run())
+
+    assert received == [0, 'missed', 1, 2]
+    assert [url.rsplit('/', 1)[-1] for url, _ in rest_session.calls] == ['intraday']
+    assert rest_session.calls[0][1]['ticker'] == 'air.nz'
+    assert len(session.sockets) == 2
+    assert session.sockets[1].sent[1] == {'type': 'subscribe', 'data': {'tickers': ['air.nz']}}
@@ -0,0 +1,112 @@
+import queue
+import threading
+import pytest
+from financefeast.bars import Bar, BarAggregator, WALL_CLOCK
+
+
+def test_prices_are_bucketed_into_epoch_aligned_bars():
+    closed = []
+    bars = BarAggregator('1m', on_bar=closed.append)
+
+    bars.add('AIR.NZ', 1.0, 10, timestamp=120.0)
+    bars.add('air.nz', 1.5, 5, timestamp=150.0)
+    bars.add('air.nz', 0.5, 1, timestamp=179.9)
+    assert closed == []
+
+    bars.add('air.nz', 2.0, 7, timestamp=181.0)
+
+    assert closed == [Bar('air.nz', '1m', 120.0, 180.0, 1.0, 1.5, 0.5, 0.5, 16, 3)]
+    assert bars.open_bars == [Bar('air.nz', '1m', 180.0, 240.0, 2.0, 2.0, 2.0, 2.0, 7, 1)]
+
+
+def test_several_intervals_and_ticker_filter():
+    closed = []
+    bars = BarAggregator(['1m', '5m'], on_bar=closed.append, tickers=['air.nz'])
+
+    bars.add('fph.nz', 9.0, 1, timestamp=0.0)
+    for timestamp in (0.0, 60.0, 120.0, 310.0):
+        bars.add('air.nz', timestamp, 1, timestamp=timestamp)
+
+    assert [(bar.interval, bar.start, bar.count) for bar in closed] == [('1m', 0.0, 1), ('1m', 60.0, 1),
+                                                                          ('1m', 120.0, 1), ('5m', 0.0, 3)]
+
+
+def test_late_messages_are_counted_and_lateness_keeps_bars_open():
+    closed = []
+    bars = BarAggregator('1m', on_bar=closed.append, allowed_lateness=10)
+
+    bars.add('air.nz', 1.0, timestamp=50.0)
+    bars.add('fph.nz', 2.0, timestamp=65.0)
+    bars.add('air.nz', 3.0, timestamp=59.0)
+    assert closed == []
+
+    bars.add('fph.nz', 4.0, timestamp=71.0)
+    bars.add('air.nz', 5.0, timestamp=30.0)
+
+    assert [(bar.ticker, bar.start, bar.close, bar.count) for bar in closed] == [('air.nz', 0.0, 3.0, 2)]
+    assert bars.late == 1
+
+
+def test_stream_messages_and_flush():
+    bars = BarAggregator('1s')
+
+    bars(None, {'ticker': 'air.nz', 'price': 1.0, 'volume': 3, 'timestamp': 10.2})
+    bars(None, {'data': [{'symbol': 'fph.nz', 'last': 2.0, 'size': 1, 'timestamp': 10.4}]})
+
+    assert sorted((bar.ticker, bar.close, bar.volume) for bar in bars.flush()) == [('air.nz', 1.0, 3), ('fph.nz', 2.0, 1)]
+    assert bars.open_bars == []
+
+
+def test_full_queue_counts_dropped_bars():
+    closed = queue.Queue(maxsize=1)
+    bars = BarAggregator('1s', queue=closed)
+
+    for timestamp in (0.0, 1.0, 2.0):
+        bars.add('air.nz', 1.0, timestamp=timestamp)
+
+    assert closed.get_nowait().start == 0.0
+    assert bars.dropped == 1
+
+
+def test_wall_clock_timer_closes_bars_without_more_messages():
+    now = [1000.5]
+    closed = queue.Queue()
+    bars = BarAggregator('1s', mode=WALL_CLOCK, queue=closed, clock=lambda: now[0])
+
+    bars.add('air.nz', 1.0, 1, timestamp=5.0)
+    now[0] = 1001.2
+    try:
+        bar = closed.get(timeout=2)
+    finally:
+        bars.stop()
+
+    assert (bar.start, bar.end, bar.close) == (1000.0, 1001.0, 1.0)
+
+
+def test_wall_clock_starts_one_timer_from_concurrent_adds():
+    bars = BarAggregator('1h', mode=WALL_CLOCK)
+    started = []
+    start_timer = bars._start_timer
+
+    def counted():
+        if bars._timer is None:
+            started.append(True)
+        start_timer()
+
+    bars._start_timer = counted
+    threads = [threading.Thread(target=bars.add, args=('air.nz', 1.0)) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    bars.stop()
+
+    assert started == [True]
+    assert bars.open_bars[0].count == 8
+
+
+def test_unknown_interval_and_mode_are_rejected():
+    with pytest.raises(ValueError):
+        BarAggregator('fortnight')
+    with pytest.raises(ValueError):
+        BarAggregator('1m', mode='tick')
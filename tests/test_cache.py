@@ -0,0 +1,221 @@
+from datetime import datetime, timedelta
+from financefeast.cache import BarCache, CacheStats, TTLCache
+from financefeast.chunking import parse_timestamp
+from financefeast.rest import Rest
+from financefeast.common import Environments
+from financefeast.retry import RetryPolicy
+from tests.conftest import FakeResponse, FakeTransport
+
+
+def eod_handler(timestamp=lambda day: day.strftime('%Y-%m-%d')):
+    """
+    One bar per day between date_from and date_to
+    """
+    def handler(url, params):
+        day = datetime.strptime(params['date_from'], '%Y-%m-%d')
+        end = datetime.strptime(params['date_to'], '%Y-%m-%d')
+        data = []
+        while day <= end:
+            data.append({'date': timestamp(day), 'close': day.day})
+            day += timedelta(days=1)
+        return {'ticker': params['ticker'], 'data': data}
+    return handler
+
+
+def client(handler):
+    transport = FakeTransport(handler)
+    rest = Rest(token='token', environment=Environments.local, transport=transport, bar_cache=BarCache(':memory:'),
+                max_chunk_bars=None)
+    return rest, transport
+
+
+def ranges(transport):
+    return [(params['date_from'], params['date_to']) for _, params in transport.calls]
+
+
+def test_parse_timestamp():
+    assert parse_timestamp('2020-11-02') == datetime(2020, 11, 2)
+    assert parse_timestamp('2020-11-02 10:00:00') == datetime(2020, 11, 2, 10)
+    assert parse_timestamp('2020-11-02T00:00:00.000Z') == datetime(2020, 11, 2)
+    assert parse_timestamp('2020-11-02T12:00:00+12:00') == datetime(2020, 11, 2)
+    assert parse_timestamp('2020-11-02T12:00:00+12:00', tz=None) == datetime(2020, 11, 2, 12)
+    assert parse_timestamp('2020-11-02T00:00:00.250') == datetime(2020, 11, 2, 0, 0, 0, 250000)
+    assert parse_timestamp(1604275200) == datetime(2020, 11, 2)
+    assert parse_timestamp(1604275200000) == datetime(2020, 11, 2)
+    assert parse_timestamp('yesterday') is None
+    assert parse_timestamp(None) is None
+
+
+def test_iso_timestamps_are_cached():
+    rest, transport = client(eod_handler(lambda day: day.strftime('%Y-%m-%dT00:00:00.000Z')))
+
+    first = rest.eod('air.nz', date_from='2020-11-02', date_to='2020-11-03')
+    second = rest.eod('air.nz', date_from='2020-11-02', date_to='2020-11-03')
+
+    assert [r['close'] for r in first.data] == [2, 3]
+    assert [r['close'] for r in second.data] == [2, 3]
+    assert len(transport.calls) == 1
+
+
+def test_epoch_timestamps_are_cached():
+    rest, transport = client(eod_handler(lambda day: int((day - datetime(1970, 1, 1)).total_seconds())))
+
+    rest.eod('air.nz', date_from='2020-11-02', date_to='2020-11-04')
+    response = rest.eod('air.nz', date_from='2020-11-02', date_to='2020-11-04')
+
+    assert [r['close'] for r in response.data] == [2, 3, 4]
+    assert len(transport.calls) == 1
+
+
+def test_partial_overlap_fetches_only_the_gap():
+    rest, transport = client(eod_handler())
+
+    rest.eod('air.nz', date_from='2020-11-01', date_to='2020-11-10')
+    response = rest.eod('air.nz', date_from='2020-11-05', date_to='2020-11-15')
+
+    assert ranges(transport) == [('2020-11-01', '2020-11-10'), ('2020-11-11', '2020-11-15')]
+    assert [r['close'] for r in response.data] == list(range(5, 16))
+
+
+def test_gaps_between_cached_ranges_are_merged():
+    rest, transport = client(eod_handler())
+
+    rest.eod('air.nz', date_from='2020-11-01', date_to='2020-11-05')
+    rest.eod('air.nz', date_from='2020-11-10', date_to='2020-11-15')
+    response = rest.eod('air.nz', date_from='2020-11-01', date_to='2020-11-20')
+
+    assert ranges(transport)[2:] == [('2020-11-06', '2020-11-09'), ('2020-11-16', '2020-11-20')]
+    assert [r['close'] for r in response.data] == list(range(1, 21))
+
+    key = BarCache.key('eod', 'air.nz', 'nzx', '1d')
+    assert rest._bar_cache.coverage(key) == [(datetime(2020, 11, 1), datetime(2020, 11, 20))]
+
+    rest.eod('air.nz', date_from='2020-11-03', date_to='2020-11-18')
+    assert len(transport.calls) == 4
+
+
+def test_unreadable_timestamps_skip_the_cache():
+    rest, transport = client(lambda url, params: {'data': [{'date': 'not a date', 'close': 1}, {'close': 2}]})
+
+    first = rest.eod('air.nz', date_from='2020-11-02', date_to='2020-11-03')
+    second = rest.eod('air.nz', date_from='2020-11-02', date_to='2020-11-03')
+
+    assert [r['close'] for r in first.data] == [1, 2]
+    assert [r['close'] for r in second.data] == [1, 2]
+
+    key = BarCache.key('eod', 'air.nz', 'nzx', '1d')
+    assert rest._bar_cache.coverage(key) == []
+    # the gap fetch, the uncached fetch, then uncached from the start
+    assert len(transport.calls) == 3
+
+
+def test_error_responses_are_not_cached():
+    failures = [FakeResponse(503, {'detail': 'unavailable'})]
+    good = eod_handler()
+    rest, transport = client(lambda url, params: failures.pop(0) if failures else good(url, params))
+    rest._requests.retry = RetryPolicy(max_retries=0)
+
+    failed = rest.eod('air.nz', date_from='2020-11-02', date_to='2020-11-04')
+    assert failed.data == [] and failed.detail == 'unavailable'
+
+    key = BarCache.key('eod', 'air.nz', 'nzx', '1d')
+    assert rest._bar_cache.coverage(key) == []
+
+    response = rest.eod('air.nz', date_from='2020-11-02', date_to='2020-11-04')
+    assert [r['close'] for r in response.data] == [2, 3, 4]
+    assert len(transport.calls) == 2
+
+
+def test_offset_timestamps_keep_their_local_date():
+    rest, transport = client(eod_handler(lambda day: day.strftime('%Y-%m-%dT00:00:00+13:00')))
+
+    first = rest.eod('air.nz', date_from='2020-11-02', date_to='2020-11-04')
+    second = rest.eod('air.nz', date_from='2020-11-02', date_to='2020-11-04')
+
+    assert [r['close'] for r in first.data] == [2, 3, 4]
+    assert [r['close'] for r in second.data] == [2, 3, 4]
+    assert len(transport.calls) == 1
+
+
+def test_eod_records_with_a_time_include_the_last_day():
+    rest, transport = client(eod_handler(lambda day: day.strftime('%Y-%m-%d 16:00:00')))
+
+    first = rest.eod('air.nz', date_from='2020-11-02', date_to='2020-11-04')
+    second = rest.eod('air.nz', date_from='2020-11-03', date_to='2020-11-04')
+
+    assert [r['close'] for r in first.data] == [2, 3, 4]
+    assert [r['close'] for r in second.data] == [3, 4]
+    assert len(transport.calls) == 1
+
+
+class Clock(object):
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_ttl_cache_expires_entries():
+    clock = Clock()
+    cache = TTLCache(ttl=10, clock=clock)
+    cache.set('a', 1)
+    cache.set('b', 2, ttl=30)
+
+    clock.now = 9
+    assert cache.get('a') == 1
+    clock.now = 10
+    assert cache.get('a') is None
+    assert cache.get('b') == 2
+    assert len(cache) == 1
+
+
+def test_ttl_cache_evicts_least_recently_used():
+    cache = TTLCache(maxsize=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+
+    assert cache.get('b', 'missing') == 'missing'
+    assert cache.get('a') == 1 and cache.get('c') == 3
+    assert cache.stats == CacheStats(hits=3, misses=1, evictions=1, size=2, maxsize=2)
+
+
+def test_ttl_cache_invalidates_by_endpoint():
+    cache = TTLCache(ttl_policy={'tickers': 5})
+    cache.set(('tickers', 'url', ()), 1)
+    cache.set(('exchange', 'url', ()), 2)
+
+    assert cache.ttl_for('tickers') == 5
+    assert cache.ttl_for('exchange') == TTLCache.DEFAULT_TTL_POLICY['exchange']
+    assert cache.ttl_for('other') == TTLCache.DEFAULT_TTL
+
+    cache.invalidate('tickers')
+    assert cache.get(('tickers', 'url', ())) is None
+    assert cache.get(('exchange', 'url', ())) == 2
+
+    cache.invalidate()
+    assert len(cache) == 0
+
+
+def test_rest_caches_reference_data_and_past_financials():
+    clock = Clock()
+    transport = FakeTransport(lambda url, params: {'data': [{'url': url}]})
+    rest = Rest(token='token', environment=Environments.local, transport=transport,
+                response_cache=TTLCache(clock=clock, ttl_policy={'tickers': 60}))
+
+    rest.tickers(exchange='nzx')
+    rest.tickers(exchange='nzx')
+    rest.tickers(exchange='asx')
+    assert len(transport.calls) == 2
+
+    clock.now = 60
+    rest.tickers(exchange='nzx')
+    assert len(transport.calls) == 3
+
+    rest.cashflow('air.nz', year='2019')
+    rest.cashflow('air.nz', year='2019')
+    rest.cashflow('air.nz', year=str(datetime.now().year))
+    rest.cashflow('air.nz', year=str(datetime.now().year))
+    assert len(transport.calls) == 6
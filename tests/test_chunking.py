@@ -0,0 +1,71 @@
+from datetime import datetime, timedelta
+from financefeast.chunking import parse_interval, parse_datetime, split_range, merge_responses
+from financefeast.common import Environments
+from financefeast.entity import Response
+from financefeast.rest import Rest
+from tests.conftest import FakeTransport
+
+
+def test_parse_interval():
+    assert parse_interval('1m') == timedelta(minutes=1)
+    assert parse_interval('15min') == timedelta(minutes=15)
+    assert parse_interval('4H') == timedelta(hours=4)
+    assert parse_interval('1d') == timedelta(days=1)
+    assert parse_interval('fortnightly') is None
+    assert parse_interval(None) is None
+
+
+def test_parse_datetime():
+    assert parse_datetime('2020-11-02') == datetime(2020, 11, 2)
+    assert parse_datetime('2020-11-02 10:30:00') == datetime(2020, 11, 2, 10, 30)
+    assert parse_datetime('2020-11-02T10:30:00') == datetime(2020, 11, 2, 10, 30)
+    assert parse_datetime('02/11/2020') is None
+
+
+def test_split_datetime_range_shares_boundaries_and_keeps_the_callers_ends():
+    chunks = split_range('2020-11-02 00:00', '2020-11-02 10:00:00', '1h', 4)
+    assert chunks == [('2020-11-02 00:00', '2020-11-02 04:00:00'),
+                      ('2020-11-02 04:00:00', '2020-11-02 08:00:00'),
+                      ('2020-11-02 08:00:00', '2020-11-02 10:00:00')]
+
+
+def test_split_date_range_does_not_overlap():
+    chunks = split_range('2020-11-01', '2020-11-10', '1d', 4, date_only=True)
+    assert chunks == [('2020-11-01', '2020-11-04'), ('2020-11-05', '2020-11-08'), ('2020-11-09', '2020-11-10')]
+
+
+def test_ranges_that_can_not_be_split_are_returned_whole():
+    assert split_range('2020-11-02 00:00:00', '2020-11-02 04:00:00', '1h', 4) == [('2020-11-02 00:00:00', '2020-11-02 04:00:00')]
+    assert split_range('2020-11-02', '2020-11-10', 'weird', 4) == [('2020-11-02', '2020-11-10')]
+    assert split_range(None, '2020-11-10', '1h', 4) == [(None, '2020-11-10')]
+    assert split_range('2020-11-10', '2020-11-02', '1h', 4) == [('2020-11-10', '2020-11-02')]
+    assert split_range('2020-11-02', '2020-11-10', '1h', None) == [('2020-11-02', '2020-11-10')]
+
+
+def test_merge_responses_drops_repeated_boundary_records():
+    first = Response({'ticker': 'air.nz', 'data': [{'datetime': 'a', 'close': 1}, {'datetime': 'b', 'close': 2}]})
+    second = Response({'ticker': 'other', 'data': [{'datetime': 'b', 'close': 2}, {'datetime': 'c', 'close': 3}, 'x']})
+
+    merged = merge_responses([first, None, second])
+    assert merged.data == [{'datetime': 'a', 'close': 1}, {'datetime': 'b', 'close': 2}, {'datetime': 'c', 'close': 3}, 'x']
+    assert merged._payload['ticker'] == 'air.nz'
+    assert merge_responses([None, None]) is None
+
+
+def test_rest_fetches_chunks_in_parallel_and_merges_them_in_order():
+    def handler(url, params):
+        hour = datetime.strptime(params['datetime_from'], '%Y-%m-%d %H:%M:%S')
+        end = datetime.strptime(params['datetime_to'], '%Y-%m-%d %H:%M:%S')
+        data = []
+        while hour <= end:
+            data.append({'datetime': hour.strftime('%Y-%m-%d %H:%M:%S'), 'close': hour.hour})
+            hour += timedelta(hours=1)
+        return {'ticker': params['ticker'], 'data': data}
+
+    transport = FakeTransport(handler)
+    rest = Rest(token='token', environment=Environments.local, transport=transport, max_chunk_bars=5)
+
+    response = rest.intraday('air.nz', datetime_from='2020-11-02 00:00:00', datetime_to='2020-11-02 23:00:00', interval='1h')
+
+    assert len(transport.calls) == 5
+    assert [record['close'] for record in response.data] == list(range(24))
@@ -0,0 +1,109 @@
+import pytest
+from financefeast import codec
+from financefeast.codec import JSONCodec, OrjsonCodec, UjsonCodec, default_codec
+from financefeast.common import Environments
+from financefeast.rest import Rest
+from financefeast.stream import Stream
+from tests.conftest import FakeTransport
+
+
+class CountingCodec(JSONCodec):
+    name = 'counting'
+
+    def __init__(self):
+        self.decoded = 0
+        self.encoded = 0
+
+    def loads(self, data):
+        self.decoded += 1
+        return super().loads(data)
+
+    def dumps(self, obj) -> str:
+        self.encoded += 1
+        return super().dumps(obj)
+
+
+class FakeWebsocket(object):
+    def __init__(self):
+        self.sent = []
+
+    def send(self, data):
+        self.sent.append(data)
+
+
+@pytest.mark.parametrize('orjson, ujson, expected', [
+    (True, True, 'orjson'),
+    (False, True, 'ujson'),
+    (False, False, 'json'),
+])
+def test_default_codec_prefers_the_fastest_library(monkeypatch, orjson, ujson, expected):
+    # only whether each library imported is checked when choosing
+    monkeypatch.setattr(codec, '_default_codec', None)
+    monkeypatch.setattr(codec, 'orjson', object() if orjson else None)
+    monkeypatch.setattr(codec, 'ujson', object() if ujson else None)
+
+    assert default_codec().name == expected
+    assert default_codec() is default_codec()
+
+
+@pytest.mark.parametrize('codec_class, module', [(JSONCodec, None), (OrjsonCodec, 'orjson'), (UjsonCodec, 'ujson')])
+def test_codecs_round_trip(codec_class, module):
+    if module:
+        pytest.importorskip(module)
+    json_codec = codec_class()
+    message = {'type': 'trade', 'data': [{'ticker': 'air.nz', 'price': 1.25, 'volume': 100}]}
+
+    encoded = json_codec.dumps(message)
+
+    assert isinstance(encoded, str)
+    assert json_codec.loads(encoded) == message
+    assert json_codec.loads(encoded.encode('utf-8')) == message
+
+
+def test_rest_decodes_with_the_given_codec():
+    json_codec = CountingCodec()
+    rest = Rest(token='token', environment=Environments.local, codec=json_codec,
+                transport=FakeTransport(lambda url, params: {'data': [{'close': 1}]}))
+
+    assert rest.last('air.nz').data == [{'close': 1}]
+    assert json_codec.decoded == 1
+
+
+def test_stream_decodes_and_encodes_with_the_given_codec():
+    json_codec = CountingCodec()
+    received = []
+    stream = Stream('token', on_data=lambda stream, data: received.append(data), codec=json_codec)
+    stream._websocket = FakeWebsocket()
+
+    stream._receive('{"ticker": "air.nz", "price": 1}')
+    stream._send({'action': 'subscribe'})
+
+    assert received == [{'ticker': 'air.nz', 'price': 1}]
+    assert stream.codec is json_codec
+    assert json_codec.decoded == 1 and json_codec.encoded == 1
+    assert stream._websocket.sent == ['{"action": "subscribe"}']
+
+
+def test_raw_stream_passes_messages_undecoded_and_handlers_decoded():
+    json_codec = CountingCodec()
+    received, handled = [], []
+    stream = Stream('token', on_data=lambda stream, data: received.append(data), codec=json_codec, raw=True)
+    stream.attach(lambda stream, data: handled.append(data))
+
+    message = '{"ticker": "air.nz", "price": 1}'
+    stream._receive(message)
+
+    assert received == [message]
+    assert handled == [{'ticker': 'air.nz', 'price': 1}]
+    assert json_codec.decoded == 1
+
+
+def test_raw_stream_without_handlers_does_not_decode():
+    json_codec = CountingCodec()
+    received = []
+    stream = Stream('token', on_data=lambda stream, data: received.append(data), codec=json_codec, raw=True)
+
+    stream._receive(b'{"ticker": "air.nz"}')
+
+    assert received == [b'{"ticker": "air.nz"}']
+    assert json_codec.decoded == 0
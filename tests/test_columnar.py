@@ -0,0 +1,65 @@
+import math
+from datetime import datetime, timezone, timedelta
+import pytest
+from financefeast.columnar import MISSING_TIMESTAMP, to_columns, to_epoch
+from financefeast.entity import Response
+
+EPOCH = 1604275200  # 2020-11-02 00:00:00 UTC
+
+
+def test_to_epoch():
+    assert to_epoch(EPOCH) == EPOCH
+    assert to_epoch(EPOCH + 0.75) == EPOCH
+    assert to_epoch(EPOCH * 1000) == EPOCH
+    assert to_epoch(EPOCH * 1000 + 999) == EPOCH
+    assert to_epoch('2020-11-02') == EPOCH
+    assert to_epoch('2020-11-02 00:00:10') == EPOCH + 10
+    assert to_epoch('2020-11-02T00:00:10.500Z') == EPOCH + 10
+    assert to_epoch('2020-11-02T13:00:00+13:00') == EPOCH
+    assert to_epoch(datetime(2020, 11, 2)) == EPOCH
+    assert to_epoch(datetime(2020, 11, 2, 13, tzinfo=timezone(timedelta(hours=13)))) == EPOCH
+    assert to_epoch(None) is None
+    assert to_epoch(True) is None
+    assert to_epoch('yesterday') is None
+
+
+def test_to_columns():
+    records = [{'date': '2020-11-02', 'close': 1.5, 'volume': 10, 'name': 'a'},
+               {'date': EPOCH * 1000 + 86400000, 'close': None, 'volume': 20, 'name': 'b'},
+               {'close': 2.5, 'volume': 30, 'name': 'c'}]
+    columns = to_columns(records)
+
+    assert columns.names == ['timestamp', 'close', 'volume']
+    assert list(columns['timestamp']) == [EPOCH, EPOCH + 86400, MISSING_TIMESTAMP]
+    assert columns['close'][0] == 1.5 and math.isnan(columns['close'][1])
+    assert list(columns['volume']) == [10.0, 20.0, 30.0]
+    assert len(columns) == 3 and 'close' in columns
+
+
+def test_mixed_fields_are_skipped():
+    columns = Response({'data': [{'date': '2020-11-02', 'value': 1}, {'date': '2020-11-03', 'value': 'x'}]}).columns()
+    assert columns.names == ['timestamp']
+    assert len(Response({'data': []}).columns()) == 0
+
+
+def test_numpy_views_share_the_buffers():
+    np = pytest.importorskip('numpy')
+    columns = to_columns([{'date': '2020-11-02', 'close': 1.5}, {'date': None, 'close': 2.5}])
+    arrays = columns.to_numpy()
+
+    columns['close'][0] = 9.0
+    assert arrays['close'][0] == 9.0
+    assert arrays['timestamp'].dtype == np.int64
+    assert np.isnat(arrays['timestamp'].view('datetime64[s]')[1])
+
+
+def test_pandas_frame():
+    pd = pytest.importorskip('pandas')
+    np = pytest.importorskip('numpy')
+    columns = to_columns([{'date': '2020-11-02', 'close': 1.5, 'open': 1.0}, {'date': None, 'close': 2.5, 'open': 2.0}])
+    frame = columns.to_pandas()
+
+    assert list(frame.columns) == ['close', 'open']
+    assert frame.index[0] == pd.Timestamp('2020-11-02') and pd.isna(frame.index[1])
+    if int(pd.__version__.split('.')[0]) >= 2:
+        assert np.shares_memory(frame['close'].to_numpy(), columns.to_numpy()['close'])
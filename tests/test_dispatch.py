@@ -0,0 +1,85 @@
+import json
+import threading
+from financefeast.conflate import Conflator
+from financefeast.dispatch import Dispatcher, DROP_NEWEST
+from financefeast.pool import StreamPool
+from financefeast.stream import Stream
+
+
+def message(ticker, price):
+    return json.dumps({'type': 'trade', 'data': {'ticker': ticker, 'price': price}})
+
+
+def test_messages_for_a_ticker_stay_on_one_worker():
+    dispatcher = Dispatcher(workers=4)
+    indexes = {ticker: dispatcher._index(ticker) for ticker in ('air.nz', 'fbu.nz', 'spk.nz', 'ifr.nz')}
+    assert len(set(indexes.values())) > 1
+
+    received = []
+    done = threading.Event()
+
+    def target(data):
+        received.append((threading.current_thread().name, data['data']['ticker'], data['data']['price']))
+        if len(received) == 40:
+            done.set()
+
+    dispatcher.start(target)
+    for price in range(10):
+        for ticker in indexes:
+            dispatcher.submit({'type': 'trade', 'data': {'ticker': ticker, 'price': price}})
+    assert done.wait(5)
+    dispatcher.stop(5)
+
+    for ticker, index in indexes.items():
+        own = [(thread, price) for thread, t, price in received if t == ticker]
+        assert {thread for thread, _ in own} == {f'ff_dispatch_{index}'}
+        assert [price for _, price in own] == list(range(10))
+
+
+def test_drop_newest_counts_drops():
+    dispatcher = Dispatcher(max_queue=2, overflow=DROP_NEWEST)
+    assert [dispatcher.submit({'n': n}) for n in range(4)] == [True, True, False, False]
+    assert dispatcher.stats.dropped_newest == 2 and dispatcher.queue_depth == 2
+
+
+def test_raw_stream_conflates_by_ticker():
+    stream = Stream('token', raw=True, conflate=True)
+    conflator = stream.dispatcher
+
+    for price in range(5):
+        conflator.submit(message('AIR.NZ', price))
+    conflator.submit(message('fbu.nz', 1))
+
+    assert conflator.queue_depth == 2
+    assert conflator.stats.conflated == 4
+    # on_data still receives the undecoded message
+    assert conflator.latest('air.nz') == message('AIR.NZ', 4)
+
+
+def test_raw_stream_spreads_messages_over_workers():
+    dispatcher = Dispatcher(workers=4)
+    Stream('token', raw=True, dispatcher=dispatcher)
+
+    tickers = ('air.nz', 'fbu.nz', 'spk.nz', 'ifr.nz')
+    for ticker in tickers:
+        dispatcher.submit(message(ticker, 1))
+
+    assert sorted(len(queue) for queue in dispatcher._queues) == sorted(
+        [dispatcher._index(ticker) for ticker in tickers].count(i) for i in range(4))
+    assert len(dispatcher._queues[dispatcher._index('air.nz')]) >= 1
+
+
+def test_raw_pool_decodes_for_keying():
+    conflator = Conflator()
+    pool = StreamPool('token', size=2, raw=True, dispatcher=conflator)
+
+    assert conflator.decode is not None
+    pool.dispatcher.submit(message('air.nz', 1))
+    pool.dispatcher.submit(message('air.nz', 2))
+    assert conflator.queue_depth == 1
+
+
+def test_decoded_stream_does_not_set_decode():
+    conflator = Conflator()
+    Stream('token', dispatcher=conflator)
+    assert conflator.decode is None
@@ -0,0 +1,97 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from financefeast import ta
+from financefeast.entity import Response
+from financefeast.indicators import EMA, SMA, RSI, MACD, Bollinger, Stochastic, IndicatorSet
+
+
+def prices(n=300, seed=2):
+    rng = np.random.default_rng(seed)
+    close = 100 + rng.normal(size=n).cumsum()
+    high = close + rng.uniform(0, 1, n)
+    low = close - rng.uniform(0, 1, n)
+    return high, low, close
+
+
+def series(indicator, close, high=None, low=None, key=None):
+    """
+    Value of an incremental indicator after each price, NaN while it is not ready
+    """
+    values = []
+    for i, price in enumerate(close):
+        value = indicator.update(price) if high is None else indicator.update_bar(high[i], low[i], price)
+        if key is not None:
+            value = None if value is None else value[key]
+        values.append(np.nan if value is None else value)
+    return np.array(values)
+
+
+def close_enough(a, b):
+    return np.allclose(a, b, equal_nan=True, rtol=1e-9, atol=1e-9)
+
+
+def test_sma_and_ema_match_ta():
+    _, _, close = prices()
+
+    assert close_enough(series(SMA(20), close), ta.sma(close, window=20)['sma_20'])
+    assert close_enough(series(EMA(20), close), ta.ema(close, window=20)['ema_20'])
+
+
+def test_rsi_matches_ta():
+    _, _, close = prices()
+    assert close_enough(series(RSI(14), close), ta.rsi(close, window=14)['rsi'])
+
+
+def test_macd_matches_ta():
+    _, _, close = prices()
+    expected = ta.macd(close)
+
+    for key in ('macd', 'macd_signal', 'macd_diff'):
+        assert close_enough(series(MACD(), close, key=key), expected[key]), key
+
+
+def test_bollinger_matches_ta():
+    _, _, close = prices()
+    expected = ta.bollinger(close, window=20, window_dev=2)
+
+    for key in ('bollinger_mavg', 'bollinger_hband', 'bollinger_lband'):
+        assert close_enough(series(Bollinger(20, 2), close, key=key), expected[key]), key
+
+
+def test_stochastic_bars_match_ta():
+    high, low, close = prices()
+    expected = ta.stochastic(high, low, close, window=14, window_sma=3)
+
+    for key in ('stoch', 'stoch_signal'):
+        assert close_enough(series(Stochastic(14, 3), close, high, low, key=key), expected[key]), key
+
+
+def test_seeded_indicator_continues_where_history_ends():
+    high, low, close = prices()
+    bars = Response({'data': [{'high': h, 'low': l, 'close': c} for h, l, c in zip(high[:200], low[:200], close[:200])]})
+
+    seeded = Stochastic().seed(bars)
+    fresh = Stochastic()
+    for h, l, c in zip(high[:200], low[:200], close[:200]):
+        fresh.update_bar(h, l, c)
+
+    assert seeded.value == fresh.value
+    assert seeded.update(close[200]) == fresh.update(close[200])
+    assert EMA(5).seed(list(close)).value == pytest.approx(ta.ema(close, window=5)['ema_5'][-1])
+
+
+def test_indicator_set_keeps_state_per_ticker():
+    updates = []
+    indicators = IndicatorSet({'sma': SMA(2), 'ema': EMA(2)}, tickers=['AIR.NZ', 'fph.nz'],
+                              on_update=lambda ticker, values: updates.append((ticker, values)))
+
+    indicators(None, {'ticker': 'air.nz', 'price': 1.0})
+    indicators(None, {'data': [{'ticker': 'AIR.NZ', 'price': 3.0}, {'ticker': 'fph.nz', 'price': 10.0}]})
+    indicators(None, {'ticker': 'spk.nz', 'price': 5.0})
+
+    assert indicators.values('air.nz') == {'sma': 2.0, 'ema': pytest.approx(1 + 2 / 3 * 2)}
+    assert indicators.values('fph.nz') == {'sma': None, 'ema': None}
+    assert [ticker for ticker, _ in updates] == ['air.nz', 'air.nz', 'fph.nz']
+    assert indicators.indicators('air.nz')['sma'] is not indicators.indicators('fph.nz')['sma']
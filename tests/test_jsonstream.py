@@ -0,0 +1,69 @@
+import json
+import random
+import pytest
+from financefeast.jsonstream import JSONArrayParser, iter_records
+
+BODIES = [
+    {'ticker': 'air.nz', 'count': 12.5, 'data': [{'date': '2020-11-02', 'close': 1.05, 'volume': 120000},
+                                                  {'date': '2020-11-03', 'close': -0.5e-3, 'volume': 0}]},
+    {'data': [1.5, -2, 3e10, 4.25E-7, 0, -0.0, 123456789012345], 'next': None},
+    {'flag': True, 'other': False, 'nothing': None, 'data': [True, False, None], 'total': -17},
+    {'name': 'Ngāi Tahu ☃ "quoted" \\ slash', 'data': [{'text': 'éè \U0001f600', 'n': [1, [2, {'x': 3}]]}]},
+    {'data': []},
+    {'empty': {}, 'list': [], 'data': [{}, [], '', 0.1]},
+    [{'date': '2020-11-02', 'close': 1.5}, 7, 8.75, 'nine'],
+]
+
+
+def parse_chunks(chunks):
+    parser = JSONArrayParser()
+    records = []
+    for chunk in chunks:
+        records.extend(parser.feed(chunk))
+    records.extend(parser.close())
+    return records, parser.payload
+
+
+def expected(body):
+    if isinstance(body, list):
+        return body, {}
+    return body['data'], {k: v for k, v in body.items() if k != 'data'}
+
+
+@pytest.mark.parametrize('body', BODIES)
+def test_every_chunk_size(body):
+    raw = json.dumps(body, ensure_ascii=False, indent=1).encode('utf-8')
+    for size in range(1, len(raw) + 1):
+        chunks = [raw[i:i + size] for i in range(0, len(raw), size)]
+        assert parse_chunks(chunks) == expected(body), f"chunk size {size}"
+
+
+@pytest.mark.parametrize('body', BODIES)
+def test_random_splits(body):
+    rng = random.Random(7)
+    raw = json.dumps(body, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+    for _ in range(200):
+        cuts = sorted(rng.sample(range(1, len(raw)), min(len(raw) - 1, rng.randint(1, 12))))
+        chunks = [raw[start:end] for start, end in zip([0] + cuts, cuts + [len(raw)])]
+        assert parse_chunks(chunks) == expected(body), f"cuts {cuts}"
+
+
+def test_numbers_split_after_point_exponent_or_sign():
+    assert list(iter_records([b'{"count": 12.', b'5, "data":[]}'])) == []
+    assert list(iter_records([b'{"data":[1.', b'5]}'])) == [1.5]
+    assert list(iter_records([b'{"data":[1e', b'3, -', b'4]}'])) == [1000.0, -4]
+    assert list(iter_records([b'{"data":[tr', b'ue, nu', b'll]}'])) == [True, None]
+
+
+def test_batches():
+    body = json.dumps({'data': list(range(10))}).encode('utf-8')
+    assert list(iter_records([body[:7], body[7:]], batch_size=4)) == [[0, 1, 2, 3], [4, 5, 6, 7], [8, 9]]
+
+
+def test_invalid_bodies_raise():
+    with pytest.raises(ValueError):
+        parse_chunks([b'{"count": 12.x, "data": []}'])
+    with pytest.raises(ValueError):
+        parse_chunks([b'{"data": [1, 2'])
+    with pytest.raises(ValueError):
+        parse_chunks([b'"just a string"'])
@@ -0,0 +1,69 @@
+import math
+import random
+from financefeast.metrics import Histogram, RestMetrics, _format
+from financefeast.common import Environments
+from financefeast.rest import Rest
+from tests.conftest import FakeResponse, FakeTransport
+
+
+def test_percentiles_are_within_the_bucket_error():
+    rng = random.Random(5)
+    values = [rng.lognormvariate(-5, 1.5) for _ in range(20000)]
+    histogram = Histogram()
+    for value in values:
+        histogram.record(value)
+
+    values.sort()
+    for percentile in (50, 90, 99, 99.9):
+        exact = values[math.ceil(percentile / 100.0 * len(values)) - 1]
+        assert abs(histogram.percentile(percentile) - exact) <= exact / Histogram.SUB_BUCKETS
+    assert abs(histogram.percentile(100) - values[-1]) <= values[-1] / Histogram.SUB_BUCKETS
+    assert histogram.snapshot().count == 20000
+
+
+def test_negative_zero_and_merged_values():
+    first, second = Histogram(), Histogram()
+    for value in (-0.5, 0, 0.25):
+        first.record(value)
+    second.record(2.0)
+    first.merge(second)
+
+    assert first.count == 4 and first.min == -0.5 and first.max == 2.0
+    assert first.percentiles((1, 50, 100)) == [-0.5, 0.0, 2.0]
+    assert Histogram().percentile(50) is None
+
+
+def test_infinite_values_are_recorded():
+    histogram = Histogram()
+    histogram.record(1.0)
+    histogram.record(float('inf'))
+    assert histogram.percentile(100) == float('inf')
+
+
+def test_prometheus_format_of_special_values():
+    assert _format(float('inf')) == '+Inf'
+    assert _format(float('-inf')) == '-Inf'
+    assert _format(float('nan')) == 'NaN'
+    assert _format(0.25) == '0.25'
+    assert _format(3) == '3'
+
+
+def test_rest_metrics_prometheus_output():
+    responses = [FakeResponse(429, {'detail': 'slow down'}, {'x-ratelimit-reset': '0'}),
+                 FakeResponse(200, {'data': [1, 2]}, {'x-ratelimit-remaining': 'inf'})]
+    metrics = RestMetrics()
+    rest = Rest(token='token', environment=Environments.local, transport=FakeTransport(lambda url, params: responses.pop(0)),
+                metrics=metrics)
+
+    rest.eod('air.nz', date_from='2020-11-02', date_to='2020-11-03')
+
+    snapshot = metrics.snapshot()['/data/eod']
+    assert snapshot.requests == 1 and snapshot.attempts == 2 and snapshot.retries == 1
+    assert snapshot.statuses == {429: 1, 200: 1} and snapshot.rate_limited == 1
+
+    lines = metrics.prometheus().splitlines()
+    assert 'financefeast_rest_requests_total{endpoint="/data/eod"} 1' in lines
+    assert 'financefeast_rest_responses_total{endpoint="/data/eod",status="429"} 1' in lines
+    assert 'financefeast_rest_ratelimit_remaining{endpoint="/data/eod"} +Inf' in lines
+    assert 'financefeast_rest_duration_seconds_count{endpoint="/data/eod"} 1' in lines
+    assert '# TYPE financefeast_rest_time_to_headers_seconds summary' in lines
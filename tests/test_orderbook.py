@@ -0,0 +1,164 @@
+import random
+import threading
+import time
+from financefeast.orderbook import OrderBook, BID, ASK, Level, TopOfBook
+
+
+class FakeRest(object):
+    """
+    Serves order book snapshots from a list, the last one is repeated
+    """
+
+    def __init__(self, snapshots:list, gate:threading.Event = None):
+        self.snapshots = list(snapshots)
+        self.gate = gate
+        self.calls = 0
+
+    def orderbook(self, ticker, condensed=True, exchange='nzx'):
+        self.calls += 1
+        if self.gate is not None:
+            self.gate.wait(5)
+        return self.snapshots.pop(0) if len(self.snapshots) > 1 else self.snapshots[0]
+
+
+def snapshot(sequence, bids=((9.0, 100),), asks=((10.0, 200),)):
+    return {'sequence': sequence, 'bids': [list(level) for level in bids], 'asks': [list(level) for level in asks]}
+
+
+def update(sequence, side=BID, price=9.5, size=10):
+    return {'sequence': sequence, 'side': side, 'price': price, 'size': size}
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.005)
+
+
+def test_seed_and_queries():
+    book = OrderBook('AIR.NZ').seed(snapshot(1, bids=[(9.0, 100), (8.5, 50), (9.0, 25)], asks=[(10.0, 200), (10.5, 10)]))
+
+    assert book.synced
+    assert book.best_bid() == Level(9.0, 125)
+    assert book.top() == TopOfBook(9.0, 125, 10.0, 200)
+    assert book.spread() == 1.0
+    assert book.levels(BID) == [Level(9.0, 125), Level(8.5, 50)]
+    assert book.levels(ASK, 1) == [Level(10.0, 200)]
+    assert book.depth(BID, 8.5) == 50
+    assert book.cumulative_depth(BID, 8.5) == 175
+    assert book.cumulative_depth(BID, 8.75) == 125
+    assert book.cumulative_depth(ASK, 10.0) == 200
+    assert book.cumulative_depth(ASK, 11.0) == 210
+
+
+def test_cumulative_depth_matches_levels_after_updates():
+    rng = random.Random(3)
+    book = OrderBook('air.nz').seed(snapshot(0, bids=[], asks=[]))
+
+    for sequence in range(1, 2000):
+        side = rng.choice((BID, ASK))
+        price = round(rng.uniform(5, 15) * 4) / 4
+        assert book.apply(update(sequence, side, price, rng.choice((0, 0, 10, 20, 35))))
+
+        if sequence % 50 == 0:
+            limit = round(rng.uniform(5, 15) * 4) / 4
+            bids, asks = book.levels(BID), book.levels(ASK)
+            assert book.cumulative_depth(BID, limit) == sum(level.size for level in bids if level.price >= limit)
+            assert book.cumulative_depth(ASK, limit) == sum(level.size for level in asks if level.price <= limit)
+
+
+def test_stale_updates_are_ignored():
+    book = OrderBook('air.nz').seed(snapshot(10))
+
+    assert not book.apply(update(10, price=9.5))
+    assert book.depth(BID, 9.5) == 0
+    assert book.apply(update(11, price=9.5))
+    assert book.depth(BID, 9.5) == 10
+
+
+def test_gap_buffers_updates_until_snapshot_catches_up():
+    rest = FakeRest([snapshot(100), snapshot(107)])
+    book = OrderBook('air.nz', rest=rest, min_resync_interval=0.01, max_resync_interval=0.05)
+    book.seed(snapshot(100))
+
+    for sequence in range(105, 111):
+        book.apply(update(sequence, price=9.0 + sequence / 100.0))
+
+    wait_for(lambda: book.synced)
+    book.close()
+
+    # one fetch behind the updates, one that catches up, then 108 to 110 applied on top
+    assert rest.calls == 2
+    assert book.sequence == 110
+    assert [level.price for level in book.levels(BID)] == [10.1, 10.09, 10.08, 9.0]
+    assert book.buffered == 0
+
+
+def test_resync_runs_off_the_receive_thread():
+    gate = threading.Event()
+    rest = FakeRest([snapshot(100)], gate=gate)
+    book = OrderBook('air.nz', rest=rest, min_resync_interval=0.01)
+
+    started = time.monotonic()
+    for sequence in range(99, 104):
+        assert not book.apply(update(sequence, price=9.0 + sequence / 1000.0))
+    assert time.monotonic() - started < 1.0
+    assert book.buffered == 5 and not book.synced
+
+    gate.set()
+    wait_for(lambda: book.synced)
+    book.close()
+
+    assert rest.calls == 1
+    assert book.sequence == 103
+    assert book.depth(BID, 9.101) == 10 and book.depth(BID, 9.1) == 0
+
+
+def test_repeated_resyncs_back_off():
+    rest = FakeRest([snapshot(1)])
+    book = OrderBook('air.nz', rest=rest, min_resync_interval=0.05, max_resync_interval=0.2)
+    book.seed(snapshot(1))
+
+    book.apply(update(5))
+    time.sleep(0.5)
+    book.close()
+
+    # 0.05 + 0.1 + 0.2 + 0.2 seconds between fetches, far fewer than one per update or per poll
+    assert 2 <= rest.calls <= 5
+    assert not book.synced
+    assert book.buffered == 1
+
+
+def test_reconnect_resyncs():
+    rest = FakeRest([snapshot(50, bids=[(8.0, 5)])])
+    book = OrderBook('air.nz', rest=rest)
+    book.seed(snapshot(10))
+
+    book.on_reconnect(None)
+    wait_for(lambda: book.synced and book.sequence == 50)
+    book.close()
+
+    assert book.best_bid() == Level(8.0, 5)
+
+
+def test_stream_messages_for_other_tickers_are_ignored():
+    book = OrderBook('air.nz').seed(snapshot(1))
+
+    book(None, {'type': 'orderbook', 'data': {'ticker': 'fbu.nz', 'sequence': 2, 'side': 'bid', 'price': 9.5, 'size': 1}})
+    book(None, {'type': 'orderbook', 'data': {'ticker': 'AIR.NZ', 'sequence': 2, 'side': 'ask', 'price': 9.75, 'size': 3}})
+
+    assert book.depth(BID, 9.5) == 0
+    assert book.best_ask() == Level(9.75, 3)
+
+
+def test_trades_leave_the_book_unchanged():
+    book = OrderBook('air.nz').seed(snapshot(1))
+    before = (book.levels(BID), book.levels(ASK), book.sequence)
+
+    book(None, {'type': 'trade', 'data': {'ticker': 'air.nz', 'price': 1.5, 'size': 7, 'side': 'buy'}})
+    book(None, {'type': 'trade', 'ticker': 'air.nz', 'price': 9.5, 'size': 7, 'side': 'sell', 'sequence': 2})
+    book(None, {'type': 'orderbook', 'data': {'ticker': 'air.nz', 'side': 'bid', 'size': 7}})
+
+    assert (book.levels(BID), book.levels(ASK), book.sequence) == before
+    assert book.top() == TopOfBook(9.0, 100, 10.0, 200)
@@ -0,0 +1,88 @@
+from financefeast.pool import HashRing, StreamPool
+
+TICKERS = [f't{n}.nz' for n in range(300)]
+
+
+def owners(ring):
+    return {ticker: ring.node_for(ticker) for ticker in TICKERS}
+
+
+def test_ring_spreads_keys():
+    counts = {}
+    for node in owners(HashRing(range(4))).values():
+        counts[node] = counts.get(node, 0) + 1
+    assert sorted(counts) == [0, 1, 2, 3]
+    assert min(counts.values()) > len(TICKERS) / 4 / 3
+
+
+def test_ring_moves_only_the_removed_nodes_keys():
+    ring = HashRing(range(4))
+    before = owners(ring)
+
+    ring.remove(2)
+    after = owners(ring)
+    assert 2 not in ring and len(ring) == 3
+    assert all(after[t] == before[t] for t in TICKERS if before[t] != 2)
+    assert all(after[t] != 2 for t in TICKERS)
+
+    ring.add(2)
+    assert owners(ring) == before
+
+
+def test_empty_ring():
+    assert HashRing().node_for('air.nz') is None
+
+
+def shard_tickers(pool):
+    return [sorted(shard.subscriptions) for shard in pool.shards]
+
+
+def test_pool_subscribes_each_ticker_on_one_shard():
+    pool = StreamPool('token', size=3)
+    pool.subscribe(TICKERS[:60] + ['T0.NZ'])
+
+    subscribed = shard_tickers(pool)
+    assert sorted(sum(subscribed, [])) == sorted(TICKERS[:60])
+    assert all(subscribed)
+    assert all(ticker in subscribed[index] for ticker, index in pool.subscriptions.items())
+
+
+def test_dropped_shard_tickers_move_and_come_back():
+    pool = StreamPool('token', size=3)
+    pool.subscribe(TICKERS[:60])
+    before = pool.subscriptions
+    dropped = pool.shards[1]
+
+    pool._shard_down(dropped)
+    during = pool.subscriptions
+    assert dropped.subscriptions == []
+    assert all(during[t] == before[t] for t in before if before[t] != 1)
+    assert sorted(sum(shard_tickers(pool), [])) == sorted(TICKERS[:60])
+    assert pool.rebalances == 1
+
+    # repeated close and error callbacks for the same drop do nothing
+    pool._shard_down(dropped)
+    assert pool.rebalances == 1
+
+    pool._shard_up(dropped)
+    assert pool.subscriptions == before
+    assert sorted(dropped.subscriptions) == sorted(t for t, index in before.items() if index == 1)
+    assert pool.rebalances == 2
+
+
+def test_last_shard_keeps_its_tickers():
+    pool = StreamPool('token', size=1)
+    pool.subscribe(TICKERS[:5])
+
+    pool._shard_down(pool.shards[0])
+    assert sorted(pool.shards[0].subscriptions) == sorted(TICKERS[:5])
+    assert pool.rebalances == 0
+
+
+def test_unsubscribe():
+    pool = StreamPool('token', size=2)
+    pool.subscribe(TICKERS[:10])
+    pool.unsubscribe(TICKERS[:5])
+
+    assert sorted(pool.subscriptions) == sorted(TICKERS[5:10])
+    assert sorted(sum(shard_tickers(pool), [])) == sorted(TICKERS[5:10])
@@ -0,0 +1,96 @@
+import asyncio
+import time
+from financefeast.ratelimit import RateLimiter, reset_seconds
+from financefeast.common import Environments
+from financefeast.rest import Rest
+from tests.conftest import FakeResponse, FakeTransport
+
+
+class Clock(object):
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_reset_seconds():
+    assert reset_seconds('30') == 30
+    assert reset_seconds(-5) == 0
+    assert 29 <= reset_seconds(time.time() + 30) <= 30
+    assert reset_seconds('soon') is None
+    assert reset_seconds(None) is None
+
+
+def test_unpaced_until_headers_are_seen():
+    limiter = RateLimiter(burst=2)
+    assert all(limiter.try_acquire() for _ in range(100))
+    assert limiter.state.tokens is None
+
+
+def test_budget_is_spread_until_the_reset():
+    clock = Clock()
+    limiter = RateLimiter(burst=2, clock=clock)
+    limiter.update(100, 10, 5)
+
+    state = limiter.state
+    assert state.fill_rate == 2 and state.tokens == 2 and state.reset == 5
+
+    # the burst, then one request per half second
+    assert limiter.try_acquire() and limiter.try_acquire()
+    assert not limiter.try_acquire()
+    clock.now += 0.25
+    assert not limiter.try_acquire()
+    clock.now += 0.25
+    assert limiter.try_acquire()
+
+    # after the window resets the budget is unknown and requests are not paced
+    clock.now += 5
+    assert limiter.state.tokens is None
+    assert limiter.try_acquire() and limiter.try_acquire() and limiter.try_acquire()
+
+
+def test_exhausted_waits_for_the_reset():
+    clock = Clock()
+    limiter = RateLimiter(clock=clock)
+    limiter.update(100, 50, 60)
+    limiter.exhausted(2)
+
+    assert not limiter.try_acquire()
+    clock.now += 1.9
+    assert not limiter.try_acquire()
+    clock.now += 0.2
+    assert limiter.try_acquire()
+
+
+def test_acquire_timeout():
+    limiter = RateLimiter()
+    limiter.update(100, 0, 30)
+
+    started = time.monotonic()
+    assert not limiter.acquire(timeout=0.05)
+    assert not asyncio.run(limiter.acquire_async(timeout=0.05))
+    assert 0.1 <= time.monotonic() - started < 1
+
+
+def test_acquire_waits_for_a_token():
+    limiter = RateLimiter(burst=1)
+    limiter.update(100, 20, 1)
+    assert limiter.acquire()
+
+    started = time.monotonic()
+    assert limiter.acquire(timeout=1)
+    assert 0.03 <= time.monotonic() - started < 0.5
+
+
+def test_rest_updates_the_limiter_from_response_headers():
+    headers = {'x-ratelimit-limit': '100', 'x-ratelimit-remaining': '4', 'x-ratelimit-reset': '60'}
+    transport = FakeTransport(lambda url, params: FakeResponse(200, {'data': []}, headers))
+    rest = Rest(token='token', environment=Environments.local, transport=transport)
+
+    rest.eod('air.nz', date_from='2020-11-02', date_to='2020-11-03')
+
+    state = rest.rate_limiter.state
+    assert state.limit == 100 and state.remaining == 4
+    assert 59 <= state.reset <= 60
+    assert state.tokens == 4
@@ -0,0 +1,102 @@
+import asyncio
+import json
+import os
+import time
+import pytest
+from financefeast.async_stream import AsyncStream
+from financefeast.recorder import Recorder, Replayer
+from financefeast.stream import Stream
+
+
+def message(n):
+    return json.dumps({'type': 'trade', 'data': {'ticker': 'air.nz', 'price': n}})
+
+
+def record(path, count, index_every=Recorder.DEFAULT_INDEX_EVERY, start=1000.0):
+    with Recorder(str(path), index_every=index_every) as recorder:
+        for n in range(count):
+            recorder.write(message(n), timestamp=start + n)
+    return str(path)
+
+
+def test_round_trip_keeps_frames_and_times(tmp_path):
+    path = str(tmp_path / 'session.fflog')
+    with Recorder(path) as recorder:
+        recorder.write('{"text": "Ngāi Tahu"}', timestamp=1.5)
+        recorder.write(b'\x00\x01binary', timestamp=2.5)
+
+    # appending keeps the existing records
+    with Recorder(path) as recorder:
+        recorder.write('last', timestamp=3.5)
+
+    with Replayer(path) as replayer:
+        assert list(replayer) == [(1.5, '{"text": "Ngāi Tahu"}'), (2.5, b'\x00\x01binary'), (3.5, 'last')]
+
+
+def test_index_seek(tmp_path):
+    path = record(tmp_path / 'session.fflog', 100, index_every=10)
+
+    with Replayer(path) as replayer:
+        assert len(replayer._index) == 10
+        assert replayer._seek(1055.0) == replayer._index[5][1]
+        assert replayer._seek(999.0) == replayer._seek(None)
+
+        records = list(replayer.records(start=1055.0, end=1060.0))
+        assert [timestamp for timestamp, _ in records] == [1055.0 + n for n in range(6)]
+        assert json.loads(records[0][1])['data']['price'] == 55
+
+
+def test_truncated_record_is_skipped(tmp_path):
+    path = record(tmp_path / 'session.fflog', 3)
+    with open(path, 'r+b') as f:
+        f.truncate(os.path.getsize(path) - 4)
+
+    with Replayer(path) as replayer:
+        assert [json.loads(m)['data']['price'] for _, m in replayer] == [0, 1]
+
+
+def test_not_a_log(tmp_path):
+    path = tmp_path / 'other.bin'
+    path.write_bytes(b'something else entirely')
+    with pytest.raises(ValueError):
+        Replayer(str(path))
+
+
+def test_replay_into_a_stream(tmp_path):
+    path = record(tmp_path / 'session.fflog', 20)
+    received = []
+    stream = Stream('token', on_data=lambda s, data: received.append(data['data']['price']))
+
+    with Replayer(path) as replayer:
+        assert replayer.replay(stream, speed=None) == 20
+        assert replayer.replay(stream, speed=0, start=1015.0) == 5
+
+    assert received == list(range(20)) + list(range(15, 20))
+
+
+def test_replay_keeps_the_original_timing(tmp_path):
+    path = str(tmp_path / 'session.fflog')
+    with Recorder(path) as recorder:
+        for n in range(3):
+            recorder.write(message(n), timestamp=1000.0 + n * 0.1)
+
+    stream = Stream('token', on_data=lambda s, data: None)
+    with Replayer(path) as replayer:
+        started = time.monotonic()
+        replayer.replay(stream, speed=2)
+        assert 0.09 <= time.monotonic() - started < 0.5
+
+
+def test_replay_into_an_async_stream(tmp_path):
+    path = record(tmp_path / 'session.fflog', 5)
+    received = []
+
+    async def on_data(stream, data):
+        received.append(data['data']['price'])
+
+    async def run():
+        with Replayer(path) as replayer:
+            return await replayer.replay_async(AsyncStream('token', on_data=on_data), speed=None)
+
+    assert asyncio.run(run()) == 5
+    assert received == list(range(5))
@@ -1,2 +1,82 @@
+import threading
+import time
 import pytest
 from financefeast.rest import Rest
+from financefeast.common import Environments
+from financefeast.exceptions import MissingTicker
+from financefeast.retry import RetryPolicy
+from tests.conftest import FakeResponse, FakeTransport
+
+
+def client(handler):
+    transport = FakeTransport(handler)
+    rest = Rest(token='token', environment=Environments.local, transport=transport, retry=RetryPolicy(max_retries=0),
+                max_chunk_bars=None)
+    return rest, transport
+
+
+def handler(url, params):
+    if params.get('ticker') == 'bad.nz':
+        return FakeResponse(404, {'message': 'ticker not found'})
+    return {'ticker': params.get('ticker'), 'data': [{'close': 1.0}]}
+
+
+def test_eod_many_returns_a_result_per_ticker():
+    rest, transport = client(handler)
+
+    results = {result.ticker: result for result in rest.eod_many(['air.nz', 'fph.nz', 'spk.nz'], date_from='2020-11-02')}
+
+    assert sorted(results) == ['air.nz', 'fph.nz', 'spk.nz']
+    assert all(result.ok and result.endpoint == 'eod' for result in results.values())
+    assert results['fph.nz'].response.ticker == 'fph.nz'
+    assert all(params['date_from'] == '2020-11-02' for _, params in transport.calls)
+
+
+def test_error_for_one_ticker_does_not_fail_the_batch():
+    rest, _ = client(handler)
+
+    results = {result.ticker: result for result in rest.many(['air.nz', 'bad.nz'])}
+
+    assert results['air.nz'].ok
+    assert not results['bad.nz'].ok
+    assert isinstance(results['bad.nz'].error, MissingTicker)
+
+
+def test_parameters_only_go_to_endpoints_that_accept_them():
+    rest, transport = client(handler)
+
+    results = list(rest.many(['air.nz'], ['eod', 'rsi'], date_from='2020-11-02', datetime_from='2020-11-02 10:00:00', window=9))
+
+    assert sorted(result.endpoint for result in results) == ['eod', 'rsi']
+    calls = {url.rsplit('/', 1)[-1]: params for url, params in transport.calls}
+    assert 'datetime_from' not in calls['eod'] and 'window' not in calls['eod']
+    assert calls['rsi']['datetime_from'] == '2020-11-02 10:00:00' and calls['rsi']['window'] == 9
+    assert 'date_from' not in calls['rsi']
+
+
+def test_unsupported_endpoint_is_rejected():
+    rest, _ = client(handler)
+
+    with pytest.raises(ValueError):
+        list(rest.many(['air.nz'], ['validate']))
+
+
+def test_requests_in_flight_are_bounded_by_max_workers():
+    lock = threading.Lock()
+    in_flight = [0, 0]
+
+    def slow(url, params):
+        with lock:
+            in_flight[0] += 1
+            in_flight[1] = max(in_flight)
+        time.sleep(0.01)
+        with lock:
+            in_flight[0] -= 1
+        return handler(url, params)
+
+    rest, transport = client(slow)
+
+    results = list(rest.eod_many([f't{i}.nz' for i in range(12)], max_workers=3))
+
+    assert len(results) == 12 and len(transport.calls) == 12
+    assert in_flight[1] <= 3
@@ -0,0 +1,106 @@
+import asyncio
+import time
+import pytest
+from requests.exceptions import ConnectionError
+from financefeast.async_rest import AsyncRest
+from financefeast.common import Environments
+from financefeast.exceptions import RateLimitExceeded
+from financefeast.ratelimit import RateLimiter
+from financefeast.rest import Rest
+from financefeast.retry import RetryPolicy
+from tests.conftest import FakeResponse, FakeTransport
+
+
+class Clock(object):
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def client(handler, retry:RetryPolicy = None, rate_limiter:RateLimiter = None):
+    transport = FakeTransport(handler)
+    rest = Rest(token='token', environment=Environments.local, transport=transport,
+                retry=retry or RetryPolicy(backoff_factor=0.001), rate_limiter=rate_limiter)
+    return rest, transport
+
+
+def test_backoff_ceiling_grows_and_is_capped():
+    retry = RetryPolicy(max_retries=10, backoff_factor=0.5, backoff_max=3, deadline=None)
+    for attempt, ceiling in enumerate([0.5, 1, 2, 3, 3]):
+        delays = [retry.delay(attempt, retry.start()) for _ in range(200)]
+        assert all(0 <= delay <= ceiling for delay in delays)
+        assert max(delays) > ceiling / 2
+    assert retry.delay(10, retry.start()) is None
+
+
+def test_no_retry_past_the_deadline():
+    clock = Clock()
+    retry = RetryPolicy(backoff_factor=1, deadline=10, clock=clock)
+    started = retry.start()
+
+    clock.now = 8
+    assert retry.remaining(started) == 2
+    assert retry.delay(0, started, reset=5) is None
+    assert retry.delay(0, started, reset=1) is not None
+
+    clock.now = 12
+    assert retry.remaining(started) == 0
+    assert RetryPolicy(deadline=None).remaining(0) is None
+
+
+def test_429_waits_for_the_reset_then_succeeds():
+    responses = [FakeResponse(429, {'detail': 'slow down'}, {'x-ratelimit-reset': '0.05'}), {'data': [1]}]
+    rest, transport = client(lambda url, params: responses.pop(0))
+
+    started = time.monotonic()
+    assert rest.eod('air.nz', date_from='2020-11-02', date_to='2020-11-03').data == [1]
+    assert time.monotonic() - started >= 0.05
+    assert len(transport.calls) == 2
+
+
+def test_retryable_status_gives_up_after_max_retries():
+    rest, transport = client(lambda url, params: FakeResponse(503, {'detail': 'unavailable'}),
+                             retry=RetryPolicy(max_retries=2, backoff_factor=0.001))
+
+    rest.eod('air.nz', date_from='2020-11-02', date_to='2020-11-03')
+    assert len(transport.calls) == 3
+
+
+def test_connection_errors_are_retried():
+    def handler(url, params):
+        if len(transport.calls) < 3:
+            raise ConnectionError('reset')
+        return {'data': [1]}
+
+    rest, transport = client(handler)
+    assert rest.eod('air.nz', date_from='2020-11-02', date_to='2020-11-03').data == [1]
+    assert len(transport.calls) == 3
+
+
+def test_rate_limiter_wait_is_bounded_by_the_deadline():
+    limiter = RateLimiter()
+    limiter.update(100, 0, 30)
+    rest, transport = client(lambda url, params: {'data': []}, retry=RetryPolicy(deadline=0.1), rate_limiter=limiter)
+
+    started = time.monotonic()
+    with pytest.raises(RateLimitExceeded):
+        rest.eod('air.nz', date_from='2020-11-02', date_to='2020-11-03')
+    assert time.monotonic() - started < 1
+    assert transport.calls == []
+
+
+def test_async_rate_limiter_wait_is_bounded_by_the_deadline():
+    async def run():
+        limiter = RateLimiter()
+        limiter.update(100, 0, 30)
+        rest = AsyncRest(token='token', environment=Environments.local, rate_limiter=limiter,
+                         retry=RetryPolicy(deadline=0.1))
+
+        started = time.monotonic()
+        with pytest.raises(RateLimitExceeded):
+            await rest._requests._send('http://localhost/v1/eod')
+        assert time.monotonic() - started < 1
+
+    asyncio.run(run())
@@ -0,0 +1,94 @@
+import asyncio
+from financefeast.router import Router
+
+
+class Recorder(object):
+    def __init__(self):
+        self.received = []
+
+    def __call__(self, stream, data):
+        self.received.append(data)
+
+
+def test_routes_by_ticker_type_predicate_and_everything():
+    router = Router()
+    air, trades, big, everything = Recorder(), Recorder(), Recorder(), Recorder()
+    router.route(air, ticker='AIR.NZ')
+    router.route(trades, type=['trade', 'print'])
+    router.route(big, predicate=lambda data: data.get('volume', 0) > 100)
+    router.route(everything)
+
+    messages = [{'type': 'trade', 'ticker': 'air.nz', 'volume': 10},
+                {'type': 'quote', 'data': [{'ticker': 'fph.nz'}, {'ticker': 'Air.nz'}]},
+                {'type': 'print', 'ticker': 'spk.nz', 'volume': 500},
+                'heartbeat']
+    for data in messages:
+        router(None, data)
+
+    assert air.received == messages[:2]
+    assert trades.received == [messages[0], messages[2]]
+    assert big.received == [messages[2]]
+    assert everything.received == messages
+
+
+def test_handler_matching_several_routes_is_called_once():
+    router = Router()
+    handler = Recorder()
+    router.route(handler, ticker='air.nz', type='trade')
+    router.route(handler, predicate=lambda data: True)
+
+    router(None, {'type': 'trade', 'ticker': 'air.nz'})
+
+    assert len(handler.received) == 1
+
+
+def test_unroute_one_route_or_all():
+    router = Router()
+    handler = Recorder()
+    router.route(handler, ticker=['air.nz', 'fph.nz'], type='trade')
+
+    router.unroute(handler, ticker='AIR.NZ')
+    assert router.handlers_for({'ticker': 'air.nz'}) == []
+    assert router.handlers_for({'ticker': 'fph.nz'}) == [handler]
+    assert router.handlers_for({'type': 'trade'}) == [handler]
+
+    router.unroute(handler)
+    assert router.handlers_for({'type': 'trade', 'ticker': 'fph.nz'}) == []
+
+
+def test_unhashable_values_are_not_routed():
+    router = Router()
+    handler, everything = Recorder(), Recorder()
+    router.route(handler, ticker='air.nz', type='trade')
+    router.route(everything)
+
+    assert router.handlers_for({'type': ['trade'], 'ticker': {'symbol': 'air.nz'}}) == [everything]
+
+
+def test_failing_handler_and_predicate_do_not_stop_the_others():
+    router = Router()
+    handler = Recorder()
+
+    def failing(stream, data):
+        raise ValueError('handler')
+
+    router.route(failing)
+    router.route(handler, predicate=lambda data: data['missing'])
+    router.route(handler, type='trade')
+
+    router(None, {'type': 'trade'})
+
+    assert handler.received == [{'type': 'trade'}]
+
+
+def test_coroutine_handlers_are_awaited():
+    router = Router()
+    received = []
+
+    async def handler(stream, data):
+        received.append(data)
+
+    router.route(handler, type='trade')
+    asyncio.run(router(None, {'type': 'trade'}))
+
+    assert received == [{'type': 'trade'}]
@@ -0,0 +1,267 @@
+import asyncio
+import json
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from financefeast.async_stream import AsyncStream
+from financefeast.dispatch import Dispatcher, DROP_OLDEST, DROP_NEWEST
+from financefeast.entity import Response
+from financefeast.stream import Stream
+
+
+def message(price, ticker='air.nz'):
+    return json.dumps({'type': 'trade', 'data': {'ticker': ticker, 'price': price}})
+
+
+def backfilling(stream):
+    """
+    Put a stream in the state it is in after a reconnect, before the backfill is delivered
+    """
+    stream._add_subscriptions(['air.nz'])
+    stream._connections = 2
+    stream._last_received = time.time()
+    assert stream._start_backfill()
+    return stream
+
+
+def collect(**kwargs):
+    received = []
+    stream = Stream('token', on_data=lambda s, data: received.append(data['data']['price']), backfill=object(), **kwargs)
+    return backfilling(stream), received
+
+
+def test_live_messages_are_held_until_the_backfill_is_delivered():
+    stream, received = collect()
+
+    for price in range(5):
+        stream._receive(message(price))
+    assert received == [] and len(stream._held) == 5
+
+    stream._release_held(stream._backfill_generation)
+    stream._receive(message(5))
+    assert received == list(range(6))
+
+
+def test_full_hold_applies_the_dispatcher_overflow_policy():
+    oldest = backfilling(Stream('token', backfill=object(), max_held=3, dispatcher=Dispatcher(overflow=DROP_OLDEST)))
+    newest = backfilling(Stream('token', backfill=object(), max_held=3, dispatcher=Dispatcher(overflow=DROP_NEWEST)))
+
+    for price in range(5):
+        oldest._receive(message(price))
+        newest._receive(message(price))
+
+    assert [data['data']['price'] for data in oldest._held] == [2, 3, 4]
+    assert [data['data']['price'] for data in newest._held] == [0, 1, 2]
+    assert oldest._held_dropped == newest._held_dropped == 2
+
+
+def test_full_hold_blocks_until_released():
+    stream, received = collect(max_held=2)
+    stream._receive(message(0))
+    stream._receive(message(1))
+
+    reader = threading.Thread(target=stream._receive, args=(message(2),), daemon=True)
+    reader.start()
+    reader.join(0.1)
+    assert reader.is_alive() and received == []
+
+    stream._release_held(stream._backfill_generation)
+    reader.join(5)
+    assert not reader.is_alive()
+    assert received == [0, 1, 2]
+
+
+def test_held_messages_are_released_after_the_timeout():
+    stream, received = collect(backfill_timeout=0.05)
+    stream._receive(message(0))
+    stream._receive(message(1))
+    assert received == []
+
+    time.sleep(0.1)
+    stream._receive(message(2))
+    assert received == [0, 1, 2]
+    assert not stream._backfilling
+
+    # the late backfill finds nothing left to release
+    stream._release_held(stream._backfill_generation)
+    assert received == [0, 1, 2]
+
+
+def test_blocked_hold_is_released_after_the_timeout():
+    stream, received = collect(max_held=1, backfill_timeout=0.1)
+    stream._receive(message(0))
+
+    started = time.monotonic()
+    stream._receive(message(1))
+    assert 0.05 <= time.monotonic() - started < 2
+    assert received == [0, 1]
+
+
+def test_async_stream_releases_held_messages_after_the_timeout():
+    async def run():
+        received = []
+
+        async def on_data(stream, data):
+            received.append(data['data']['price'])
+
+        stream = backfilling(AsyncStream('token', on_data=on_data, backfill=object(), max_held=2, backfill_timeout=0.1))
+        for price in range(2):
+            await stream._receive(message(price))
+        assert received == []
+
+        # the third message waits for room, then the timeout releases everything
+        await stream._receive(message(2))
+        assert received == [0, 1, 2]
+        assert not stream._backfilling
+
+    asyncio.run(run())
+
+
+class FakeBackfill(object):
+    """
+    Rest stand in for backfill, intraday_many waits for the gate
+    """
+
+    class Result(object):
+        def __init__(self, ticker, response):
+            self.ticker, self.response, self.ok = ticker, response, True
+
+    def __init__(self, records:list, gate:threading.Event = None):
+        self.records = records
+        self.gate = gate
+        self.windows = []
+
+    def intraday_many(self, tickers, datetime_from=None, datetime_to=None, **kwargs):
+        self.windows.append((datetime_from, datetime_to))
+        if self.gate is not None:
+            self.gate.wait(5)
+        return [self.Result(ticker, Response({'data': list(self.records)})) for ticker in tickers]
+
+    def last(self, ticker, **kwargs):
+        return None
+
+
+def price(data):
+    return data['data']['price'] if data['type'] == 'trade' else ('backfill', data['data']['close'])
+
+
+def test_backfill_window_is_in_the_backfill_timezone():
+    last = datetime(2020, 11, 2, 0, 0, 30, tzinfo=timezone.utc).timestamp() + 0.5
+    for tz, since in ((timezone.utc, datetime(2020, 11, 2, 0, 0, 30)),
+                      (timezone(timedelta(hours=13)), datetime(2020, 11, 2, 13, 0, 30))):
+        stream = Stream('token', backfill=object(), backfill_timezone=tz)
+        stream._add_subscriptions(['air.nz'])
+        stream._connections = 2
+        stream._last_received = last
+
+        tickers, start, until, generation = stream._start_backfill()
+        assert start == since
+        assert abs(until - datetime.now(tz).replace(tzinfo=None)) < timedelta(seconds=5)
+
+    records = [{'datetime': '2020-11-02T12:00:00+12:00', 'close': 1}, {'datetime': '2020-11-02 00:01:00', 'close': 2},
+               {'datetime': '2020-11-02T13:00:45+13:00', 'close': 3}]
+    messages = Stream._backfill_messages('air.nz', Response({'data': records}), datetime(2020, 11, 2, 0, 0, 30))
+    assert [message['data']['close'] for message in messages] == [3, 2]
+
+
+def test_backfill_stays_the_only_deliverer_once_it_has_its_data():
+    received = []
+    active = []
+
+    def on_data(stream, data):
+        active.append(threading.current_thread().name)
+        assert len(set(active)) == 1, "on_data called from two threads at once"
+        if data['type'] == 'backfill':
+            time.sleep(0.03)
+        received.append(price(data))
+        active.pop()
+
+    backfill = FakeBackfill([{'datetime': '2020-11-02 00:00:00', 'close': n} for n in range(5)])
+    stream = backfilling(Stream('token', on_data=on_data, backfill=backfill, backfill_timeout=0.02))
+    window = (['air.nz'], datetime(2020, 11, 1), datetime(2020, 11, 3), stream._backfill_generation)
+
+    runner = threading.Thread(target=stream._run_backfill, args=window, name='ff_backfill')
+    runner.start()
+    time.sleep(0.01)
+    for n in range(5):
+        stream._receive(message(n))
+        time.sleep(0.02)
+    runner.join(5)
+
+    # the deadline passed while the backfill was delivering, live messages still waited for it
+    assert received == [('backfill', n) for n in range(5)] + list(range(5))
+
+
+def test_backfill_fetched_after_the_timeout_is_discarded():
+    received = []
+    gate = threading.Event()
+    backfill = FakeBackfill([{'datetime': '2020-11-02 00:00:00', 'close': 1}], gate=gate)
+    stream = backfilling(Stream('token', on_data=lambda s, data: received.append(price(data)), backfill=backfill,
+                                backfill_timeout=0.05))
+    window = (['air.nz'], datetime(2020, 11, 1), datetime(2020, 11, 3), stream._backfill_generation)
+
+    runner = threading.Thread(target=stream._run_backfill, args=window)
+    runner.start()
+    stream._receive(message(0))
+    time.sleep(0.1)
+    stream._receive(message(1))
+    assert received == [0, 1]
+
+    gate.set()
+    runner.join(5)
+    stream._receive(message(2))
+    assert received == [0, 1, 2]
+
+
+class FakeWebsocket(object):
+    def __init__(self):
+        self.sent = []
+
+    def send(self, data):
+        self.sent.append(json.loads(data))
+
+
+def test_subscribe_batches_tickers_and_skips_duplicates():
+    stream = Stream('token')
+    stream.SUBSCRIBE_BATCH = 2
+    stream._websocket = FakeWebsocket()
+
+    # not connected yet, sent once the connection opens
+    assert stream.subscribe(['A.NZ', 'b.nz']) == ['a.nz', 'b.nz']
+    assert stream._websocket.sent == []
+
+    stream._connected = True
+    assert stream.subscribe(['a.nz', 'c.nz', 'd.nz', 'e.nz', 'C.NZ']) == ['c.nz', 'd.nz', 'e.nz']
+    assert stream.unsubscribe(['b.nz', 'x.nz']) == ['b.nz']
+
+    assert stream._websocket.sent == [{'type': 'subscribe', 'data': {'tickers': ['c.nz', 'd.nz']}},
+                                      {'type': 'subscribe', 'data': {'tickers': ['e.nz']}},
+                                      {'type': 'unsubscribe', 'data': {'tickers': ['b.nz']}}]
+    assert stream.subscriptions == ['a.nz', 'c.nz', 'd.nz', 'e.nz']
+
+
+def test_subscriptions_are_replayed_after_authenticating_on_each_connection():
+    reconnected = []
+
+    class Handler(object):
+        def __call__(self, stream, data):
+            pass
+
+        def on_reconnect(self, stream):
+            reconnected.append(list(stream._websocket.sent))
+
+    stream = Stream('token')
+    stream.SUBSCRIBE_BATCH = 3
+    stream.attach(Handler())
+    stream.subscribe(['t{}.nz'.format(n) for n in range(5)])
+
+    for _ in range(2):
+        stream._websocket = FakeWebsocket()
+        stream._on_open(None)
+        assert stream._websocket.sent == [{'type': 'authenticate', 'data': {'token': 'token'}},
+                                          {'type': 'subscribe', 'data': {'tickers': ['t0.nz', 't1.nz', 't2.nz']}},
+                                          {'type': 'subscribe', 'data': {'tickers': ['t3.nz', 't4.nz']}}]
+        stream._on_close(None, None, None)
+
+    # handlers catch up only on a reconnect, once the subscriptions have been replayed
+    assert len(reconnected) == 1 and len(reconnected[0]) == 3
@@ -0,0 +1,110 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+pd = pytest.importorskip('pandas')
+
+from financefeast import ta
+from financefeast.entity import Response
+
+
+def prices(n=700, seed=1):
+    rng = np.random.default_rng(seed)
+    close = 100 + rng.normal(size=n).cumsum()
+    high = close + rng.uniform(0, 1, n)
+    low = close - rng.uniform(0, 1, n)
+    return high, low, close
+
+
+def ewm(values, alpha, min_periods):
+    return pd.Series(values).ewm(alpha=alpha, adjust=False, ignore_na=True, min_periods=min_periods).mean().values
+
+
+def close_enough(a, b):
+    return np.allclose(a, b, equal_nan=True, rtol=1e-9, atol=1e-9)
+
+
+def test_sma_and_bollinger_match_pandas():
+    _, _, close = prices()
+    series = pd.Series(close)
+
+    result = ta.sma(close, window=[5, 30])
+    assert close_enough(result['sma_5'], series.rolling(5).mean().values)
+    assert close_enough(result['sma_30'], series.rolling(30).mean().values)
+
+    bands = ta.bollinger(close, window=20, window_dev=2)
+    mavg, std = series.rolling(20).mean().values, series.rolling(20).std(ddof=0).values
+    assert close_enough(bands['bollinger_mavg'], mavg)
+    assert close_enough(bands['bollinger_hband'], mavg + 2 * std)
+    assert close_enough(bands['bollinger_lband'], mavg - 2 * std)
+
+
+def test_ema_and_macd_match_pandas():
+    _, _, close = prices()
+
+    assert close_enough(ta.ema(close, window=[30])['ema_30'], ewm(close, 2 / 31, 30))
+
+    result = ta.macd(close)
+    line = ewm(close, 2 / 13, 12) - ewm(close, 2 / 27, 26)
+    signal = np.full(len(close), np.nan)
+    signal[25:] = ewm(line[25:], 2 / 10, 9)
+    assert close_enough(result['macd'], line)
+    assert close_enough(result['macd_signal'], signal)
+    assert close_enough(result['macd_diff'], line - signal)
+
+
+def test_rsi_matches_pandas_wilder_smoothing():
+    _, _, close = prices()
+    change = pd.Series(close).diff().fillna(0.0)
+    up = ewm(change.clip(lower=0).values, 1 / 14, 14)
+    down = ewm((-change).clip(lower=0).values, 1 / 14, 14)
+
+    assert close_enough(ta.rsi(close, window=14)['rsi'], 100 - 100 / (1 + up / down))
+
+
+def test_stochastic_matches_pandas():
+    high, low, close = prices()
+    highest = pd.Series(high).rolling(14).max().values
+    lowest = pd.Series(low).rolling(14).min().values
+    k = 100 * (close - lowest) / (highest - lowest)
+
+    result = ta.stochastic(high, low, close)
+    assert close_enough(result['stoch'], k)
+    assert close_enough(result['stoch_signal'][13:], pd.Series(k[13:]).rolling(3).mean().values)
+
+
+def test_ewm_skips_nan_like_pandas():
+    _, _, close = prices(300)
+    close[:3] = np.nan
+    close[200] = np.nan
+    close[250:260] = np.nan
+
+    for min_periods in (1, 30):
+        result = ta._ewm(close, 2 / 31, min_periods)
+        assert close_enough(result, ewm(close, 2 / 31, min_periods))
+        assert np.isnan(result).sum() == 3 + min_periods - 1
+
+    # a NaN does not reach the values before it
+    clean = prices(300)[2]
+    gapped = clean.copy()
+    gapped[200] = np.nan
+    assert close_enough(ta.ema(gapped)['ema_30'][:200], ta.ema(clean)['ema_30'][:200])
+
+
+def test_columns_are_independent():
+    series = np.column_stack([prices(600, seed)[2] for seed in range(3)])
+    series[100, 1] = np.nan
+
+    together = ta.ema(series, window=[10])['ema_10']
+    for column in range(3):
+        assert close_enough(together[:, column], ta.ema(series[:, column], window=[10])['ema_10'])
+
+
+def test_compare_with_a_server_response():
+    _, _, close = prices(50)
+    local = ta.sma(close, window=[5])
+    remote = Response({'data': [{'date': f'2021-08-{1 + i % 28:02d}', 'sma_5': value if value == value else None}
+                                for i, value in enumerate(local['sma_5'] + 0.001)]})
+
+    difference = ta.compare(local, remote)
+    assert difference['sma_5'] == pytest.approx(0.001)
+    assert np.isnan(ta.compare({'other': close}, remote)['other'])